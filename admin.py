@@ -16,9 +16,10 @@ from config import (
     ADMIN_USERNAME, ADMIN_PASSWORD
 )
 from db import SessionLocal, init_db
+from channel_sync import guild_of_channel
 from models import (
     User, Category, Post, Channel, Feedback,
-    DiscordChannel, DiscordAnnouncement, Filter,
+    DiscordChannel, DiscordAnnouncement, DiscordMessage, Filter,
     AvailableDiscordChannel
 )
 from telegram import Bot
@@ -380,7 +381,8 @@ def add_discord_channel():
         user_id    = request.form['user_id']
         channel_id = request.form['channel_id'].strip()
         name       = request.form.get('name', '').strip() or None
-        new_ch     = DiscordChannel(user_id=user_id, channel_id=channel_id, name=name, active=True)
+        new_ch     = DiscordChannel(user_id=user_id, channel_id=channel_id, name=name, active=True,
+                                    guild_id=guild_of_channel(db, channel_id))
         db.add(new_ch)
         db.commit()
         flash('Подписка на Discord-канал добавлена.', 'success')
@@ -402,6 +404,7 @@ def edit_discord_channel(chan_id):
     if request.method == 'POST':
         ch.user_id    = request.form['user_id']
         ch.channel_id = request.form['channel_id'].strip()
+        ch.guild_id   = guild_of_channel(db, ch.channel_id)
         ch.name       = request.form.get('name', '').strip() or None
         ch.active     = ('active' in request.form and request.form['active'] == 'on')
         db.commit()
@@ -497,25 +500,33 @@ def delete_discord_filter(filter_id):
 @login_required
 def discord_announcements_view():
     db = SessionLocal()
+    # Текст — из discord_messages, канал и пользователь — одним запросом с анонсами
     announcements = (
-        db.query(DiscordAnnouncement)
+        db.query(DiscordAnnouncement.id, DiscordAnnouncement.created_at, DiscordAnnouncement.matched_filter,
+                 DiscordMessage.content, DiscordMessage.translated,
+                 DiscordChannel.channel_id, AvailableDiscordChannel.channel_name,
+                 User.username, User.telegram_id)
+          .join(DiscordMessage, DiscordMessage.message_id == DiscordAnnouncement.message_id)
+          .join(DiscordChannel, DiscordChannel.id == DiscordAnnouncement.channel_id)
+          .outerjoin(AvailableDiscordChannel, AvailableDiscordChannel.channel_id == DiscordChannel.channel_id)
+          .join(User, User.id == DiscordAnnouncement.user_id)
           .order_by(DiscordAnnouncement.created_at.desc())
           .limit(50)
           .all()
     )
-    channels = {c.id: c for c in db.query(DiscordChannel).all()}
-    users    = {u.id: u for u in db.query(User).all()}
     db.close()
     return render_template('discord_announcements.html',
-                           announcements=announcements,
-                           channels=channels,
-                           users=users)
+                           announcements=announcements)
 
 @app.route('/discord_announcements/delete/<int:ann_id>', methods=['POST'])
 @login_required
 def delete_discord_announcement(ann_id):
     db = SessionLocal()
+    ann = db.query(DiscordAnnouncement.message_id).filter_by(id=ann_id).first()
     db.query(DiscordAnnouncement).filter_by(id=ann_id).delete()
+    # Текст сообщения больше не нужен, если это был его последний получатель
+    if ann and not db.query(DiscordAnnouncement.id).filter_by(message_id=ann.message_id).first():
+        db.query(DiscordMessage).filter_by(message_id=ann.message_id).delete()
     db.commit()
     db.close()
     flash('Анонс удалён.', 'success')
@@ -571,11 +582,13 @@ def add_available_discord_channel():
     if request.method == 'POST':
         channel_id   = request.form['channel_id'].strip()
         channel_name = request.form['channel_name'].strip()
+        guild_id     = request.form.get('guild_id', '').strip() or None
 
         existing = db.query(AvailableDiscordChannel).filter_by(channel_id=channel_id).first()
         if existing:
             existing.is_active = True
             existing.last_seen = datetime.utcnow()
+            existing.guild_id  = guild_id or existing.guild_id
             db.commit()
             flash('Канал уже был в списке, но помечен как активный.', 'warning')
             db.close()
@@ -584,6 +597,7 @@ def add_available_discord_channel():
         new_ch = AvailableDiscordChannel(
             channel_id   = channel_id,
             channel_name = channel_name,
+            guild_id     = guild_id,
             is_active    = True,
             last_seen    = datetime.utcnow()
         )
@@ -0,0 +1,103 @@
+# announcement_render.py
+
+import re
+import html
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Iterable
+
+from media_cache import MediaRef
+from mention_cache import CHANNEL_MENTION_RE, USER_MENTION_RE, MentionCache
+
+logger = logging.getLogger("discord_client.render")
+
+# Готовый к отправке анонс: HTML для parse_mode=HTML и картинки (кортеж MediaRef).
+# Одинаков для всех подписчиков, поэтому рендерится один раз на сообщение.
+# posted_at — время публикации в Discord (Unix time) для метрики полной задержки.
+RenderedAnnouncement = namedtuple("RenderedAnnouncement", "html media posted_at", defaults=(None,))
+
+_ROLE_MENTION_RE = re.compile(r"<@&\d+>")
+
+_MARKDOWN_TO_HTML = [
+    (re.compile(r"\*\*(.+?)\*\*"), r"<b>\1</b>"),
+    (re.compile(r"__(.+?)__"),     r"<u>\1</u>"),
+    (re.compile(r"\*(.+?)\*"),     r"<i>\1</i>"),
+    (re.compile(r"_(.+?)_"),       r"<i>\1</i>"),
+    (re.compile(r"`(.+?)`"),       r"<code>\1</code>"),
+    (re.compile(r"\[([^\]]+?)\]\((https?://[^\)]+?)\)"), r'<a href="\2">\1</a>'),
+]
+
+
+def _unix_time(moment: datetime) -> float:
+    # У discord.py время с часовым поясом; «наивное» считаем UTC, как и везде в БД
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def render_announcement(text: str,
+                        channel_name: str,
+                        created_at: datetime,
+                        media: Iterable[MediaRef],
+                        mentions: MentionCache) -> RenderedAnnouncement:
+    """
+    Превращает очищенный текст анонса в сообщение Telegram:
+    упоминания → имена (из MentionCache, без обращений к БД), экранирование,
+    Markdown → HTML, шапка с каналом и временем.
+    """
+    # 1) Заменяем упоминания каналов <#ID> → #channel_name
+    def replace_channel_mention(match):
+        name = mentions.channel_name(match.group(1))
+        return f"#{html.escape(name)}" if name else "#unknown"
+
+    content = CHANNEL_MENTION_RE.sub(replace_channel_mention, text)
+
+    # 2) Заменяем упоминания пользователей <@ID> или <@!ID> → @username
+    def replace_user_mention(match):
+        name = mentions.user_name(match.group(1))
+        return f"@{html.escape(name)}" if name else "@unknown"
+
+    content = USER_MENTION_RE.sub(replace_user_mention, content)
+
+    # 3) Убираем упоминания ролей <@&ID> → @role
+    content = _ROLE_MENTION_RE.sub("@role", content)
+
+    # 4) Экранируем HTML-символы (чтобы не сломать parse_mode=HTML)
+    content = html.escape(content)
+
+    # 5) Конвертируем Markdown → HTML
+    for pattern, repl in _MARKDOWN_TO_HTML:
+        content = pattern.sub(repl, content)
+
+    # 6) Шапка (канал и время)
+    header = (
+        "<b>🟣 Новое объявление из Discord</b>\n"
+        f"<b>Канал:</b> #{html.escape(channel_name or '')}\n"
+        f"<b>Время:</b> {created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+    )
+
+    return RenderedAnnouncement(html=header + content, media=tuple(media), posted_at=_unix_time(created_at))
+
+
+# ─── Хранение в outbox_payloads ───────────────────────────────────────────────
+
+def dump_payload(rendered: RenderedAnnouncement) -> str:
+    return json.dumps({
+        "html":  rendered.html,
+        "media": [{"key": m.key, "url": m.url} for m in rendered.media],
+        "posted_at": rendered.posted_at,
+    }, ensure_ascii=False)
+
+
+def load_payload(raw: str) -> RenderedAnnouncement:
+    data = json.loads(raw)
+    media = []
+    for item in data.get("media", ()):
+        if isinstance(item, str):
+            # Задания, поставленные до появления кэша file_id, хранят только ссылку
+            media.append(MediaRef(f"url:{item}", item))
+        else:
+            media.append(MediaRef(item["key"], item["url"]))
+    return RenderedAnnouncement(html=data["html"], media=tuple(media), posted_at=data.get("posted_at"))
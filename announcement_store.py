@@ -0,0 +1,104 @@
+# announcement_store.py
+
+import logging
+from collections import namedtuple
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from db import SessionLocal, insert_ignore
+from models import DiscordMessage, DiscordAnnouncement, DeliveryOutbox, OutboxPayload
+
+logger = logging.getLogger("discord_client.store")
+
+# Получатель одного анонса: подписка, пользователь и (опционально) сработавший фильтр
+Recipient = namedtuple("Recipient", "subscription_id user_id telegram_id matched_filter")
+
+
+def save_announcements(message_id: str,
+                       content: str,
+                       translated: str,
+                       recipients: Iterable[Recipient],
+                       created_at: Optional[datetime] = None,
+                       payload: Optional[str] = None,
+                       guild_id: Optional[str] = None,
+                       db=None) -> List[Recipient]:
+    """
+    Сохраняет анонсы одного сообщения Discord для всех получателей одной транзакцией:
+    один SELECT уже сохранённых user_id, текст сообщения — одной строкой
+    discord_messages, строки получателей — одним пакетным INSERT OR IGNORE, один COMMIT.
+
+    Целостность обеспечивает уникальный ключ (message_id, user_id): если ту же строку
+    параллельно вставил кто-то ещё, она просто пропускается. Предварительное чтение
+    нужно лишь для того, чтобы не слать повторно тем, кому сообщение уже доставлялось.
+
+    Если передан payload (JSON для Telegram), в той же транзакции он записывается
+    один раз в outbox_payloads, а в delivery_outbox ставятся тонкие задания на
+    доставку новым получателям — их разошлёт OutboxWorker процесса,
+    обслуживающего сервер guild_id.
+
+    Возвращает получателей, для которых анонс записан впервые.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    created_at = created_at or datetime.utcnow()
+
+    try:
+        seen = {
+            user_id for (user_id,) in
+            db.query(DiscordAnnouncement.user_id).filter_by(message_id=message_id)
+        }
+
+        fresh = []
+        rows = []
+        outbox_rows = []
+        for r in recipients:
+            if r.user_id in seen:
+                continue
+            seen.add(r.user_id)
+            fresh.append(r)
+            rows.append({
+                "channel_id":     r.subscription_id,
+                "user_id":        r.user_id,
+                "message_id":     message_id,
+                "created_at":     created_at,
+                "matched_filter": r.matched_filter,
+            })
+            if payload is not None:
+                outbox_rows.append({
+                    "message_id":      message_id,
+                    "user_id":         r.user_id,
+                    "chat_id":         str(r.telegram_id),
+                    "guild_id":        guild_id,
+                    "status":          "pending",
+                    "attempts":        0,
+                    "next_attempt_at": created_at,
+                    "created_at":      created_at,
+                })
+
+        if rows:
+            # Текст — один раз на сообщение (строки получателей ссылаются на него по message_id)
+            db.execute(insert_ignore(DiscordMessage.__table__), [{
+                "message_id": message_id,
+                "content":    content,
+                "translated": translated,
+                "created_at": created_at,
+            }])
+            db.execute(insert_ignore(DiscordAnnouncement.__table__), rows)
+        if outbox_rows:
+            # Содержимое — одно на сообщение, задания ссылаются на него по message_id
+            db.execute(insert_ignore(OutboxPayload.__table__), [{
+                "message_id": message_id,
+                "payload":    payload,
+                "created_at": created_at,
+            }])
+            db.execute(insert_ignore(DeliveryOutbox.__table__), outbox_rows)
+        db.commit()
+        return fresh
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
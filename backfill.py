@@ -0,0 +1,150 @@
+# backfill.py
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+import discord
+from sqlalchemy import BigInteger, cast, func
+
+from db import SessionLocal
+from models import DiscordAnnouncement, DiscordChannel
+
+logger = logging.getLogger("discord_client.backfill")
+
+BACKFILL_MAX_AGE_HOURS = float(os.getenv("BACKFILL_MAX_AGE_HOURS", "24"))  # глубже в историю не заглядываем (0 — выключено)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "3"))         # каналов догоняется одновременно
+
+_PROGRESS_EVERY = 100  # писать в лог прогресс канала каждые N сообщений
+_GAP_MARGIN = timedelta(minutes=1)  # запас к началу разрыва соединения: события, уже бывшие в пути
+
+
+def last_message_ids() -> Dict[str, int]:
+    """
+    Последний сохранённый message_id по каждому Discord-каналу — одним запросом.
+    message_id хранится строкой, поэтому максимум берётся по числовому значению.
+    Вызывать в потоке (asyncio.to_thread).
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(DiscordChannel.channel_id,
+                        func.max(cast(DiscordAnnouncement.message_id, BigInteger)))\
+                 .join(DiscordAnnouncement, DiscordAnnouncement.channel_id == DiscordChannel.id)\
+                 .group_by(DiscordChannel.channel_id)
+        return {channel_id: int(last) for channel_id, last in rows if last is not None}
+    finally:
+        db.close()
+
+
+class Backfiller:
+    """
+    Догоняет сообщения, опубликованные, пока Discord-клиент был выключен
+    или потерял сессию шлюза (после RESUME пропущенные события Discord
+    присылает сам, догонять нечего).
+
+    Для каждого канала с подписчиками история читается постранично (по 100
+    сообщений, от старых к новым) начиная с последнего сохранённого message_id,
+    но не глубже BACKFILL_MAX_AGE_HOURS, а после разрыва в работающем процессе —
+    не раньше начала разрыва. Каждое сообщение проходит тот же путь, что и
+    живое (process — это on_message с пометкой backfilled): фильтры, сохранение
+    с дедупликацией по (message_id, user_id) и доставка через outbox. Поэтому
+    повторно прочитанные сообщения никому не уходят дважды.
+
+    Каналы без единого сохранённого анонса пропускаются: догонять не от чего,
+    а новому подписчику не нужна вся история канала.
+    """
+
+    def __init__(self, client: discord.Client, process: Callable[[discord.Message], Awaitable[None]]):
+        self.client = client
+        self.process = process
+        self._task: Optional[asyncio.Task] = None
+        self._again = False
+        self._since: Optional[datetime] = None
+
+    def start(self, since: Optional[datetime] = None):
+        """
+        Запускает проход; если он уже идёт — ещё один сразу после него.
+        since — начало разрыва соединения (UTC): раньше него сообщения уже
+        были получены вживую. None — с последнего сохранённого (старт процесса).
+        """
+        if BACKFILL_MAX_AGE_HOURS <= 0:
+            return
+        if self._task is not None and not self._task.done():
+            # Следующий проход покрывает оба разрыва: берём более ранний
+            if self._again:
+                since = None if since is None or self._since is None else min(since, self._since)
+            self._since = since
+            self._again = True
+            return
+        self._since = since
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            self._again = False
+            since, self._since = self._since, None
+            try:
+                await self.run_once(since)
+            except Exception as e:
+                logger.error(f"[Backfill] Ошибка: {e}", exc_info=True)
+            if not self._again or self.client.is_closed():
+                return
+
+    async def run_once(self, since: Optional[datetime] = None) -> int:
+        """Один проход по всем каналам с подписчиками. Возвращает число прочитанных сообщений."""
+        cursors = await asyncio.to_thread(last_message_ids)
+        oldest = datetime.now(timezone.utc) - timedelta(hours=BACKFILL_MAX_AGE_HOURS)
+        if since is not None:
+            # Тихий канал, у которого последний анонс давний, без этого перечитывался
+            # бы на всю глубину — хотя всё до разрыва процесс уже видел
+            oldest = max(oldest, since - _GAP_MARGIN)
+        floor = discord.utils.time_snowflake(oldest)
+
+        jobs = []
+        for channel_id in self.client.subscriptions.channels():
+            last = cursors.get(channel_id)
+            channel = self.client.get_channel(int(channel_id))
+            if last is None or channel is None:
+                continue
+            jobs.append((channel, max(last, floor)))
+        if not jobs:
+            return 0
+
+        logger.info(f"[Backfill] Догоняем пропущенные сообщения: каналов {len(jobs)}, "
+                    f"с {oldest:%Y-%m-%d %H:%M:%S} UTC.")
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+        counts = await asyncio.gather(*(self._channel(semaphore, ch, after) for ch, after in jobs))
+        total = sum(counts)
+        logger.info(f"[Backfill] Готово: сообщений {total} из {sum(1 for c in counts if c)} каналов "
+                    f"за {time.monotonic() - started:.1f} с.")
+        return total
+
+    async def _channel(self, semaphore: asyncio.Semaphore, channel, after: int) -> int:
+        async with semaphore:
+            seen = 0
+            try:
+                async for message in channel.history(limit=None, after=discord.Object(id=after),
+                                                     oldest_first=True):
+                    await self.process(message)
+                    seen += 1
+                    if seen % _PROGRESS_EVERY == 0:
+                        logger.info(f"[Backfill] #{channel.name}: обработано {seen}")
+            except discord.HTTPException as e:
+                # Forbidden (нет Read Message History) и прочие ошибки API — канал пропускаем
+                logger.warning(f"[Backfill] #{channel.name}: история недоступна ({e}), обработано {seen}")
+                return seen
+            if seen:
+                logger.info(f"[Backfill] #{channel.name}: обработано {seen}")
+            return seen
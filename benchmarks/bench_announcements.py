@@ -0,0 +1,99 @@
+# benchmarks/bench_announcements.py
+"""
+Сохранение анонсов одного сообщения Discord: построчно (как было в on_message)
+против пакетной записи announcement_store.save_announcements.
+
+    python -m benchmarks.bench_announcements [--subscribers 10,100,500,2000] [--messages 5]
+
+Для каждого числа подписчиков печатает SQL-запросы, коммиты и время на одно сообщение.
+"""
+
+import argparse
+from datetime import datetime
+
+from benchmarks.common import prepare_environment, StatementCounter, timer, print_table
+
+prepare_environment()
+
+from db import engine, init_db, SessionLocal  # noqa: E402
+from models import User, DiscordChannel, DiscordAnnouncement, DiscordMessage  # noqa: E402
+from announcement_store import Recipient, save_announcements  # noqa: E402
+
+TEXT = "New release v1.2.3 is out! " * 40
+
+
+def make_subscribers(db, channel_id: str, count: int):
+    first = db.query(User).count()
+    users = [User(telegram_id=str(10_000_000 + first + i), username=f"u{first + i}") for i in range(count)]
+    db.add_all(users)
+    db.flush()
+    subs = [DiscordChannel(user_id=u.id, channel_id=channel_id, active=True) for u in users]
+    db.add_all(subs)
+    db.commit()
+    return [Recipient(s.id, s.user_id, s.user.telegram_id, None) for s in subs]
+
+
+def legacy_save(message_id: str, recipients):
+    """Построчная запись: SELECT first() + INSERT + COMMIT на каждого подписчика."""
+    db = SessionLocal()
+    fresh = []
+    if not db.query(DiscordMessage.id).filter_by(message_id=message_id).first():
+        db.add(DiscordMessage(message_id=message_id, content=TEXT, translated=TEXT, created_at=datetime.utcnow()))
+        db.commit()
+    for r in recipients:
+        exists = db.query(DiscordAnnouncement).filter_by(
+            message_id=message_id, user_id=r.user_id
+        ).first()
+        if exists:
+            continue
+        db.add(DiscordAnnouncement(
+            channel_id=r.subscription_id, user_id=r.user_id, message_id=message_id,
+            created_at=datetime.utcnow(), matched_filter=None
+        ))
+        db.commit()
+        fresh.append(r)
+    db.close()
+    return fresh
+
+
+def bulk_save(message_id: str, recipients):
+    return save_announcements(message_id, TEXT, TEXT, recipients)
+
+
+def run(sizes, messages):
+    init_db()
+    counter = StatementCounter(engine)
+    rows = []
+    next_message = 1
+
+    for n in sizes:
+        db = SessionLocal()
+        recipients = make_subscribers(db, channel_id=f"chan-{n}", count=n)
+        db.close()
+
+        for name, fn in (("построчно", legacy_save), ("пакетом", bulk_save)):
+            counter.reset()
+            with timer() as elapsed:
+                for _ in range(messages):
+                    delivered = fn(str(next_message), recipients)
+                    assert len(delivered) == n
+                    next_message += 1
+            rows.append((
+                n, name,
+                f"{counter.statements / messages:.0f}",
+                f"{counter.commits / messages:.0f}",
+                f"{elapsed() * 1000 / messages:.1f}",
+            ))
+
+        # Повторная доставка того же сообщения ничего не пишет и никому не шлёт
+        assert bulk_save(str(next_message - 1), recipients) == []
+
+    print_table(("подписчиков", "способ", "SQL/сообщ.", "COMMIT/сообщ.", "мс/сообщ."), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", default="10,100,500,2000")
+    parser.add_argument("--messages", type=int, default=5)
+    args = parser.parse_args()
+    run([int(x) for x in args.subscribers.split(",")], args.messages)
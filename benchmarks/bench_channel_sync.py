@@ -0,0 +1,94 @@
+# benchmarks/bench_channel_sync.py
+"""
+Синхронизация списка каналов гильдии с available_discord_channels:
+прежний цикл (сброс is_active у всех строк, SELECT и UPDATE на каждый канал)
+против channel_sync.sync_channel_rows (одно чтение, запись только изменений).
+
+    python -m benchmarks.bench_channel_sync [--channels 100,500,2000]
+
+Для каждого размера гильдии печатает SQL-запросы, изменённые строки и время
+первой синхронизации, повторной без изменений и повторной после переименования
+1% каналов.
+"""
+
+import argparse
+from datetime import datetime
+
+from benchmarks.common import prepare_environment, StatementCounter, timer, print_table
+
+prepare_environment()
+
+from sqlalchemy import event  # noqa: E402
+
+from db import engine, init_db, SessionLocal  # noqa: E402
+from models import AvailableDiscordChannel  # noqa: E402
+from channel_sync import sync_channel_rows  # noqa: E402
+
+
+def legacy_sync(channels):
+    """Прежняя логика sync_available_channels."""
+    session = SessionLocal()
+    now = datetime.utcnow()
+    session.query(AvailableDiscordChannel)\
+           .filter(AvailableDiscordChannel.is_active == True)\
+           .update({AvailableDiscordChannel.is_active: False})  # noqa: E712
+    session.commit()
+    for ch_id, name in channels.items():
+        row = session.query(AvailableDiscordChannel).filter_by(channel_id=ch_id).first()
+        if row:
+            row.channel_name = name
+            row.is_active = True
+            row.last_seen = now
+        else:
+            session.add(AvailableDiscordChannel(channel_id=ch_id, channel_name=name, is_active=True, last_seen=now))
+    session.commit()
+    session.close()
+
+
+class RowCounter:
+    """Сколько строк затронули INSERT/UPDATE (rowcount курсора)."""
+
+    def __init__(self):
+        self.rows = 0
+        event.listen(engine, "after_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE")) and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+
+
+def clear():
+    db = SessionLocal()
+    db.query(AvailableDiscordChannel).delete()
+    db.commit()
+    db.close()
+
+
+def run(sizes):
+    init_db()
+    counter = StatementCounter(engine)
+    rows_counter = RowCounter()
+    rows = []
+    for n in sizes:
+        channels = {str(1_000_000 + i): f"channel-{i}" for i in range(n)}
+        renamed = dict(channels)
+        for ch_id in list(renamed)[::100]:
+            renamed[ch_id] += "-renamed"
+
+        for name, fn in (("построчно", legacy_sync), ("diff", lambda data: sync_channel_rows({"1": data}))):
+            clear()
+            for phase, data in (("первая", channels), ("повторная", channels), ("1% переименовано", renamed)):
+                counter.reset()
+                rows_counter.rows = 0
+                with timer() as elapsed:
+                    fn(data)
+                rows.append((n, name, phase, counter.statements, rows_counter.rows, f"{elapsed() * 1000:.1f}"))
+
+    print_table(("каналов", "способ", "синхронизация", "SQL", "строк записано", "мс"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", default="100,500,2000")
+    args = parser.parse_args()
+    run([int(x) for x in args.channels.split(",")])
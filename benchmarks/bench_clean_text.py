@@ -0,0 +1,102 @@
+# benchmarks/bench_clean_text.py
+"""
+Очистка Discord-разметки: прежние 12 проходов re.sub по всему тексту против
+discord_text.clean_discord_text (скомпилированные шаблоны, пропуск ненужных шагов,
+без раскрытия шаблона подстановки на каждое совпадение).
+
+    python -m benchmarks.bench_clean_text [--sizes 1,10,50] [--repeat 200] [--fuzz 20000]
+
+Сначала проверяет, что обе функции дают эталонный результат на корпусе
+benchmarks/golden_announcements.json (и совпадают на --fuzz случайных строках
+из символов разметки), затем печатает время очистки сообщений разной длины.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+
+from benchmarks.common import timer, print_table
+
+from discord_text import clean_discord_text
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "golden_announcements.json")
+
+
+def legacy_clean_discord_text(raw: str) -> str:
+    """Прежняя реализация из discord_client.py — 12 последовательных проходов."""
+    text = raw
+    text = re.sub(r"```(?:[^\S\r\n]*\n)?([\s\S]*?)```", lambda m: m.group(1), text)
+    text = re.sub(r"`([^`\n]+?)`", r"\1", text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
+    text = re.sub(r"__(.+?)__", r"\1", text)
+    text = re.sub(r"~~(.+?)~~", r"\1", text)
+    text = re.sub(r"\*(.+?)\*", r"\1", text)
+    text = re.sub(r"_(.+?)_", r"\1", text)
+    text = re.sub(r"<@&\d+>", "", text)
+    text = re.sub(r"\|\|(.+?)\|\|", r"\1", text)
+    text = re.sub(r":[A-Za-z0-9_\-+]+?:", "", text)
+    text = re.sub(r"^#{1,6}\s*", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^>\s?", "", text, flags=re.MULTILINE)
+    text = text.replace("\u200b", "")
+    text = text.replace("\ufeff", "")
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    lines = [line.rstrip() for line in text.splitlines()]
+    return "\n".join(lines).strip()
+
+
+FUZZ_ALPHABET = ["*", "**", "_", "__", "~~", "`", "```", "<@&12>", "||", ":", ":smile:",
+                 "#", "##", ">", "> ", "\n", "\n\n", " ", "\t", "\r", "\u200b", "\ufeff",
+                 "\u2028", "a", "bc", "1"]
+
+
+def check(corpus, fuzz: int):
+    for i, case in enumerate(corpus):
+        assert legacy_clean_discord_text(case["input"]) == case["expected"], f"эталон #{i} устарел"
+        assert clean_discord_text(case["input"]) == case["expected"], f"расхождение на эталоне #{i}"
+
+    rnd = random.Random(0)
+    for _ in range(fuzz):
+        s = "".join(rnd.choice(FUZZ_ALPHABET) for _ in range(rnd.randint(0, 30)))
+        assert clean_discord_text(s) == legacy_clean_discord_text(s), f"расхождение на {s!r}"
+    print(f"Эталонов: {len(corpus)}, случайных строк: {fuzz} — результаты совпадают.\n")
+
+
+def run(sizes, repeat: int, fuzz: int):
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+    check(corpus, fuzz)
+
+    fns = (("12 проходов", legacy_clean_discord_text), ("discord_text", clean_discord_text))
+    rows = []
+
+    # Обычные анонсы по одному
+    for name, fn in fns:
+        with timer() as elapsed:
+            for _ in range(repeat):
+                for case in corpus:
+                    fn(case["input"])
+        avg_len = sum(len(c["input"]) for c in corpus) // len(corpus)
+        rows.append((f"~{avg_len} (корпус)", name, f"{elapsed() * 1e6 / repeat / len(corpus):.0f}"))
+
+    # Длинные release notes
+    sample = "\n\n".join(case["input"] for case in corpus)
+    for n in sizes:
+        text = "\n\n".join([sample] * n)
+        for name, fn in fns:
+            with timer() as elapsed:
+                for _ in range(repeat):
+                    fn(text)
+            rows.append((len(text), name, f"{elapsed() * 1e6 / repeat:.0f}"))
+
+    print_table(("символов", "способ", "мкс/сообщ."), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,50")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--fuzz", type=int, default=20000)
+    args = parser.parse_args()
+    run([int(x) for x in args.sizes.split(",")], args.repeat, args.fuzz)
@@ -0,0 +1,117 @@
+# benchmarks/bench_digest.py
+"""
+Всплеск анонсов: B сообщений подряд (у каждого одна картинка) N подписчикам.
+Обычный режим (каждый анонс — текст и фото отдельно) против режима дайджеста
+(одно сообщение со страницами и общий альбом). Рассылку выполняет настоящий
+OutboxWorker по временной БД; вместо Bot API — заглушка, считающая вызовы.
+
+    python -m benchmarks.bench_digest [--subscribers 50,200] [--burst 10]
+
+Печатает число вызовов Bot API и время разбора очереди.
+"""
+
+import argparse
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.common import prepare_environment, timer, print_table
+
+prepare_environment()
+
+import outbox  # noqa: E402
+import telegram_delivery  # noqa: E402
+from db import init_db, SessionLocal  # noqa: E402
+from models import (  # noqa: E402
+    User, DiscordChannel, DiscordAnnouncement, DiscordMessage, DeliveryOutbox, OutboxPayload,
+)
+from announcement_store import Recipient, save_announcements  # noqa: E402
+from announcement_render import RenderedAnnouncement, dump_payload  # noqa: E402
+from telegram_delivery import TelegramDelivery  # noqa: E402
+from media_cache import MediaFileCache, MediaRef  # noqa: E402
+from discord_client import DiscordAnnounceClient  # noqa: E402
+
+
+class FakeBot:
+    """Заглушка telegram.Bot: считает вызовы, каждый стоит --latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def _call(self, result=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return result
+
+    async def send_message(self, chat_id, **kwargs):
+        return await self._call()
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._call(SimpleNamespace(photo=[SimpleNamespace(file_id=f"fid-{photo}")]))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        return await self._call(tuple(SimpleNamespace(photo=[SimpleNamespace(file_id=f"fid-{m.media}")])
+                                      for m in media))
+
+
+def seed(subscribers: int, burst: int, digest: bool):
+    db = SessionLocal()
+    db.query(DeliveryOutbox).delete()
+    db.query(OutboxPayload).delete()
+    db.query(DiscordAnnouncement).delete()
+    db.query(DiscordMessage).delete()
+    db.query(DiscordChannel).delete()
+    db.query(User).delete()
+    users = [User(telegram_id=str(10_000 + i), digest_mode=digest) for i in range(subscribers)]
+    db.add_all(users)
+    db.flush()
+    subs = [DiscordChannel(user_id=u.id, channel_id="900") for u in users]
+    db.add_all(subs)
+    db.commit()
+    recipients = [Recipient(s.id, u.id, u.telegram_id, None) for s, u in zip(subs, users)]
+    db.close()
+
+    for i in range(burst):
+        rendered = RenderedAnnouncement(f"<b>Анонс {i}</b>\n" + "Обновление ноды. " * 20,
+                                        (MediaRef(str(5000 + i), f"https://cdn.discordapp.com/{5000 + i}.png"),))
+        save_announcements(str(100_000 + i), "text", "текст", recipients, payload=dump_payload(rendered))
+
+
+async def drain(latency: float) -> FakeBot:
+    delivery = TelegramDelivery("123456:bench")
+    delivery.bot = bot = FakeBot(latency)
+    client = SimpleNamespace(delivery=delivery, media_cache=MediaFileCache())
+    worker = outbox.OutboxWorker(
+        delivery,
+        lambda chat_id, rendered: DiscordAnnounceClient.send_to_telegram(client, chat_id, rendered),
+        lambda chat_id, items, digest_id: DiscordAnnounceClient.send_digest(client, chat_id, items, digest_id),
+    )
+    while await worker.drain_once():
+        pass
+    return bot
+
+
+async def run(args):
+    # Лимиты Telegram здесь не измеряются — снимаем их; окно дайджеста уже истекло
+    telegram_delivery.TELEGRAM_GLOBAL_RATE = telegram_delivery.TELEGRAM_GLOBAL_BURST = 10_000
+    telegram_delivery.TELEGRAM_CHAT_RATE = 10_000
+    outbox.DIGEST_WINDOW_SECONDS = 0
+    init_db()
+
+    rows = []
+    for n in args.subscribers:
+        for name, digest in (("каждый анонс", False), ("дайджест", True)):
+            seed(n, args.burst, digest)
+            with timer() as elapsed:
+                bot = await drain(args.latency)
+            rows.append((n, args.burst, name, bot.calls, f"{bot.calls / n:.1f}", f"{elapsed():.2f}"))
+
+    print_table(("подписчиков", "анонсов", "режим", "вызовов API", "на подписчика", "всего, с"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", default="50,200", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,91 @@
+# benchmarks/bench_fanout.py
+"""
+Время рассылки одного анонса N подписчикам: последовательно (как было) против
+TelegramDelivery.fan_out с token-bucket лимитами. Вместо Bot API — заглушка
+с заданной задержкой ответа и долей ответов 429 (RetryAfter).
+
+    python -m benchmarks.bench_fanout --subscribers 50,200 --latency 0.08 \\
+        --global-rate 25 --chat-rate 1 --concurrency 20 --retry-after 0.01
+
+Печатает общее время рассылки и p50/p95 задержки доставки подписчику.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import prepare_environment, print_table
+
+prepare_environment()
+
+from telegram.error import RetryAfter  # noqa: E402
+
+import telegram_delivery  # noqa: E402
+from telegram_delivery import TelegramDelivery, FanoutReport, _percentile  # noqa: E402
+
+
+class FakeBot:
+    """Заглушка telegram.Bot: отвечает через latency секунд, изредка — RetryAfter."""
+
+    def __init__(self, latency: float, retry_after_share: float):
+        self.latency = latency
+        self.retry_after_share = retry_after_share
+        self.calls = 0
+        self.retry_afters = 0
+
+    async def send_message(self, chat_id, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.retry_after_share:
+            self.retry_afters += 1
+            raise RetryAfter(1)
+        return True
+
+
+async def sequential(delivery: TelegramDelivery, chat_ids) -> FanoutReport:
+    started = time.monotonic()
+    latencies = []
+    for chat_id in chat_ids:
+        await delivery.bot.send_message(chat_id=chat_id, text="x")
+        latencies.append(time.monotonic() - started)
+    elapsed = time.monotonic() - started
+    return FanoutReport(len(chat_ids), len(latencies), 0, elapsed,
+                        _percentile(latencies, 0.5), _percentile(latencies, 0.95))
+
+
+async def concurrent(delivery: TelegramDelivery, chat_ids) -> FanoutReport:
+    return await delivery.fan_out(chat_ids, lambda chat_id: delivery.send_message(chat_id, text="x"))
+
+
+async def run(args):
+    telegram_delivery.TELEGRAM_GLOBAL_RATE = args.global_rate
+    telegram_delivery.TELEGRAM_GLOBAL_BURST = args.global_rate
+    telegram_delivery.TELEGRAM_CHAT_RATE = args.chat_rate
+    telegram_delivery.TELEGRAM_FANOUT_CONCURRENCY = args.concurrency
+
+    rows = []
+    for n in args.subscribers:
+        chat_ids = list(range(1, n + 1))
+        for name, fn, share in (("последовательно", sequential, 0.0),
+                                ("fan_out", concurrent, args.retry_after)):
+            delivery = TelegramDelivery("123456:bench")
+            bot = FakeBot(args.latency, share)
+            delivery.bot = bot
+            report = await fn(delivery, chat_ids)
+            rows.append((n, name, f"{report.elapsed:.2f}", f"{report.p50:.2f}", f"{report.p95:.2f}",
+                         f"{report.sent / report.elapsed:.1f}", bot.retry_afters))
+            await delivery._request.shutdown()
+
+    print_table(("подписчиков", "способ", "всего, с", "p50, с", "p95, с", "сообщ./с", "429"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", default="50,200", type=lambda v: [int(x) for x in v.split(",")])
+    parser.add_argument("--latency", type=float, default=0.08, help="задержка ответа Bot API, с")
+    parser.add_argument("--retry-after", type=float, default=0.01, help="доля ответов 429")
+    parser.add_argument("--global-rate", type=float, default=telegram_delivery.TELEGRAM_GLOBAL_RATE)
+    parser.add_argument("--chat-rate", type=float, default=telegram_delivery.TELEGRAM_CHAT_RATE)
+    parser.add_argument("--concurrency", type=int, default=telegram_delivery.TELEGRAM_FANOUT_CONCURRENCY)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,108 @@
+# benchmarks/bench_filters.py
+"""
+Маршрутизация сообщения по фильтрам подписчиков: проверка каждого ключевого
+слова отдельно (`keyword in text` на каждый фильтр) против FilterEngine
+(один проход автомата Ахо–Корасик по тексту).
+
+    python -m benchmarks.bench_filters [--filters 100,1000,5000] [--per-subscriber 3] [--messages 50]
+
+Печатает время маршрутизации одного сообщения и время сборки автомата канала:
+с нуля, после добавления нового слова и после удаления фильтра.
+"""
+
+import argparse
+import random
+
+from benchmarks.common import prepare_environment, timer, print_table
+
+prepare_environment()
+
+from announcement_store import Recipient  # noqa: E402
+from filter_engine import FilterEngine, normalize_keyword  # noqa: E402
+from subscription_index import Subscriber  # noqa: E402
+
+WORDS = ("node", "validator", "airdrop", "mainnet", "testnet", "snapshot", "upgrade", "faucet",
+         "staking", "bridge", "release", "rpc", "galxe", "quest", "points", "season", "token",
+         "wallet", "whitelist", "mint", "governance", "proposal", "incentive", "leaderboard")
+
+
+def make_subscribers(filters: int, per_subscriber: int, rnd: random.Random):
+    subs = []
+    filter_id = 1
+    for sub_id in range(1, filters // per_subscriber + 1):
+        own = []
+        for _ in range(per_subscriber):
+            # Словарь + суффикс: тысячи разных слов, как у реальных пользователей
+            own.append((filter_id, f"{rnd.choice(WORDS)}-{rnd.randint(1, filters)}"))
+            filter_id += 1
+        subs.append(Subscriber(sub_id, sub_id, 10_000 + sub_id, tuple(own)))
+    return tuple(subs)
+
+
+def make_message(rnd: random.Random, filters: int) -> str:
+    words = [rnd.choice(WORDS) if rnd.random() < 0.9 else f"{rnd.choice(WORDS)}-{rnd.randint(1, filters)}"
+             for _ in range(300)]
+    return " ".join(words)
+
+
+def naive_recipients(subscribers, texts):
+    folded = [t.casefold() for t in texts]
+    result = []
+    for sub in subscribers:
+        if not sub.filters:
+            result.append(Recipient(sub.subscription_id, sub.user_id, sub.telegram_id, None))
+            continue
+        for _fid, keyword in sorted(sub.filters):
+            norm = normalize_keyword(keyword)
+            if norm and any(norm in t for t in folded):
+                result.append(Recipient(sub.subscription_id, sub.user_id, sub.telegram_id, keyword))
+                break
+    return result
+
+
+def run(sizes, per_subscriber: int, messages: int):
+    rnd = random.Random(0)
+    rows = []
+    for n in sizes:
+        subscribers = make_subscribers(n, per_subscriber, rnd)
+        texts = [(make_message(rnd, n), "") for _ in range(messages)]
+
+        engine = FilterEngine()
+        with timer() as build:
+            engine.recipients("chan", subscribers, ("",))
+
+        # Один подписчик сменил фильтр — канал пересобирается, остальные каналы не трогаются
+        changed = list(subscribers)
+        changed[0] = changed[0]._replace(filters=((10 ** 9, "brand-new-keyword"),))
+        changed = tuple(changed)
+        with timer() as rebuild:
+            engine.recipients("chan", changed, ("",))
+        engine.recipients("chan", subscribers, ("",))
+
+        # Фильтр удалён — новых слов нет, автомат переиспользуется
+        removed = (subscribers[0]._replace(filters=()),) + subscribers[1:]
+        with timer() as remove:
+            engine.recipients("chan", removed, ("",))
+        engine.recipients("chan", subscribers, ("",))
+
+        for t in texts:
+            assert engine.recipients("chan", subscribers, t) == naive_recipients(subscribers, t)
+
+        for name, fn in (("каждое слово", lambda t: naive_recipients(subscribers, t)),
+                         ("автомат", lambda t: engine.recipients("chan", subscribers, t))):
+            with timer() as elapsed:
+                for t in texts:
+                    fn(t)
+            rows.append((n, len(subscribers), name, f"{elapsed() * 1000 / messages:.2f}",
+                         f"{build() * 1000:.1f} / {rebuild() * 1000:.1f} / {remove() * 1000:.1f}" if name == "автомат" else "-"))
+
+    print_table(("фильтров", "подписчиков", "способ", "мс/сообщ.", "сборка / +слово / −слово, мс"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filters", default="100,1000,5000")
+    parser.add_argument("--per-subscriber", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    run([int(x) for x in args.filters.split(",")], args.per_subscriber, args.messages)
@@ -0,0 +1,190 @@
+# benchmarks/bench_handlers.py
+"""
+Задержка ответа бота при одновременной работе многих пользователей.
+
+Настоящее приложение PTB с обработчиками handlers/discord.py и handlers/search.py
+получает поток обновлений от --users разных пользователей: «📰 Последние анонсы»,
+«📜 Мои каналы» и (каждое --search-every-е) поиск без точных совпадений — он
+читает все названия постов и ищет похожие, то есть это медленный запрос.
+Bot API — FakeTelegramServer с задержкой --latency.
+
+Сравниваются режимы (каждый — в отдельном процессе со своей базой):
+
+    прежний          — запросы прямо в event loop, обновления по очереди
+                       (DB_THREADS=0, BOT_CONCURRENT_UPDATES=1);
+    параллельно      — обновления разных пользователей одновременно, но запросы
+                       по-прежнему в event loop (DB_THREADS=0);
+    параллельно+пул  — обновления одновременно, запросы в пуле потоков db_async.
+
+    python -m benchmarks.bench_handlers [--users 100] [--updates 600] [--rate 40] [--posts 20000]
+
+Задержка — от помещения обновления в очередь приложения до завершения обработчика.
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import multiprocessing
+
+from benchmarks.common import prepare_environment, print_table
+
+MODES = (
+    ("прежний", {"DB_THREADS": "0", "BOT_CONCURRENT_UPDATES": "1"}),
+    ("параллельно", {"DB_THREADS": "0", "BOT_CONCURRENT_UPDATES": "32"}),
+    ("параллельно+пул", {"DB_THREADS": "", "BOT_CONCURRENT_UPDATES": "32"}),
+)
+KINDS = ("анонсы", "мои каналы", "поиск")
+
+
+def seed(users: int, posts: int):
+    from sqlalchemy import insert
+    from db import init_db, SessionLocal, engine
+    from models import User, DiscordChannel, AvailableDiscordChannel, Post
+    from announcement_store import Recipient, save_announcements
+
+    init_db()
+    db = SessionLocal()
+    rows = [User(telegram_id=10_000 + i, username=f"user{i}") for i in range(users)]
+    db.add_all(rows)
+    db.flush()
+    subs = [DiscordChannel(user_id=u.id, channel_id=str(900 + i % 5), active=True) for i, u in enumerate(rows)]
+    db.add_all(subs)
+    db.add_all(AvailableDiscordChannel(channel_id=str(900 + c), channel_name=f"announcements-{c}") for c in range(5))
+    db.commit()
+    recipients = [Recipient(s.id, s.user_id, s.user.telegram_id, None) for s in subs]
+    db.close()
+    for m in range(10):
+        save_announcements(f"bench-{m}", f"Announcement {m}\n" + "text " * 60,
+                           f"Анонс {m}\n" + "текст " * 60, recipients, payload="{}")
+    with engine.begin() as conn:
+        conn.execute(insert(Post.__table__), [
+            {"title": f"Guide {p}: node setup {p % 97}", "link": f"https://t.me/bench/{p}", "archived": False}
+            for p in range(posts)
+        ])
+
+
+def _updates(args):
+    """(вид, данные обновления) в порядке поступления."""
+    rnd = random.Random(1)
+    for n in range(args.updates):
+        telegram_id = 10_000 + rnd.randrange(args.users)
+        user = {"id": telegram_id, "is_bot": False, "first_name": "bench"}
+        chat = {"id": telegram_id, "type": "private"}
+        if args.search_every and n % args.search_every == args.search_every - 1:
+            yield "поиск", {"update_id": n + 1, "message": {
+                "message_id": n + 1, "date": int(time.time()), "chat": chat, "from": user,
+                "text": f"zz-no-such-post-{n}"}}
+            continue
+        data = "latest_discord_announcements" if n % 3 else "view_my_channels"
+        yield ("анонсы" if n % 3 else "мои каналы"), {"update_id": n + 1, "callback_query": {
+            "id": str(n + 1), "from": user, "chat_instance": "bench", "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": "menu"}}}
+
+
+async def drive(args) -> dict:
+    from telegram import Update
+    from telegram.ext import (
+        ApplicationBuilder, CallbackQueryHandler, MessageHandler, TypeHandler, filters,
+    )
+    from handlers.discord import discord_menu_callback
+    from handlers.search import search_process
+    from handlers.utils import BOT_CONCURRENT_UPDATES, PerUserUpdateProcessor
+    from db_async import shutdown_db_executor
+    from benchmarks.pipeline import FakeTelegramServer
+
+    fake = await FakeTelegramServer(latency=args.latency).start()
+    builder = ApplicationBuilder().token(os.environ["TELEGRAM_TOKEN"]).base_url(fake.base_url).updater(None)
+    if BOT_CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(BOT_CONCURRENT_UPDATES))
+    app = builder.build()
+
+    queued, done, kinds, errors = {}, {}, {}, []
+
+    async def finished(update, context):
+        done[update.update_id] = time.perf_counter()
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+
+    app.add_handler(CallbackQueryHandler(discord_menu_callback))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, search_process))
+    app.add_handler(TypeHandler(Update, finished), group=1)
+    app.add_error_handler(on_error)
+
+    await app.initialize()
+    await app.start()
+    started = time.perf_counter()
+    for n, (kind, raw) in enumerate(_updates(args)):
+        delay = started + n / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.de_json(raw, app.bot)
+        kinds[update.update_id] = kind
+        queued[update.update_id] = time.perf_counter()
+        await app.update_queue.put(update)
+
+    deadline = time.monotonic() + args.timeout
+    while len(done) < len(queued) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    await app.stop()
+    await app.shutdown()
+    await fake.stop()
+    shutdown_db_executor()
+
+    latencies = {kind: [] for kind in KINDS}
+    for update_id, finished_at in done.items():
+        latencies[kinds[update_id]].append(finished_at - queued[update_id])
+    return {"latencies": latencies, "lost": len(queued) - len(done), "elapsed": elapsed, "errors": errors}
+
+
+def mode_process(env: dict, args, results):
+    prepare_environment()
+    for key, value in env.items():
+        if value:
+            os.environ[key] = value
+        else:
+            os.environ.pop(key, None)
+    seed(args.users, args.posts)
+    results.put(asyncio.run(drive(args)))
+
+
+def run(args):
+    prepare_environment()  # telegram_delivery читает config.py
+    from telegram_delivery import _percentile
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for name, env in MODES:
+        results = ctx.Queue()
+        process = ctx.Process(target=mode_process, args=(env, args, results))
+        process.start()
+        result = results.get()
+        process.join()
+        if result["errors"]:
+            print(f"{name}: ошибок в обработчиках {len(result['errors'])}, первая: {result['errors'][0]}")
+        for kind in KINDS:
+            values = result["latencies"][kind]
+            rows.append((
+                name, kind, len(values),
+                f"{_percentile(values, 0.5) * 1000:.0f}", f"{_percentile(values, 0.95) * 1000:.0f}",
+                f"{max(values, default=0) * 1000:.0f}",
+                result["lost"] if kind == KINDS[0] else "",
+                f"{result['elapsed']:.1f}" if kind == KINDS[0] else "",
+            ))
+    print()
+    print_table(("режим", "обновление", "шт.", "p50, мс", "p95, мс", "max, мс", "не дождались", "всего, с"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="разных пользователей")
+    parser.add_argument("--updates", type=int, default=600, help="обновлений всего")
+    parser.add_argument("--rate", type=float, default=40, help="обновлений в секунду")
+    parser.add_argument("--search-every", type=int, default=30, help="каждое N-е обновление — поиск (0 — без поиска)")
+    parser.add_argument("--posts", type=int, default=20000, help="постов в базе (объём медленного поиска)")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--timeout", type=float, default=120)
+    run(parser.parse_args())
@@ -0,0 +1,90 @@
+# benchmarks/bench_media.py
+"""
+Рассылка анонса с картинками N подписчикам: ссылка CDN Discord каждому
+(Telegram скачивает файл заново для каждого чата) против MediaFileCache
+(первая загрузка по ссылке, дальше — file_id). Вместо Bot API — заглушка:
+отправка по ссылке стоит --upload-latency, по file_id — --latency.
+
+    python -m benchmarks.bench_media [--subscribers 50,200] [--images 4] \\
+        [--latency 0.05] [--upload-latency 0.4]
+
+Печатает время рассылки и число загрузок по ссылке.
+"""
+
+import argparse
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.common import prepare_environment, timer, print_table
+
+prepare_environment()
+
+import telegram_delivery  # noqa: E402
+from telegram import InputMediaPhoto  # noqa: E402
+from telegram_delivery import TelegramDelivery  # noqa: E402
+from media_cache import MediaFileCache, MediaRef  # noqa: E402
+
+
+class FakeBot:
+    """Заглушка telegram.Bot: загрузка по ссылке медленная, по file_id — быстрая."""
+
+    def __init__(self, latency: float, upload_latency: float):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.url_uploads = 0
+
+    async def _photo(self, source: str):
+        if source.startswith("https://"):
+            self.url_uploads += 1
+            await asyncio.sleep(self.upload_latency)
+            return SimpleNamespace(photo=[SimpleNamespace(file_id=f"fid-{source}")])
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=source)])
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._photo(photo)
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        return tuple(await asyncio.gather(*(self._photo(m.media) for m in media)))
+
+
+async def without_cache(delivery, chat_ids, refs):
+    media = [InputMediaPhoto(media=r.url) for r in refs]
+    send = (lambda c: delivery.send_photo(c, refs[0].url)) if len(refs) == 1 else \
+           (lambda c: delivery.send_media_group(c, media))
+    return await delivery.fan_out(chat_ids, send)
+
+
+async def with_cache(delivery, chat_ids, refs):
+    cache = MediaFileCache()
+    return await delivery.fan_out(chat_ids, lambda c: cache.send(delivery, c, refs))
+
+
+async def run(args):
+    # Лимиты Telegram здесь не измеряются — снимаем их
+    telegram_delivery.TELEGRAM_GLOBAL_RATE = telegram_delivery.TELEGRAM_GLOBAL_BURST = 10_000
+    telegram_delivery.TELEGRAM_CHAT_RATE = 10_000
+
+    refs = [MediaRef(str(1000 + i), f"https://cdn.discordapp.com/attachments/1/{1000 + i}/img.png")
+            for i in range(args.images)]
+    rows = []
+    for n in args.subscribers:
+        chat_ids = list(range(1, n + 1))
+        for name, fn in (("ссылка каждому", without_cache), ("кэш file_id", with_cache)):
+            delivery = TelegramDelivery("123456:bench")
+            delivery.bot = bot = FakeBot(args.latency, args.upload_latency)
+            with timer() as elapsed:
+                report = await fn(delivery, chat_ids, refs)
+            assert report.sent == n
+            rows.append((n, args.images, name, bot.url_uploads, f"{elapsed():.2f}", f"{report.p95:.2f}"))
+
+    print_table(("подписчиков", "картинок", "способ", "загрузок по ссылке", "всего, с", "p95, с"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", default="50,200", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--upload-latency", type=float, default=0.4)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,100 @@
+# benchmarks/bench_mentions.py
+"""
+Разрешение упоминаний <#ID>/<@ID> в анонсе с большим числом упоминаний:
+запрос к БД на каждое совпадение (как было в send_to_telegram) против
+MentionCache в памяти (render_announcement).
+
+    python -m benchmarks.bench_mentions [--mentions 20,100] [--renders 200]
+
+Печатает SQL-запросы и время на один рендер.
+"""
+
+import argparse
+import html
+import re
+from datetime import datetime
+
+from benchmarks.common import prepare_environment, StatementCounter, timer, print_table
+
+prepare_environment()
+
+from db import engine, init_db, SessionLocal  # noqa: E402
+from models import User, AvailableDiscordChannel  # noqa: E402
+from mention_cache import MentionCache  # noqa: E402
+from announcement_render import render_announcement  # noqa: E402
+
+CHANNELS = 50
+USERS = 50
+
+
+def make_message(mentions: int) -> str:
+    parts = []
+    for i in range(mentions):
+        parts.append(f"<#{900000 + i % CHANNELS}>" if i % 2 else f"<@{i % USERS + 1}>")
+        parts.append("**update** for the community,")
+    return " ".join(parts)
+
+
+def seed():
+    db = SessionLocal()
+    db.add_all(AvailableDiscordChannel(channel_id=str(900000 + i), channel_name=f"channel-{i}", is_active=True)
+               for i in range(CHANNELS))
+    db.add_all(User(telegram_id=str(5_000_000 + i), username=f"user{i}") for i in range(USERS))
+    db.commit()
+    db.close()
+
+
+def legacy_mentions(text: str) -> str:
+    """Прежняя логика: новая сессия и SELECT на каждое упоминание."""
+    def replace_channel_mention(match):
+        s = SessionLocal()
+        row = s.query(AvailableDiscordChannel).filter_by(channel_id=match.group(1)).first()
+        s.close()
+        return f"#{html.escape(row.channel_name)}" if row else "#unknown"
+
+    def replace_user_mention(match):
+        s = SessionLocal()
+        row = s.query(User).filter_by(id=int(match.group(1))).first()
+        s.close()
+        return f"@{html.escape(row.username)}" if row and row.username else "@unknown"
+
+    content = re.sub(r"<#(\d+)>", replace_channel_mention, text)
+    return re.sub(r"<@!?(\d+)>", replace_user_mention, content)
+
+
+def run(sizes, renders):
+    init_db()
+    seed()
+
+    cache = MentionCache()
+    cache.load_channels()
+    for i in range(USERS):
+        cache.remember_user(str(i + 1), f"user{i}")
+
+    counter = StatementCounter(engine)
+    created_at = datetime(2024, 1, 1)
+    rows = []
+    for n in sizes:
+        text = make_message(n)
+        # Оба способа должны давать одинаковые имена
+        assert "#unknown" not in legacy_mentions(text)
+        assert "#unknown" not in render_announcement(text, "ann", created_at, (), cache).html
+
+        for name, fn in (("SQL на упоминание", legacy_mentions),
+                         ("MentionCache", lambda t: render_announcement(t, "ann", created_at, (), cache))):
+            counter.reset()
+            with timer() as elapsed:
+                for _ in range(renders):
+                    fn(text)
+            rows.append((n, name, f"{counter.statements / renders:.0f}",
+                         f"{elapsed() * 1e6 / renders:.0f}"))
+
+    print_table(("упоминаний", "способ", "SQL/рендер", "мкс/рендер"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mentions", default="20,100")
+    parser.add_argument("--renders", type=int, default=200)
+    args = parser.parse_args()
+    run([int(x) for x in args.mentions.split(",")], args.renders)
@@ -0,0 +1,139 @@
+# benchmarks/bench_pipeline.py
+"""
+Сквозной прогон конвейера Discord → Telegram без сети: синтетические сообщения
+подаются в DiscordAnnounceClient.on_message, дальше всё настоящее — фильтры,
+рендер, запись в delivery_outbox, OutboxWorker и TelegramDelivery, — только
+Bot API подменён локальным HTTP-сервером (benchmarks/pipeline.py), а база —
+временным файлом SQLite.
+
+    python -m benchmarks.bench_pipeline [--subscribers 10,100,500] [--size 500,4000] \\
+        [--media 0,2] [--messages 20] [--rate 0] [--latency 0.0] [--telegram-limits]
+
+Для каждого сочетания подписчиков, длины текста и числа картинок печатает
+пропускную способность on_message (сообщ./с), время до доставки последнему
+подписчику, задержку доставки подписчику (p50/p95/max от подачи сообщения до
+sendMessage) и число SQL-запросов на сообщение (вместе с очередью доставки).
+
+По умолчанию лимиты Telegram сняты, чтобы мерить сам конвейер;
+--telegram-limits оставляет боевые TELEGRAM_* из окружения.
+"""
+
+import re
+import time
+import asyncio
+import argparse
+import itertools
+
+from benchmarks.common import prepare_environment, StatementCounter, timer, print_table
+
+prepare_environment()
+
+import translation  # noqa: E402
+import telegram_delivery  # noqa: E402
+from db import engine, init_db, SessionLocal  # noqa: E402
+from models import User, DiscordChannel  # noqa: E402
+from telegram_delivery import _percentile  # noqa: E402
+from benchmarks.pipeline import (  # noqa: E402
+    FakeTelegramServer, synthetic_message, offline_client, close_offline_client,
+)
+
+MARKER_RE = re.compile(r"bench-msg-(\d+)")
+FILLER = "Node operators: update to the new release before the upgrade height. "
+
+_next_message = itertools.count(1_000_000)
+_next_user = itertools.count(50_000_000)
+
+
+def seed(channel_id: str, subscribers: int):
+    db = SessionLocal()
+    users = [User(telegram_id=str(next(_next_user)), username=None) for _ in range(subscribers)]
+    db.add_all(users)
+    db.flush()
+    db.add_all(DiscordChannel(user_id=u.id, channel_id=channel_id, active=True) for u in users)
+    db.commit()
+    db.close()
+
+
+def make_text(message_id: int, size: int) -> str:
+    head = f"bench-msg-{message_id} "
+    return head + (FILLER * (size // len(FILLER) + 1))[:max(0, size - len(head))]
+
+
+async def run_case(server: FakeTelegramServer, counter: StatementCounter, channel_id: str,
+                   subscribers: int, size: int, media: int, args) -> tuple:
+    seed(channel_id, subscribers)
+    client = await offline_client(server.base_url)
+    server.reset()
+    counter.reset()
+    submitted = {}
+
+    try:
+        with timer() as total:
+            with timer() as ingest:
+                for _ in range(args.messages):
+                    message_id = next(_next_message)
+                    message = synthetic_message(message_id, channel_id, make_text(message_id, size), media)
+                    submitted[message_id] = time.monotonic()
+                    await client.on_message(message)
+                    if args.rate > 0:
+                        await asyncio.sleep(1 / args.rate)
+            delivered = await server.wait_messages(args.messages * subscribers, args.timeout)
+    finally:
+        await close_offline_client(client)
+
+    latencies = []
+    for received, _, text in server.messages:
+        found = MARKER_RE.search(text)
+        if found and int(found.group(1)) in submitted:
+            latencies.append(received - submitted[int(found.group(1))])
+
+    return (
+        subscribers, size, media,
+        f"{args.messages / ingest():.1f}",
+        f"{total():.2f}" if delivered else f">{args.timeout:.0f}",
+        f"{len(latencies)}/{args.messages * subscribers}",
+        f"{_percentile(latencies, 0.5) * 1000:.0f}",
+        f"{_percentile(latencies, 0.95) * 1000:.0f}",
+        f"{max(latencies, default=0) * 1000:.0f}",
+        f"{counter.statements / args.messages:.1f}",
+        sum(server.calls.values()) - server.calls.get("getMe", 0),
+    )
+
+
+async def run(args):
+    # Перевод ходит в сеть — в офлайн-прогоне анонсы остаются без перевода
+    translation.Translator = None
+    if not args.telegram_limits:
+        telegram_delivery.TELEGRAM_GLOBAL_RATE = telegram_delivery.TELEGRAM_GLOBAL_BURST = 100_000
+        telegram_delivery.TELEGRAM_CHAT_RATE = telegram_delivery.TELEGRAM_CHAT_BURST = 100_000
+    init_db()
+
+    server = await FakeTelegramServer(args.latency).start()
+    counter = StatementCounter(engine)
+    rows = []
+    try:
+        cases = itertools.product(args.subscribers, args.size, args.media)
+        for i, (subscribers, size, media) in enumerate(cases):
+            rows.append(await run_case(server, counter, str(900_000 + i), subscribers, size, media, args))
+    finally:
+        await server.stop()
+
+    print_table(("подписчиков", "символов", "картинок", "on_message, сообщ./с", "доставка, с",
+                 "доставлено", "p50, мс", "p95, мс", "max, мс", "SQL/сообщ.", "вызовов API"), rows)
+
+
+def _ints(value: str):
+    return [int(x) for x in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", default="10,100,500", type=_ints)
+    parser.add_argument("--size", default="500,4000", type=_ints, help="длина текста сообщения, символов")
+    parser.add_argument("--media", default="0,2", type=_ints, help="картинок-вложений в сообщении")
+    parser.add_argument("--messages", type=int, default=20, help="сообщений на каждое сочетание")
+    parser.add_argument("--rate", type=float, default=0, help="сообщений в секунду (0 — без пауз)")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--timeout", type=float, default=300, help="сколько ждать доставки, с")
+    parser.add_argument("--telegram-limits", action="store_true", help="не снимать лимиты Telegram")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,109 @@
+# benchmarks/bench_query_plans.py
+"""
+Планы и время горячих запросов до и после миграции 0002_hot_path_indexes.
+
+Временная SQLite-база создаётся миграциями до 0001_baseline (схема, как её
+создавал init_db), заполняется данными, затем для каждого запроса печатаются
+EXPLAIN QUERY PLAN и среднее время; после `upgrade head` — то же самое.
+
+    python -m benchmarks.bench_query_plans [--users 2000] [--messages 50] [--repeat 200]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks.common import prepare_environment, timer, print_table
+
+prepare_environment()
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from db import engine  # noqa: E402
+
+HOT_QUERIES = (
+    ("анонсы пользователя",
+     "SELECT * FROM discord_announcements WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 5"),
+    ("дедупликация анонса",
+     "SELECT user_id FROM discord_announcements WHERE message_id = :message_id"),
+    ("подписчики канала",
+     "SELECT id, user_id FROM discord_channels WHERE channel_id = :channel_id AND active = 1"),
+    ("изменения подписок",
+     "SELECT id FROM discord_channels WHERE updated_at >= :since"),
+    ("фильтры подписок",
+     "SELECT id, keyword FROM filters WHERE channel_id IN (:sub_a, :sub_b) AND active = 1"),
+    ("изменения фильтров",
+     "SELECT channel_id FROM filters WHERE updated_at >= :since"),
+    ("посты категории",
+     "SELECT * FROM posts WHERE category_id = :category_id AND archived = 0 ORDER BY id"),
+    ("пользователь по telegram_id",
+     "SELECT * FROM users WHERE telegram_id = :telegram_id"),
+)
+
+
+def seed(users: int, messages: int):
+    now = datetime.utcnow()
+    old = now - timedelta(days=30)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, telegram_id, username) VALUES (:id, :tg, :name)"),
+                     [{"id": i, "tg": str(100_000 + i), "name": f"user{i}"} for i in range(1, users + 1)])
+        conn.execute(text("INSERT INTO discord_channels (id, user_id, channel_id, active, updated_at) "
+                          "VALUES (:id, :user_id, :channel_id, :active, :updated_at)"),
+                     [{"id": i, "user_id": i, "channel_id": str(900 + i % 20), "active": i % 10 != 0,
+                       "updated_at": old} for i in range(1, users + 1)])
+        conn.execute(text("INSERT INTO filters (user_id, channel_id, keyword, active, updated_at) "
+                          "VALUES (:user_id, :channel_id, :keyword, 1, :updated_at)"),
+                     [{"user_id": i, "channel_id": i, "keyword": f"kw{i % 50}", "updated_at": old}
+                      for i in range(1, users + 1, 3)])
+        conn.execute(text("INSERT INTO discord_announcements "
+                          "(channel_id, user_id, message_id, content, translated, created_at) "
+                          "VALUES (:sub, :user_id, :message_id, :content, :content, :created_at)"),
+                     [{"sub": u, "user_id": u, "message_id": str(5_000_000 + m), "content": "text " * 40,
+                       "created_at": old + timedelta(minutes=m)}
+                      for m in range(messages) for u in range(1 + m % 20, users + 1, 20)])
+        conn.execute(text("INSERT INTO categories (id, name) VALUES (:id, :name)"),
+                     [{"id": c, "name": f"cat{c}"} for c in range(1, 51)])
+        conn.execute(text("INSERT INTO posts (title, link, category_id, archived, created_at) "
+                          "VALUES (:title, :link, :category_id, :archived, :created_at)"),
+                     [{"title": f"post{p}", "link": f"https://t.me/c/{p}", "category_id": 1 + p % 50,
+                       "archived": p % 4 == 0, "created_at": old} for p in range(users * 2)])
+
+
+def measure(args, stage: str) -> list:
+    params = {
+        "user_id": args.users // 2, "message_id": str(5_000_000 + args.messages // 2), "channel_id": "905",
+        "since": datetime.utcnow() - timedelta(seconds=10), "sub_a": 10, "sub_b": 11,
+        "category_id": 7, "telegram_id": 100_000 + args.users // 3,
+    }
+    rows = []
+    with engine.connect() as conn:
+        for name, sql in HOT_QUERIES:
+            plan = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            with timer() as elapsed:
+                for _ in range(args.repeat):
+                    conn.execute(text(sql), params).fetchall()
+            rows.append((stage, name, " / ".join(r[-1] for r in plan), f"{elapsed() * 1e6 / args.repeat:.0f}"))
+    return rows
+
+
+def run(args):
+    config = Config("alembic.ini")
+    command.upgrade(config, "0001_baseline")
+    seed(args.users, args.messages)
+
+    before = measure(args, "до")
+    command.upgrade(config, "0002_hot_path_indexes")
+    after = measure(args, "после")
+
+    rows = [row for pair in zip(before, after) for row in pair]
+    print()
+    print_table(("миграция", "запрос", "план (EXPLAIN QUERY PLAN)", "мкс/запрос"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50, help="сообщений Discord (каждое — 1/20 пользователей)")
+    parser.add_argument("--repeat", type=int, default=200)
+    run(parser.parse_args())
@@ -0,0 +1,181 @@
+# benchmarks/bench_sqlite_contention.py
+"""
+Конкурентный доступ трёх процессов к одному файлу SQLite, как в бою:
+
+    discord — пишет анонсы пакетами (save_announcements) и разбирает очередь
+              доставки (fetch_due / mark_results);
+    bot     — короткие чтения обработчиков (последние анонсы пользователя,
+              его подписки) и изредка запись настроек;
+    admin   — тяжёлые чтения панели (сводка по каналам, последние анонсы).
+
+Каждая роль — отдельный процесс со своим профилем из db.STORAGE_PROFILES и
+несколькими потоками. Сравниваются прежние настройки (SQLITE_TUNING=0: журнал
+DELETE, соединение на сессию) и профили процессов (WAL, busy_timeout, пул).
+
+    python -m benchmarks.bench_sqlite_contention [--seconds 10] [--subscribers 200]
+
+Печатает по каждой роли операции в секунду, задержки (p50/p95/max), сколько
+операций заняли дольше 250 мс (ожидали блокировку) и сколько упали
+с «database is locked».
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+from benchmarks.common import prepare_environment, print_table
+
+THREADS = {"discord": 2, "bot": 4, "admin": 1}
+LOCK_WAIT = 0.25  # операция дольше — почти наверняка ждала блокировку
+
+
+def _env(db_path: str, tuning: bool, role: str):
+    prepare_environment(db_path)
+    os.environ["SQLITE_TUNING"] = "1" if tuning else "0"
+    os.environ["DB_ROLE"] = role
+
+
+def seed(db_path: str, tuning: bool, subscribers: int):
+    _env(db_path, tuning, "default")
+    from db import init_db, SessionLocal
+    from models import User, DiscordChannel
+    from announcement_store import Recipient, save_announcements
+
+    init_db()
+    db = SessionLocal()
+    users = [User(telegram_id=str(10_000 + i)) for i in range(subscribers)]
+    db.add_all(users)
+    db.flush()
+    subs = [DiscordChannel(user_id=u.id, channel_id=str(900 + i % 3), active=True) for i, u in enumerate(users)]
+    db.add_all(subs)
+    db.commit()
+    recipients = [Recipient(s.id, s.user_id, s.user.telegram_id, None) for s in subs]
+    db.close()
+    for i in range(50):
+        save_announcements(f"seed-{i}", "text " * 200, "текст " * 200, recipients, payload="{}")
+
+
+def role_process(db_path: str, tuning: bool, role: str, seconds: float, results):
+    _env(db_path, tuning, role)
+    import threading
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+    from db import SessionLocal
+    from models import User, DiscordChannel, DiscordAnnouncement, DiscordMessage
+    from announcement_store import Recipient, save_announcements
+    import outbox
+
+    db = SessionLocal()
+    subs = db.query(DiscordChannel).all()
+    recipients = [Recipient(s.id, s.user_id, s.user.telegram_id, None) for s in subs]
+    user_ids = [s.user_id for s in subs]
+    db.close()
+
+    def discord_op(n: int, worker: int):
+        if n % 2 == 0:
+            save_announcements(f"{role}-{worker}-{n}", "text " * 200, "текст " * 200, recipients, payload="{}")
+        else:
+            items = outbox.fetch_due(200)
+            outbox.mark_results([item.id for item in items], [])
+
+    def bot_op(n: int, worker: int):
+        db = SessionLocal()
+        try:
+            user_id = random.choice(user_ids)
+            if n % 10 == 0:
+                db.query(User).filter(User.id == user_id).update({User.digest_mode: bool(n % 20)})
+                db.commit()
+            else:
+                db.query(DiscordAnnouncement.created_at, DiscordMessage.content, DiscordMessage.translated)\
+                  .join(DiscordMessage, DiscordMessage.message_id == DiscordAnnouncement.message_id)\
+                  .filter(DiscordAnnouncement.user_id == user_id)\
+                  .order_by(DiscordAnnouncement.created_at.desc())\
+                  .limit(5).all()
+                db.query(DiscordChannel).filter(DiscordChannel.user_id == user_id).all()
+        finally:
+            db.close()
+
+    def admin_op(n: int, worker: int):
+        db = SessionLocal()
+        try:
+            db.query(DiscordAnnouncement.channel_id, func.count(DiscordAnnouncement.id))\
+              .group_by(DiscordAnnouncement.channel_id).all()
+            db.query(DiscordAnnouncement.id, DiscordMessage.content, User.telegram_id)\
+              .join(DiscordMessage, DiscordMessage.message_id == DiscordAnnouncement.message_id)\
+              .join(User, User.id == DiscordAnnouncement.user_id)\
+              .order_by(DiscordAnnouncement.id.desc()).limit(100).all()
+        finally:
+            db.close()
+
+    op = {"discord": discord_op, "bot": bot_op, "admin": admin_op}[role]
+    latencies, locked = [], [0]
+    deadline = time.monotonic() + seconds
+
+    def worker(index: int):
+        n = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                op(n, index)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked[0] += 1
+            latencies.append(time.perf_counter() - started)
+            n += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS[role])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((role, latencies, locked[0]))
+
+
+def run_variant(tuning: bool, args, ctx) -> list:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="nodebot-contention-"), "bench.sqlite3")
+    prepare_environment(db_path)  # telegram_delivery читает config.py
+    from telegram_delivery import _percentile
+
+    process = ctx.Process(target=seed, args=(db_path, tuning, args.subscribers))
+    process.start()
+    process.join()
+
+    results = ctx.Queue()
+    processes = [ctx.Process(target=role_process, args=(db_path, tuning, role, args.seconds, results))
+                 for role in THREADS]
+    for p in processes:
+        p.start()
+    collected = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    rows = []
+    for role, latencies, locked in sorted(collected, key=lambda r: list(THREADS).index(r[0])):
+        rows.append((
+            "профили" if tuning else "прежние", role, THREADS[role],
+            f"{len(latencies) / args.seconds:.1f}",
+            f"{_percentile(latencies, 0.5) * 1000:.1f}", f"{_percentile(latencies, 0.95) * 1000:.1f}",
+            f"{max(latencies, default=0) * 1000:.0f}",
+            sum(1 for x in latencies if x > LOCK_WAIT), locked,
+        ))
+    return rows
+
+
+def run(args):
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for tuning in (False, True):
+        rows.extend(run_variant(tuning, args, ctx))
+    print_table(("настройки", "роль", "потоков", "оп./с", "p50, мс", "p95, мс", "max, мс",
+                 f"ждали >{LOCK_WAIT * 1000:.0f} мс", "locked"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--subscribers", type=int, default=200)
+    run(parser.parse_args())
@@ -0,0 +1,143 @@
+# benchmarks/bench_storage.py
+"""
+Место на диске до и после миграций 0003_discord_messages и 0004_outbox_payloads.
+
+Временная SQLite-база размечается миграциями до 0002_hot_path_indexes (текст
+анонса копируется в каждую строку discord_announcements, готовый JSON для
+Telegram — в каждое задание delivery_outbox), заполняется: --messages сообщений
+по --size байт (оригинал и перевод) для --subscribers подписчиков. Затем
+`upgrade head` переносит текст в discord_messages, а JSON — в outbox_payloads,
+VACUUM (и checkpoint журнала WAL) возвращает освободившиеся страницы файловой системе.
+
+    python -m benchmarks.bench_storage [--subscribers 2000] [--messages 5] [--size 4096]
+
+Печатает размер файла, занятое место и объём каждой таблицы с её индексами
+(по dbstat, если SQLite собран с ним), а также время запроса последних
+анонсов пользователя до и после (после — через join с discord_messages).
+"""
+
+import os
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from benchmarks.common import prepare_environment, timer, print_table
+
+DB_PATH = prepare_environment()
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from db import engine  # noqa: E402
+
+TABLES = ("discord_announcements", "discord_messages", "delivery_outbox", "outbox_payloads")
+
+LATEST_BEFORE = ("SELECT created_at, content, translated, matched_filter FROM discord_announcements "
+                 "WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 5")
+LATEST_AFTER = ("SELECT a.created_at, m.content, m.translated, a.matched_filter FROM discord_announcements a "
+                "JOIN discord_messages m ON m.message_id = a.message_id "
+                "WHERE a.user_id = :user_id ORDER BY a.created_at DESC LIMIT 5")
+
+
+def seed(subscribers: int, messages: int, size: int):
+    now = datetime.utcnow()
+    content = ("Node update v1.2.3 is live, upgrade before the snapshot. " * (size // 56 + 1))[:size]
+    # Кириллица в UTF-8 — два байта на символ
+    translated = ("Обновление ноды v1.2.3, обновитесь до снапшота. " * (size // 80 + 1))[:size // 2]
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, telegram_id, username) VALUES (:id, :tg, :name)"),
+                     [{"id": i, "tg": 100_000 + i, "name": f"user{i}"} for i in range(1, subscribers + 1)])
+        conn.execute(text("INSERT INTO discord_channels (id, user_id, channel_id, active) "
+                          "VALUES (:id, :id, '900', 1)"),
+                     [{"id": i} for i in range(1, subscribers + 1)])
+        for m in range(messages):
+            conn.execute(text("INSERT INTO discord_announcements "
+                              "(channel_id, user_id, message_id, content, translated, created_at) "
+                              "VALUES (:sub, :sub, :message_id, :content, :translated, :created_at)"),
+                         [{"sub": u, "message_id": str(5_000_000 + m), "content": f"{m} {content}",
+                           "translated": f"{m} {translated}", "created_at": now + timedelta(minutes=m)}
+                          for u in range(1, subscribers + 1)])
+            # Доставленные задания хранятся OUTBOX_KEEP_SENT_DAYS — столько же копий JSON
+            payload = json.dumps({"html": f"<b>#announcements</b>\n{m} {translated}", "media": [],
+                                  "posted_at": 0}, ensure_ascii=False)
+            conn.execute(text("INSERT INTO delivery_outbox "
+                              "(message_id, user_id, chat_id, payload, status, attempts, created_at) "
+                              "VALUES (:message_id, :user_id, :chat_id, :payload, 'sent', 0, :created_at)"),
+                         [{"message_id": str(5_000_000 + m), "user_id": u, "chat_id": str(100_000 + u),
+                           "payload": payload, "created_at": now + timedelta(minutes=m)}
+                          for u in range(1, subscribers + 1)])
+
+
+def measure() -> dict:
+    with engine.connect() as conn:
+        # В режиме WAL новые страницы сначала попадают в журнал — переносим их в файл базы
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        used = (conn.execute(text("PRAGMA page_count")).scalar()
+                - conn.execute(text("PRAGMA freelist_count")).scalar()) * page_size
+        per_table = defaultdict(int)
+        try:
+            rows = conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).fetchall()
+            indexes = {name: table for name, table in
+                       conn.execute(text("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"))}
+            for name, size in rows:
+                per_table[indexes.get(name, name)] += size
+        except OperationalError:
+            per_table = None  # SQLite без dbstat
+    return {"file": os.path.getsize(DB_PATH), "used": used, "tables": per_table}
+
+
+def latest_query_us(sql: str, repeat: int, subscribers: int) -> float:
+    with engine.connect() as conn:
+        with timer() as elapsed:
+            for i in range(repeat):
+                conn.execute(text(sql), {"user_id": 1 + i % subscribers}).fetchall()
+    return elapsed() * 1e6 / repeat
+
+
+def _mib(size) -> str:
+    return "—" if size is None else f"{size / 1024 / 1024:.1f}"
+
+
+def run(args):
+    config = Config("alembic.ini")
+    command.upgrade(config, "0002_hot_path_indexes")
+    seed(args.subscribers, args.messages, args.size)
+
+    stages = [("до (0002)", measure(), latest_query_us(LATEST_BEFORE, args.repeat, args.subscribers))]
+    with timer() as elapsed:
+        command.upgrade(config, "head")
+    migrate_seconds = elapsed()
+    after_query = latest_query_us(LATEST_AFTER, args.repeat, args.subscribers)
+    stages.append(("после миграции", measure(), after_query))
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    stages.append(("после VACUUM", measure(), after_query))
+
+    rows = []
+    for name, m, query_us in stages:
+        tables = m["tables"]
+        rows.append((name, _mib(m["file"]), _mib(m["used"]),
+                     *(_mib(tables.get(t, 0) if tables is not None else None) for t in TABLES),
+                     f"{query_us:.0f}"))
+    print()
+    print(f"{args.messages} сообщений × {args.subscribers} подписчиков, "
+          f"текст {args.size} байт + перевод; миграция {migrate_seconds:.1f} с")
+    print_table(("этап", "файл, МиБ", "занято, МиБ", *(f"{t}, МиБ" for t in TABLES),
+                 "последние анонсы, мкс"), rows)
+    before = stages[0][1]["file"]
+    saved = before - stages[-1][1]["file"]
+    share = f" ({saved / before * 100:.0f}% файла)" if before else ""
+    print(f"\nЭкономия: {_mib(saved)} МиБ{share}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--size", type=int, default=4096, help="байт оригинального текста сообщения")
+    parser.add_argument("--repeat", type=int, default=500, help="повторов запроса последних анонсов")
+    run(parser.parse_args())
@@ -0,0 +1,69 @@
+# benchmarks/common.py
+"""
+Общая обвязка бенчмарков: временная SQLite-база и счётчик SQL-запросов.
+
+Все бенчмарки запускаются из корня репозитория как модули:
+    python -m benchmarks.bench_announcements
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def prepare_environment(db_path: str = None) -> str:
+    """
+    Подставляет фиктивные переменные окружения (config.py требует их наличия)
+    и направляет DATABASE_URL во временный файл. Вызывать ДО импорта db/models.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="nodebot-bench-"), "bench.sqlite3")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")
+    os.environ.setdefault("SUBSCRIPTION_CHANNEL", "@bench")
+    os.environ.setdefault("ADMIN_USERNAME", "bench")
+    os.environ.setdefault("ADMIN_PASSWORD", "bench")
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "bench")
+    # Временную базу бенчмарка размечает миграциями сам бенчмарк (см. db.init_db)
+    os.environ.setdefault("DB_MIGRATOR", "default")
+    return db_path
+
+
+class StatementCounter:
+    """Считает SQL-запросы (executemany — один запрос) и коммиты движка SQLAlchemy."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+@contextmanager
+def timer():
+    """with timer() as t: ... ; t() — прошедшее время в секундах."""
+    started = time.perf_counter()
+    finished = []
+    yield lambda: (finished[0] if finished else time.perf_counter()) - started
+    finished.append(time.perf_counter())
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).rjust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for r in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(r, widths)))
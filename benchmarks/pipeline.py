@@ -0,0 +1,195 @@
+# benchmarks/pipeline.py
+"""
+Локальные заменители внешних сервисов для прогонов всего конвейера
+on_message → delivery_outbox → Telegram без сети:
+
+* FakeTelegramServer — HTTP-сервер с методами Bot API, которые вызывает
+  Discord-клиент (getMe, sendMessage, sendPhoto, sendMediaGroup); отвечает
+  через заданную задержку и запоминает, кому и когда что пришло;
+* synthetic_message / recorded_message — объект с теми полями discord.Message,
+  которые читает DiscordAnnounceClient.on_message (синтетический или из записи
+  traffic_record);
+* offline_client — DiscordAnnounceClient, доставляющий в FakeTelegramServer.
+
+Вызывать после benchmarks.common.prepare_environment().
+"""
+
+import json
+import time
+import asyncio
+import itertools
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+_message_ids = itertools.count(1)
+_file_ids = itertools.count(1)
+
+
+class FakeTelegramServer:
+    """
+    Заглушка Telegram Bot API на 127.0.0.1. base_url подставляется в
+    TelegramDelivery(token, base_url=...) — клиент ходит в неё по HTTP через тот
+    же пул httpx, что и в бою.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)        # метод → вызовов
+        self.messages: List[tuple] = []                       # (время получения, chat_id, text)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+        self._received: Optional[asyncio.Event] = None  # создаётся в start(), внутри event loop
+
+    async def start(self):
+        self._received = asyncio.Event()
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/bot"
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def reset(self):
+        self.calls.clear()
+        self.messages.clear()
+
+    async def wait_messages(self, count: int, timeout: float) -> bool:
+        """Ждёт, пока sendMessage будет вызван count раз (False — не дождались)."""
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._received.clear()
+            try:
+                await asyncio.wait_for(self._received.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat = {"id": int(params.get("chat_id") or 1), "type": "private"}
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "sendMessage":
+            self.messages.append((time.monotonic(), params["chat_id"], params.get("text", "")))
+            self._received.set()
+            result = _message(chat, text=params.get("text", ""))
+        elif method == "sendPhoto":
+            result = _message(chat, photo=[_photo(params.get("photo"))])
+        elif method == "sendMediaGroup":
+            media = json.loads(params.get("media") or "[]")
+            result = [_message(chat, photo=[_photo(item.get("media"))]) for item in media]
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def _message(chat: dict, **fields) -> dict:
+    return {"message_id": next(_message_ids), "date": int(time.time()), "chat": chat, **fields}
+
+
+def _photo(source) -> dict:
+    # По file_id — тот же файл; по ссылке — «загрузка», Telegram выдаёт новый file_id
+    file_id = source if isinstance(source, str) and source.startswith("fid-") else f"fid-{next(_file_ids)}"
+    return {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 720}
+
+
+# ─── Сообщения Discord ────────────────────────────────────────────────────────
+
+class _Guild(SimpleNamespace):
+    def get_member(self, user_id: int):
+        return None
+
+
+def synthetic_message(message_id: int, channel_id: str, text: str, media: int = 0,
+                      guild_id: int = 1, channel_name: str = "announcements",
+                      embeds: Optional[list] = None, created_at: Optional[datetime] = None):
+    """
+    Объект с полями discord.Message, которые читает on_message: текст, эмбеды,
+    вложения-картинки (media штук), сервер, канал, автор (вебхук).
+    """
+    attachments = [
+        SimpleNamespace(id=message_id * 100 + i, filename=f"image-{i}.png",
+                        url=f"https://cdn.discordapp.com/attachments/{channel_id}/{message_id * 100 + i}/image-{i}.png")
+        for i in range(media)
+    ]
+    return SimpleNamespace(
+        id=message_id,
+        content=text,
+        embeds=embeds or [],
+        attachments=attachments,
+        mentions=[],
+        webhook_id=None,
+        author=SimpleNamespace(id=1, bot=False, display_name="bench"),
+        guild=_Guild(id=guild_id),
+        channel=SimpleNamespace(id=int(channel_id), name=channel_name),
+        created_at=created_at or datetime.now(timezone.utc),
+    )
+
+
+def synthetic_embed(title: str = None, description: str = None, image_url: str = None):
+    return SimpleNamespace(title=title, description=description,
+                           image=SimpleNamespace(url=image_url) if image_url else None)
+
+
+def recorded_message(record: dict):
+    """Сообщение из записи traffic_record.TrafficRecorder в том же виде, что synthetic_message."""
+    return SimpleNamespace(
+        id=int(record["id"]),
+        content=record["content"],
+        embeds=[synthetic_embed(e.get("title"), e.get("description"), e.get("image_url"))
+                for e in record["embeds"]],
+        attachments=[SimpleNamespace(id=int(a["id"]), filename=a["filename"], url=a["url"])
+                     for a in record["attachments"]],
+        mentions=[SimpleNamespace(id=int(m["id"]), display_name=m["name"]) for m in record["mentions"]],
+        webhook_id=1 if record["webhook"] else None,
+        author=SimpleNamespace(id=1, bot=record["webhook"], display_name="recorded"),
+        guild=_Guild(id=int(record["guild_id"])),
+        channel=SimpleNamespace(id=int(record["channel_id"]), name=record["channel_name"]),
+        created_at=datetime.fromisoformat(record["created_at"]),
+    )
+
+
+# ─── Discord-клиент без Discord ───────────────────────────────────────────────
+
+async def offline_client(base_url: str):
+    """
+    DiscordAnnounceClient без подключения к шлюзу: индексы подписок и каналов
+    загружены из БД, доставка и очередь — через FakeTelegramServer по base_url.
+    Закрывать через close_offline_client().
+    """
+    from discord_client import DiscordAnnounceClient
+    from telegram_delivery import TelegramDelivery
+    from outbox import OutboxWorker
+
+    client = DiscordAnnounceClient()
+    await asyncio.to_thread(client.subscriptions.load)
+    await asyncio.to_thread(client.mentions.load_channels)
+    client.delivery = TelegramDelivery("123456:bench", base_url=base_url)
+    client.outbox = OutboxWorker(client.delivery, client.send_to_telegram, client.send_digest)
+    await client.delivery.start()
+    client.outbox.start()
+    return client
+
+
+async def close_offline_client(client):
+    await client.outbox.stop()
+    await client.delivery.close()
@@ -0,0 +1,181 @@
+# benchmarks/replay.py
+"""
+Прогон записанного трафика Discord (DISCORD_RECORD_PATH, см. traffic_record.py)
+через весь конвейер on_message → delivery_outbox → Telegram на локальных
+заменителях: временная SQLite-база, заглушка Bot API (benchmarks/pipeline.py),
+перевод выключен.
+
+    python -m benchmarks.replay traffic.jsonl.gz [--speed 1] [--subscribers 10] \\
+        [--output out.jsonl] [--compare baseline.jsonl]
+
+--speed 1 воспроизводит исходные паузы между сообщениями, 2 — вдвое быстрее,
+0 — без пауз. У каждого канала из записи --subscribers подписчиков.
+
+Печатает пропускную способность, задержку доставки (p50/p95) и SQL-запросы на
+сообщение. --output сохраняет итоговые анонсы (HTML и картинки, по одному на
+сообщение); --compare сверяет их с сохранёнными прежней сборкой.
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+from benchmarks.common import prepare_environment, StatementCounter, timer, print_table
+
+prepare_environment()
+
+import translation  # noqa: E402
+import telegram_delivery  # noqa: E402
+from db import engine, init_db, SessionLocal  # noqa: E402
+from models import User, DiscordChannel, AvailableDiscordChannel, DeliveryOutbox, OutboxPayload  # noqa: E402
+from announcement_render import load_payload  # noqa: E402
+from telegram_delivery import _percentile  # noqa: E402
+from traffic_record import read_recording  # noqa: E402
+from benchmarks.pipeline import (  # noqa: E402
+    FakeTelegramServer, recorded_message, offline_client, close_offline_client,
+)
+
+
+def seed(records, subscribers: int):
+    """Каналы из записи и по subscribers подписчиков на каждый."""
+    channels = {}
+    for record in records:
+        channels[record["channel_id"]] = (record["channel_name"], record["guild_id"])
+
+    db = SessionLocal()
+    users = [User(telegram_id=str(70_000_000 + i)) for i in range(subscribers)]
+    db.add_all(users)
+    db.flush()
+    for channel_id, (name, guild_id) in channels.items():
+        db.add(AvailableDiscordChannel(channel_id=channel_id, channel_name=name, guild_id=guild_id, is_active=True))
+        db.add_all(DiscordChannel(user_id=u.id, channel_id=channel_id, name=name,
+                                  guild_id=guild_id, active=True) for u in users)
+    db.commit()
+    observer = users[0].telegram_id
+    db.close()
+    return observer, len(channels)
+
+
+def delivered_output(observer: str) -> dict:
+    """Итоговые анонсы, поставленные в очередь первому подписчику: message_id → HTML и картинки."""
+    db = SessionLocal()
+    try:
+        rows = db.query(DeliveryOutbox.message_id, OutboxPayload.payload)\
+                 .join(OutboxPayload, OutboxPayload.message_id == DeliveryOutbox.message_id)\
+                 .filter(DeliveryOutbox.chat_id == observer)\
+                 .order_by(DeliveryOutbox.id)
+        output = {}
+        for message_id, payload in rows:
+            rendered = load_payload(payload)
+            output[message_id] = {"html": rendered.html, "media": [ref.url for ref in rendered.media]}
+        return output
+    finally:
+        db.close()
+
+
+def outbox_size() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(DeliveryOutbox).count()
+    finally:
+        db.close()
+
+
+def compare(output: dict, baseline_path: str) -> tuple:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["id"]: row for row in map(json.loads, f)}
+    same = changed = 0
+    for message_id, row in output.items():
+        before = baseline.get(message_id)
+        if before is None:
+            continue
+        if before["html"] == row["html"] and before["media"] == row["media"]:
+            same += 1
+        else:
+            changed += 1
+    only_new = len(set(output) - set(baseline))
+    only_old = len(set(baseline) - set(output))
+    return same, changed, only_new, only_old
+
+
+async def run(args):
+    # Перевод ходит в сеть, лимиты Telegram мерить незачем — как в bench_pipeline
+    translation.Translator = None
+    telegram_delivery.TELEGRAM_GLOBAL_RATE = telegram_delivery.TELEGRAM_GLOBAL_BURST = 100_000
+    telegram_delivery.TELEGRAM_CHAT_RATE = telegram_delivery.TELEGRAM_CHAT_BURST = 100_000
+    init_db()
+
+    records = list(read_recording(args.recording))
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("Запись пуста.")
+        return
+    observer, channels = seed(records, args.subscribers)
+
+    server = await FakeTelegramServer(args.latency).start()
+    counter = StatementCounter(engine)
+    client = await offline_client(server.base_url)
+    submitted = {}
+    try:
+        counter.reset()
+        with timer() as total:
+            with timer() as ingest:
+                previous = records[0]["received"]
+                for record in records:
+                    if args.speed > 0:
+                        await asyncio.sleep(max(0.0, record["received"] - previous) / args.speed)
+                    previous = record["received"]
+                    submitted[record["id"]] = time.monotonic()
+                    await client.on_message(recorded_message(record))
+            expected = await asyncio.to_thread(outbox_size)
+            delivered = await server.wait_messages(expected, args.timeout)
+    finally:
+        await close_offline_client(client)
+        await server.stop()
+
+    # Все подписаны на все каналы, поэтому анонсы первого подписчика — это все анонсы;
+    # отправку сопоставляем с сообщением по HTML
+    output = await asyncio.to_thread(delivered_output, observer)
+    by_html = {}
+    for message_id, row in output.items():
+        by_html.setdefault(row["html"], message_id)
+    latencies = []
+    for received, _, text in server.messages:
+        message_id = by_html.get(text)
+        if message_id in submitted:
+            latencies.append(received - submitted[message_id])
+
+    print_table(
+        ("сообщений", "каналов", "анонсов", "on_message, сообщ./с", "доставка, с", "доставлено",
+         "p50, мс", "p95, мс", "SQL/сообщ."),
+        [(len(records), channels, len(output), f"{len(records) / ingest():.1f}",
+          f"{total():.2f}" if delivered else f">{args.timeout:.0f}", f"{len(server.messages)}/{expected}",
+          f"{_percentile(latencies, 0.5) * 1000:.0f}", f"{_percentile(latencies, 0.95) * 1000:.0f}",
+          f"{counter.statements / len(records):.1f}")],
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for message_id, row in output.items():
+                f.write(json.dumps({"id": message_id, **row}, ensure_ascii=False) + "\n")
+        print(f"\nАнонсы сохранены в {args.output}")
+    if args.compare:
+        same, changed, only_new, only_old = compare(output, args.compare)
+        print()
+        print_table(("совпадает", "изменилось", "только в новой", "только в прежней"),
+                    [(same, changed, only_new, only_old)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="файл записи .jsonl.gz")
+    parser.add_argument("--speed", type=float, default=0, help="1 — в реальном времени, 0 — без пауз")
+    parser.add_argument("--subscribers", type=int, default=10, help="подписчиков у каждого канала")
+    parser.add_argument("--limit", type=int, default=0, help="взять первые N сообщений")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--timeout", type=float, default=300, help="сколько ждать доставки, с")
+    parser.add_argument("--output", help="сохранить итоговые анонсы (JSONL)")
+    parser.add_argument("--compare", help="сверить с анонсами, сохранёнными через --output")
+    asyncio.run(run(parser.parse_args()))
@@ -15,6 +15,8 @@ from telegram.ext import (
 
 from config import TELEGRAM_TOKEN
 from db import init_db
+from db_async import shutdown_db_executor
+from handlers.utils import BOT_CONCURRENT_UPDATES, PerUserUpdateProcessor
 
 # ───────────── ИНИЦИАЛИЗАЦИЯ ─────────────
 
@@ -145,8 +147,16 @@ async def main_menu_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ───────────── РЕГИСТРАЦИЯ ВСЕХ ХЕНДЛЕРОВ ─────────────
 
+async def _post_shutdown(app):
+    shutdown_db_executor()
+
+
 def main():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    builder = ApplicationBuilder().token(TELEGRAM_TOKEN).post_shutdown(_post_shutdown)
+    # Обработчики ждут БД в пуле потоков (db_async) — пока один ждёт, идут обновления других пользователей
+    if BOT_CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(BOT_CONCURRENT_UPDATES))
+    app = builder.build()
 
     # 1) /start и /help
     app.add_handler(CommandHandler("start", start_command))
@@ -0,0 +1,153 @@
+# channel_sync.py
+
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from db import SessionLocal, insert_ignore
+from models import AvailableDiscordChannel
+
+logger = logging.getLogger("discord_client.sync")
+
+# last_seen у неизменившихся каналов обновляется не чаще раза в сутки,
+# чтобы периодическая синхронизация не переписывала всю таблицу
+_LAST_SEEN_REFRESH = timedelta(days=1)
+
+SyncResult = namedtuple("SyncResult", "inserted updated deactivated unchanged")
+
+
+def sync_channel_rows(guilds: Dict[str, Dict[str, str]],
+                      owns: Callable[[Optional[str]], bool] = lambda guild_id: True,
+                      now: Optional[datetime] = None) -> SyncResult:
+    """
+    Приводит available_discord_channels к спискам каналов серверов guilds
+    (guild_id → {channel_id → имя}): одно чтение всей таблицы, сравнение в памяти
+    и запись только изменившихся строк одной транзакцией.
+
+    Каналы, которых больше нет ни на одном из серверов, помечаются is_active=False —
+    но только строки серверов, для которых owns(guild_id) истинно: каналы чужих
+    шардов синхронизируют их процессы. Пока транзакция не закоммичена, остальные
+    процессы видят прежний список целиком.
+    Вызывать в потоке (asyncio.to_thread).
+    """
+    now = now or datetime.utcnow()
+    db = SessionLocal()
+    try:
+        existing = {
+            r.channel_id: r for r in
+            db.query(AvailableDiscordChannel.id, AvailableDiscordChannel.channel_id,
+                     AvailableDiscordChannel.channel_name, AvailableDiscordChannel.is_active,
+                     AvailableDiscordChannel.last_seen, AvailableDiscordChannel.guild_id)
+        }
+
+        inserts, updates = [], []
+        deactivated = unchanged = refreshed = 0
+        seen = set()
+        for guild_id, channels in guilds.items():
+            for channel_id, name in channels.items():
+                seen.add(channel_id)
+                row = existing.get(channel_id)
+                if row is None:
+                    inserts.append({"channel_id": channel_id, "channel_name": name, "guild_id": guild_id,
+                                    "is_active": True, "last_seen": now})
+                elif row.channel_name != name or not row.is_active or row.guild_id != guild_id:
+                    updates.append({"id": row.id, "channel_name": name, "guild_id": guild_id,
+                                    "is_active": True, "last_seen": now})
+                elif row.last_seen is None or now - row.last_seen > _LAST_SEEN_REFRESH:
+                    # Изменился только last_seen — канал считается неизменившимся
+                    updates.append({"id": row.id, "last_seen": now})
+                    refreshed += 1
+                    unchanged += 1
+                else:
+                    unchanged += 1
+
+        for channel_id, row in existing.items():
+            if row.is_active and channel_id not in seen and owns(row.guild_id):
+                updates.append({"id": row.id, "is_active": False})
+                deactivated += 1
+
+        if inserts:
+            # Канал мог параллельно добавить администратор — такие строки пропускаются
+            db.execute(insert_ignore(AvailableDiscordChannel.__table__), inserts)
+        if updates:
+            db.bulk_update_mappings(AvailableDiscordChannel, updates)
+        db.commit()
+        return SyncResult(len(inserts), len(updates) - deactivated - refreshed, deactivated, unchanged)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ─── Точечные изменения (события шлюза Discord) ──────────────────────────────
+
+def upsert_channel(channel_id: str, name: str, guild_id: Optional[str] = None,
+                   now: Optional[datetime] = None) -> bool:
+    """
+    Канал создан, переименован или снова подходит под CHANNEL_NAME_PREFIX:
+    добавляет строку или обновляет имя/is_active. Возвращает True, если БД изменилась.
+    """
+    now = now or datetime.utcnow()
+    db = SessionLocal()
+    try:
+        row = db.query(AvailableDiscordChannel).filter_by(channel_id=channel_id).first()
+        if row is None:
+            db.execute(insert_ignore(AvailableDiscordChannel.__table__),
+                       [{"channel_id": channel_id, "channel_name": name, "guild_id": guild_id,
+                         "is_active": True, "last_seen": now}])
+        elif row.channel_name != name or not row.is_active or row.guild_id != guild_id:
+            row.channel_name = name
+            row.guild_id = guild_id
+            row.is_active = True
+            row.last_seen = now
+        else:
+            return False
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def deactivate_channel(channel_id: str) -> bool:
+    """Канал удалён (или больше не подходит под префикс): is_active=False. True, если БД изменилась."""
+    db = SessionLocal()
+    try:
+        changed = db.query(AvailableDiscordChannel)\
+                    .filter(AvailableDiscordChannel.channel_id == channel_id,
+                            AvailableDiscordChannel.is_active == True)\
+                    .update({AvailableDiscordChannel.is_active: False}, synchronize_session=False)  # noqa: E712
+        db.commit()
+        return bool(changed)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def deactivate_guild(guild_id: str) -> int:
+    """Бот покинул сервер: все его каналы — is_active=False. Возвращает число отключённых."""
+    db = SessionLocal()
+    try:
+        changed = db.query(AvailableDiscordChannel)\
+                    .filter(AvailableDiscordChannel.guild_id == guild_id,
+                            AvailableDiscordChannel.is_active == True)\
+                    .update({AvailableDiscordChannel.is_active: False}, synchronize_session=False)  # noqa: E712
+        db.commit()
+        return changed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def guild_of_channel(db, channel_id: str) -> Optional[str]:
+    """Сервер Discord канала по списку доступных каналов (None, если канал ещё не синхронизирован)."""
+    row = db.query(AvailableDiscordChannel.guild_id).filter_by(channel_id=channel_id).first()
+    return row.guild_id if row else None
@@ -14,6 +14,15 @@ if not TELEGRAM_TOKEN:
 # Если переменной нет, просто оставляем её None, проверка будет уже в discord_client.py
 DISCORD_USER_TOKEN = os.getenv("DISCORD_USER_TOKEN")
 
+# Серверы Discord, за которыми следит клиент: через запятую (пусто — все серверы, где есть бот).
+# Старая переменная DISCORD_GUILD_ID (один сервер) тоже поддерживается.
+_raw_guild_ids = os.getenv("DISCORD_GUILD_IDS") or os.getenv("DISCORD_GUILD_ID", "")
+DISCORD_GUILD_IDS = [int(x) for x in _raw_guild_ids.split(",") if x.strip().isdigit()]
+
+# Несколько процессов discord_client.py: каждый обслуживает свой шард серверов (см. sharding.py)
+DISCORD_SHARD_COUNT = max(1, int(os.getenv("DISCORD_SHARD_COUNT", "1")))
+DISCORD_SHARD_INDEX = int(os.getenv("DISCORD_SHARD_INDEX", "0"))
+
 # ─── База данных ───────────────────────────────────────────────────────────────
 DB_URI = os.getenv("DATABASE_URL", "sqlite:///./data/telegram_bot_db.sqlite3")
 
@@ -1,16 +1,92 @@
 # db.py
 
 import os
-from sqlalchemy import create_engine, inspect, text
+import sys
+import time
+import logging
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 
 from config import DB_URI
 
+logger = logging.getLogger("db")
+
+# ─── Профиль хранилища процесса ───────────────────────────────────────────────
+# bot.py, admin.py и discord_client.py работают с одним файлом SQLite. Каждый
+# процесс открывает его со своим профилем: WAL (читатели не ждут писателя и
+# наоборот), ожидание блокировки вместо мгновенного «database is locked»,
+# размеры кэша/mmap и пула соединений под его нагрузку.
+#
+#   discord — основной писатель: анонсы, очередь доставки, кэш переводов;
+#   bot     — много коротких чтений от обработчиков команд, редкие записи;
+#   admin   — редкие тяжёлые чтения (списки, выгрузки);
+#   default — прочие скрипты (миграции, бенчмарки).
+#
+# Роль определяется по запускаемому файлу; для gunicorn и т. п. — DB_ROLE.
+_ROLE_BY_SCRIPT = {"discord_client.py": "discord", "bot.py": "bot", "admin.py": "admin"}
+DB_ROLE = os.getenv("DB_ROLE") or _ROLE_BY_SCRIPT.get(os.path.basename(sys.argv[0] if sys.argv else ""), "default")
+
+STORAGE_PROFILES = {
+    #            busy_timeout, мс  synchronous  cache, КиБ  mmap, МиБ  пул  сверх пула
+    "discord": dict(busy_timeout=15000, synchronous="NORMAL", cache_kb=32768, mmap_mb=256, pool_size=8, max_overflow=8),
+    "bot":     dict(busy_timeout=5000,  synchronous="NORMAL", cache_kb=16384, mmap_mb=256, pool_size=10, max_overflow=10),
+    "admin":   dict(busy_timeout=10000, synchronous="NORMAL", cache_kb=8192,  mmap_mb=128, pool_size=3, max_overflow=2),
+    "default": dict(busy_timeout=5000,  synchronous="NORMAL", cache_kb=8192,  mmap_mb=64,  pool_size=5, max_overflow=5),
+}
+STORAGE_PROFILE = dict(STORAGE_PROFILES.get(DB_ROLE, STORAGE_PROFILES["default"]))
+# Переопределение отдельных значений (.env)
+for _key, _env, _cast in (("busy_timeout", "SQLITE_BUSY_TIMEOUT_MS", int), ("synchronous", "SQLITE_SYNCHRONOUS", str),
+                          ("cache_kb", "SQLITE_CACHE_SIZE_KB", int), ("mmap_mb", "SQLITE_MMAP_SIZE_MB", int),
+                          ("pool_size", "DB_POOL_SIZE", int), ("max_overflow", "DB_MAX_OVERFLOW", int)):
+    if os.getenv(_env):
+        STORAGE_PROFILE[_key] = _cast(os.getenv(_env))
+
+# SQLITE_TUNING=0 — прежнее поведение (журнал DELETE, соединение на каждую сессию):
+# для файловых систем без поддержки WAL (сетевые диски) и для сравнения в бенчмарке
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "1") != "0"
+
+_is_sqlite = DB_URI.startswith("sqlite")
+_is_sqlite_file = _is_sqlite and ":memory:" not in DB_URI and DB_URI.rstrip("/") != "sqlite:"
+
+
+def _engine_options() -> dict:
+    options = {}
+    if _is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    if _is_sqlite_file and not SQLITE_TUNING:
+        return options
+    if _is_sqlite_file:
+        # SQLAlchemy 1.4 по умолчанию открывает файл SQLite заново на каждую сессию (NullPool),
+        # и каждое соединение заново читает схему — держим пул открытых соединений
+        options["poolclass"] = QueuePool
+    if _is_sqlite_file or not _is_sqlite:
+        options["pool_size"] = STORAGE_PROFILE["pool_size"]
+        options["max_overflow"] = STORAGE_PROFILE["max_overflow"]
+    return options
+
+
 # создаём движок
-engine = create_engine(
-    DB_URI,
-    connect_args={"check_same_thread": False} if DB_URI.startswith("sqlite") else {}
-)
+engine = create_engine(DB_URI, **_engine_options())
+
+
+if _is_sqlite_file and SQLITE_TUNING:
+    @event.listens_for(engine, "connect")
+    def _apply_storage_profile(dbapi_connection, connection_record):
+        profile = STORAGE_PROFILE
+        cursor = dbapi_connection.cursor()
+        try:
+            # journal_mode=WAL сохраняется в самом файле: первый процесс переключает, остальные лишь подтверждают
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout'])}")
+            # NORMAL в режиме WAL: без fsync на каждый коммит, целостность при сбое питания сохраняется
+            cursor.execute(f"PRAGMA synchronous={profile['synchronous']}")
+            cursor.execute(f"PRAGMA cache_size=-{int(profile['cache_kb'])}")
+            cursor.execute(f"PRAGMA mmap_size={int(profile['mmap_mb']) * 1024 * 1024}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
 
 # фабрика сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -19,68 +95,88 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def insert_ignore(table):
+    """
+    INSERT, который молча пропускает строки, нарушающие уникальные ограничения
+    (INSERT OR IGNORE / ON CONFLICT DO NOTHING в зависимости от СУБД).
+    """
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == "mysql":
+        return table.insert().prefix_with("IGNORE")
+    return table.insert()
+
+
+# ─── Версия схемы ─────────────────────────────────────────────────────────────
+# Схема ведётся миграциями Alembic (migrations/), текущая версия хранится в
+# таблице alembic_version. Применяет миграции только один процесс — роль
+# DB_MIGRATOR (по умолчанию bot.py); остальные ждут, пока версия не станет
+# актуальной, чтобы не менять схему наперегонки.
+DB_MIGRATOR = os.getenv("DB_MIGRATOR", "bot")
+SCHEMA_WAIT_SECONDS = float(os.getenv("SCHEMA_WAIT_SECONDS", "120"))
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _alembic_config():
+    from alembic.config import Config
+    # Без файла alembic.ini: иначе env.py перенастроит логирование процесса
+    config = Config()
+    config.set_main_option("script_location", os.path.join(_BASE_DIR, "migrations"))
+    return config
+
+
+def schema_head() -> str:
+    """Последняя ревизия в migrations/versions (читаются файлы, не база)."""
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+def schema_version():
+    """Версия схемы базы — одно чтение alembic_version (None, если база ещё не версионирована)."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+
+def migrate_db():
+    """alembic upgrade head в этом процессе."""
+    from alembic import command
+    logger.info(f"[DB] Обновляем схему базы: {schema_version() or 'без версии'} → {schema_head()}")
+    command.upgrade(_alembic_config(), "head")
+
+
 def init_db():
     """
-    1) Создаёт все таблицы, которых ещё нет (Base.metadata.create_all).
-    2) Если используется SQLite, выполняет «пост-миграцию»:
-       - Для существующих таблиц добавляет недостающие колонки (created_at, start_date, end_date, views, translated и т. д.)
-         без потери уже сохранённых записей.
-       - А также «сбрасывает» статус is_active у старых записей в таблице available_discord_channels,
-         чтобы при следующем запуске парсер заново их пересинхронизировал (и вбил только те,
-         что подходят под CHANNEL_NAME_PREFIX).
+    Проверка схемы при запуске процесса. Обычный старт — одно чтение версии.
+
+    Если версия отстаёт от миграций в migrations/versions, процесс-мигратор
+    (DB_MIGRATOR) применяет их (`alembic upgrade head`), остальные ждут до
+    SCHEMA_WAIT_SECONDS и, не дождавшись, останавливаются с ошибкой.
     """
-    # 1) создаём таблицы, которых нет
-    Base.metadata.create_all(bind=engine)
-
-    # 2) для SQLite выполняем пост-миграцию столбцов и сброс статуса is_active для available_discord_channels
-    if DB_URI.startswith("sqlite"):
-        insp = inspect(engine)
-
-        with engine.begin() as conn:
-            # ─── USERS ───────────────────────────────────────────────────────
-            if "users" in insp.get_table_names():
-                user_cols = [c["name"] for c in insp.get_columns("users")]
-                if "created_at" not in user_cols:
-                    conn.execute(text("ALTER TABLE users ADD COLUMN created_at DATETIME"))
-                    conn.execute(text(
-                        "UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"
-                    ))
-
-            # ─── POSTS ───────────────────────────────────────────────────────
-            if "posts" in insp.get_table_names():
-                post_cols = [c["name"] for c in insp.get_columns("posts")]
-                if "created_at" not in post_cols:
-                    conn.execute(text("ALTER TABLE posts ADD COLUMN created_at DATETIME"))
-                    conn.execute(text(
-                        "UPDATE posts SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"
-                    ))
-                if "start_date" not in post_cols:
-                    conn.execute(text("ALTER TABLE posts ADD COLUMN start_date DATE"))
-                if "end_date" not in post_cols:
-                    conn.execute(text("ALTER TABLE posts ADD COLUMN end_date DATE"))
-                if "views" not in post_cols:
-                    conn.execute(text("ALTER TABLE posts ADD COLUMN views INTEGER DEFAULT 0"))
-
-            # ─── DISCORD_ANNOUNCEMENTS ────────────────────────────────────────
-            if "discord_announcements" in insp.get_table_names():
-                ann_cols = [c["name"] for c in insp.get_columns("discord_announcements")]
-                if "translated" not in ann_cols:
-                    conn.execute(text("ALTER TABLE discord_announcements ADD COLUMN translated TEXT"))
-                    conn.execute(text(
-                        "UPDATE discord_announcements SET translated = NULL WHERE translated IS NULL"
-                    ))
-
-            # ─── AVAILABLE_DISCORD_CHANNELS ───────────────────────────────────
-            # Если таблица есть, сбросим is_active=True → is_active=False для всех строк.
-            # Парсер при следующем запуске отметит нужные (по CHANNEL_NAME_PREFIX) записи заново.
-            if "available_discord_channels" in insp.get_table_names():
-                # Вариант A: пометить все как неактивные
-                conn.execute(text("UPDATE available_discord_channels SET is_active = 0"))
-                # Если вы хотите полностью удалить старые записи, вместо UPDATE можно:
-                # conn.execute(text("DELETE FROM available_discord_channels"))
-
-            # ─── (При необходимости здесь можно добавить другие пост-миграции) ───
-    else:
-        # Для других СУБД (PostgreSQL, MySQL) можно добавить свои
-        # ALTER TABLE ... ADD COLUMN IF NOT EXISTS ... DEFAULT ...
-        pass
+    head = schema_head()
+    current = schema_version()
+    if current == head:
+        return
+    if DB_ROLE == DB_MIGRATOR:
+        migrate_db()
+        return
+
+    logger.info(f"[DB] Схема базы {current or 'без версии'}, нужна {head}: ждём миграции от процесса {DB_MIGRATOR}")
+    deadline = time.monotonic() + SCHEMA_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(1)
+        current = schema_version()
+        if current == head:
+            return
+    raise RuntimeError(
+        f"Схема базы устарела ({current or 'без версии'}, нужна {head}). "
+        f"Запустите процесс {DB_MIGRATOR} (DB_MIGRATOR) или выполните `alembic upgrade head`."
+    )
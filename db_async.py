@@ -0,0 +1,81 @@
+# db_async.py
+"""
+Доступ к БД из асинхронных обработчиков Telegram-бота.
+
+Сессии SQLAlchemy синхронные: запрос, выполненный прямо в обработчике,
+останавливает event loop PTB, и пока он идёт (или ждёт блокировку SQLite),
+не обрабатывается ни одно обновление других пользователей. Здесь запросы
+выполняются в отдельном пуле потоков, а обработчик только ждёт результата:
+
+    @db_task
+    def user_subscriptions(db, user_id): ...    # синхронно, в потоке пула
+
+    subs = await user_subscriptions(user_id)    # в обработчике
+
+Функции db_task возвращают простые значения (кортежи, namedtuple), а не
+ORM-объекты: сессия закрывается ещё в потоке пула, и ленивые связи
+отсоединённого объекта загрузить уже нельзя.
+"""
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from db import SessionLocal, STORAGE_PROFILE
+
+logger = logging.getLogger("db")
+
+# Потоков в пуле: по умолчанию — по соединению пула SQLAlchemy процесса, чтобы поток
+# не ждал свободного соединения. DB_THREADS=0 — выполнять запросы прямо в event loop
+# (прежнее поведение; для сравнения в бенчмарке)
+DB_THREADS = int(os.getenv("DB_THREADS") or STORAGE_PROFILE["pool_size"])
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    return _executor
+
+
+async def run_db(fn, *args, **kwargs):
+    """Выполняет синхронную функцию fn(*args, **kwargs) в пуле потоков БД."""
+    if DB_THREADS <= 0:
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def db_task(fn):
+    """
+    Превращает fn(db, *args, **kwargs) в корутину: своя сессия, выполнение в пуле
+    потоков БД. Коммитит сама fn; при исключении сессия закрывается с откатом.
+    Синхронный вариант (например, для скриптов и бенчмарков) — атрибут .sync.
+    """
+    @functools.wraps(fn)
+    def sync(*args, **kwargs):
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_db(sync, *args, **kwargs)
+
+    wrapper.sync = sync
+    return wrapper
+
+
+def shutdown_db_executor():
+    """Дожидается запросов, уже отправленных в пул, и останавливает его."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,74 @@
+# digest.py
+
+import os
+from typing import List, Optional, Sequence
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from announcement_render import load_payload
+from db import SessionLocal
+from models import DeliveryOutbox, OutboxPayload
+
+# ─── Настройки режима дайджеста (.env) ────────────────────────────────────────
+DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", "300"))  # сколько копить анонсы с первого в пачке
+DIGEST_MAX_ITEMS      = int(os.getenv("DIGEST_MAX_ITEMS", "20"))          # набралось столько — шлём, не дожидаясь окна
+
+CB_DIGEST_PAGE_PREFIX = "digest_page:"  # digest_page:<digest_id>:<страница>
+
+_PAGE_LIMIT = 4096 - 100  # лимит сообщения Telegram с запасом на заголовок страницы
+_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def digest_pages(htmls: Sequence[str]) -> List[str]:
+    """
+    Раскладывает готовые анонсы (HTML из render_announcement) по страницам,
+    как show_announcements: анонсы не разрываются, короткие делят страницу.
+    """
+    groups: List[List[str]] = []
+    size = 0
+    for html_text in htmls:
+        extra = len(html_text) + len(_SEPARATOR)
+        if groups and size + extra <= _PAGE_LIMIT:
+            groups[-1].append(html_text)
+            size += extra
+        else:
+            groups.append([html_text])
+            size = len(html_text)
+
+    return [
+        f"🗞 <b>Дайджест</b> · анонсов: {len(htmls)} · стр. {i + 1}/{len(groups)}\n\n" + _SEPARATOR.join(group)
+        for i, group in enumerate(groups)
+    ]
+
+
+def digest_keyboard(digest_id: int, page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки перелистывания дайджеста (None, если страница одна)."""
+    if pages <= 1:
+        return None
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(
+            InlineKeyboardButton("◀️ Назад", callback_data=f"{CB_DIGEST_PAGE_PREFIX}{digest_id}:{page - 1}")
+        )
+    if page + 1 < pages:
+        nav_buttons.append(
+            InlineKeyboardButton("👉 Далее", callback_data=f"{CB_DIGEST_PAGE_PREFIX}{digest_id}:{page + 1}")
+        )
+    return InlineKeyboardMarkup([nav_buttons])
+
+
+def load_digest(digest_id: int, chat_id: str) -> List[str]:
+    """
+    Анонсы отправленного дайджеста (по заданиям delivery_outbox) — для перелистывания.
+    Пустой список, если задания уже удалены очисткой очереди.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(OutboxPayload.payload)\
+                 .join(DeliveryOutbox, DeliveryOutbox.message_id == OutboxPayload.message_id)\
+                 .filter(DeliveryOutbox.digest_id == digest_id, DeliveryOutbox.chat_id == chat_id)\
+                 .order_by(DeliveryOutbox.id)\
+                 .all()
+        return [load_payload(payload).html for (payload,) in rows]
+    finally:
+        db.close()
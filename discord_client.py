@@ -3,22 +3,35 @@
 import os
 import asyncio
 import logging
-import html
-import re
-from datetime import datetime
-
-from sqlalchemy.orm import scoped_session, sessionmaker
+import functools
+from datetime import datetime, timezone
 
 # Загружаем .env (переменные TELEGRAM_TOKEN, DISCORD_BOT_TOKEN, DATABASE_URL и т.д.)
 from dotenv import load_dotenv
 load_dotenv()
 
-from models import User, DiscordChannel, DiscordAnnouncement, Filter, AvailableDiscordChannel
-from db import engine, init_db  # <-- не забываем вызвать init_db() перед работой
+from db import init_db  # <-- не забываем вызвать init_db() перед работой
+from translation import translate_text_async, shutdown_translation
+from discord_text import clean_discord_text
+from subscription_index import SubscriptionIndex
+from announcement_store import save_announcements
+from mention_cache import MentionCache
+from announcement_render import RenderedAnnouncement, render_announcement, dump_payload
+from telegram_delivery import TelegramDelivery
+from media_cache import MediaFileCache, MediaRef
+from outbox import OutboxWorker
+from digest import digest_pages, digest_keyboard
+from channel_sync import sync_channel_rows, upsert_channel, deactivate_channel, deactivate_guild
+from config import DISCORD_GUILD_IDS, DISCORD_SHARD_COUNT, DISCORD_SHARD_INDEX
+from sharding import is_sharded, owns_guild, follows_guild
+from backfill import Backfiller
+from metrics import METRICS_PORT, STAGE_SECONDS, MESSAGES, start_metrics_server
+from traffic_record import DISCORD_RECORD_PATH, TrafficRecorder
+
+from telegram.error import TelegramError
 
 try:
     import discord
-    from discord.ext import tasks
 except ImportError:
     raise ImportError("Установите официальный discord.py 2.x: pip install -U discord.py")
 
@@ -40,154 +53,67 @@ if not DISCORD_BOT_TOKEN:
     logger.error("DISCORD_BOT_TOKEN не задан в .env! Discord-парсер не запустится.")
     exit(1)
 
-# Подключаем БД (scoped_session)
-# expire_on_commit=False нужен, чтобы объекты не «отвязывались» сразу после session.commit()
-Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
-
 # Если нужен фильтр по имени канала (необязательно)
 CHANNEL_NAME_PREFIX = os.getenv("CHANNEL_NAME_PREFX", None)  # например, "crypto-"
-GUILD_ID = int(os.getenv("DISCORD_GUILD_ID", "0"))          # ID вашего сервера (Guild)
-
-
-# ---------------- Helper: переводчик (необязательно) ----------------
-try:
-    from googletrans import Translator
-    _translator = Translator()
-
-    def translate_text(text: str) -> str:
-        """Переводим текст на русский через googletrans."""
-        try:
-            result = _translator.translate(text, dest='ru')
-            return result.text
-        except Exception as e:
-            logger.warning(f"Ошибка перевода: {e}. Будем отправлять оригинал.")
-            return text
-
-except ImportError:
-    # Если googletrans не установлен, просто возвращаем оригинал
-    def translate_text(text: str) -> str:
-        return text
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+SUBSCRIPTION_REFRESH_SECONDS = float(os.getenv("SUBSCRIPTION_REFRESH_SECONDS", "5"))  # период обновления индекса подписок
+CHANNEL_SYNC_MINUTES = float(os.getenv("CHANNEL_SYNC_MINUTES", "720"))  # период полной сверки каналов (0 — только при подключении)
 
 
-# ---------------------- Чистка текста от артефактов ----------------------
+# ---------------------- Медиа сообщения ----------------------
 
-def clean_discord_text(raw: str) -> str:
+def collect_media(message: discord.Message) -> list:
     """
-    Убирает из текста Discord-маркировку и лишние символы, возвращает «чистый» текст.
-    Шаги:
-      1) Удаляем блоки кода ``` ... ``` (сохраняем содержимое без backticks).
-      2) Удаляем уже одиночные backticks `…`.
-      3) Удаляем двойные звёздочки **…**, двойное подчёркивание __…__, ~~…~~.
-      4) Удаляем одиночные *…* и _…_ (курсив).
-      5) Удаляем упоминания ролей <@&ID> → пусто.
-      6) Удаляем spoiler-теги ||…|| → оставляем содержимое.
-      7) Удаляем Discord-shortcode-эмодзи вида :emoji_name: (все двоеточия вокруг слов).
-      8) Удаляем «заголовки» Markdown: строки, начинающиеся с одного-шести знаков #.
-      9) Убираем цитаты (строки, начинающиеся с > ).
-      10) Удаляем zero-width spaces (\u200b), BOM (\ufeff).
-      11) Нормализуем переносы строк (не более 2 подряд) и обрезаем пробелы справа.
+    Картинки сообщения: вложения-картинки (ключ — ID вложения Discord)
+    и картинки эмбедов (у них ID нет, ключом служит ссылка).
     """
-    text = raw
-
-    # 1) Удаляем многострочные блоки ```код```
-    def strip_code_block(match):
-        inner = match.group(1)
-        return inner
-
-    text = re.sub(r"```(?:[^\S\r\n]*\n)?([\s\S]*?)```", strip_code_block, text)
-
-    # 2) Удаляем одиночные `код`
-    text = re.sub(r"`([^`\n]+?)`", r"\1", text)
-
-    # 3) Жирный, подчеркнутый, зачёркнутый
-    text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)   # **…**
-    text = re.sub(r"__(.+?)__", r"\1", text)       # __…__
-    text = re.sub(r"~~(.+?)~~", r"\1", text)       # ~~…~~
-
-    # 4) Курсив
-    text = re.sub(r"\*(.+?)\*", r"\1", text)       # *…*
-    text = re.sub(r"_(.+?)_", r"\1", text)         # _…_
-
-    # 5) Удаляем упоминания ролей <@&123456789>
-    text = re.sub(r"<@&\d+>", "", text)
-
-    # 6) Удаляем spoiler-теги ||спойлер||
-    text = re.sub(r"\|\|(.+?)\|\|", r"\1", text)
-
-    # 7) Удаляем Discord-shortcode-эмодзи вида :emoji_name:
-    text = re.sub(r":[A-Za-z0-9_\-+]+?:", "", text)
-
-    # 8) Удаляем заголовки Markdown (начало строки, 1-6 символов '#', потом пробел)
-    text = re.sub(r"^#{1,6}\s*", "", text, flags=re.MULTILINE)
-
-    # 9) Удаляем цитаты → выводим уже без '>' в начале строк
-    text = re.sub(r"^>\s?", "", text, flags=re.MULTILINE)
-
-    # 10) Удаляем zero-width spaces и BOM
-    text = text.replace("\u200b", "")
-    text = text.replace("\ufeff", "")
-
-    # 11) Нормализуем переносы строк и обрезаем пробелы в конце строк
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    lines = [line.rstrip() for line in text.splitlines()]
-    text = "\n".join(lines).strip()
-
-    return text
+    media = []
+    for attach in message.attachments:
+        fname = str(attach.filename).lower()
+        if any(fname.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".gif", ".webp")):
+            media.append(MediaRef(str(attach.id), attach.url))
+    for emb in message.embeds:
+        if emb.image and emb.image.url:
+            media.append(MediaRef(f"url:{emb.image.url}", emb.image.url))
+    return media
 
 
 # ------------------------ СИНХРОНИЗАЦИЯ КАНАЛОВ ------------------------
 
 async def sync_available_channels(client: discord.Client):
     """
-    Синхронизация списка каналов из Discord-сервера в таблицу AvailableDiscordChannel.
+    Синхронизация списка каналов серверов Discord этого процесса (шарда)
+    в таблицу AvailableDiscordChannel. В БД пишутся только изменения
+    (см. channel_sync.sync_channel_rows), поэтому повторный запуск без
+    изменений на серверах ничего не переписывает.
     """
-    session = Session()
-    try:
-        guild = client.get_guild(GUILD_ID)
-        if not guild:
-            logger.error(f"[Sync] Не удалось найти сервер с ID = {GUILD_ID}")
+    guilds = client.followed_guilds()
+    if not guilds:
+        logger.error(f"[Sync] Бот не состоит ни в одном из отслеживаемых серверов "
+                     f"(DISCORD_GUILD_IDS={DISCORD_GUILD_IDS or 'все'}, шард {DISCORD_SHARD_INDEX}/{DISCORD_SHARD_COUNT})")
+        return
+
+    # Имена всех текстовых каналов серверов — для упоминаний <#ID> в анонсах
+    by_guild = {str(g.id): {str(ch.id): ch.name for ch in g.text_channels} for g in guilds}
+    client.mentions.set_channels({ch_id: name for names in by_guild.values() for ch_id, name in names.items()})
+
+    if CHANNEL_NAME_PREFIX:
+        by_guild = {
+            guild_id: {ch_id: name for ch_id, name in names.items() if name.startswith(CHANNEL_NAME_PREFIX)}
+            for guild_id, names in by_guild.items()
+        }
+
+    async with client.sync_lock:
+        try:
+            result = await asyncio.to_thread(sync_channel_rows, by_guild, owns_guild)
+        except Exception as e:
+            logger.error(f"[Sync] Ошибка синхронизации каналов: {e}", exc_info=True)
             return
-
-        all_channels = guild.text_channels
-        if CHANNEL_NAME_PREFIX:
-            all_channels = [ch for ch in all_channels if ch.name.startswith(CHANNEL_NAME_PREFIX)]
-
-        now = datetime.utcnow()
-        fetched_ids = set()
-
-        # 1) Помечаем все активные каналы как неактивные
-        session.query(AvailableDiscordChannel)\
-               .filter(AvailableDiscordChannel.is_active == True)\
-               .update({AvailableDiscordChannel.is_active: False})
-        session.commit()
-
-        # 2) Обновляем или создаём новые записи
-        for ch in all_channels:
-            ch_id_str = str(ch.id)
-            fetched_ids.add(ch_id_str)
-
-            row = session.query(AvailableDiscordChannel).filter_by(channel_id=ch_id_str).first()
-            if row:
-                row.channel_name = ch.name
-                row.is_active = True
-                row.last_seen = now
-            else:
-                new_row = AvailableDiscordChannel(
-                    channel_id   = ch_id_str,
-                    channel_name = ch.name,
-                    is_active    = True,
-                    last_seen    = now
-                )
-                session.add(new_row)
-
-        session.commit()
-        logger.info(f"[Sync] Синхронизированы каналы ({len(fetched_ids)} штук).")
-
-    except Exception as e:
-        logger.error(f"[Sync] Ошибка синхронизации каналов: {e}", exc_info=True)
-        session.rollback()
-    finally:
-        session.close()
+    logger.info(
+        f"[Sync] Синхронизированы каналы ({sum(map(len, by_guild.values()))} штук, серверов {len(by_guild)}): "
+        f"добавлено {result.inserted}, изменено {result.updated}, отключено {result.deactivated}, "
+        f"без изменений {result.unchanged}."
+    )
 
 
 # ---------------- Класс DiscordBot ----------------
@@ -199,12 +125,71 @@ class DiscordAnnounceClient(discord.Client):
         intents.guilds = True
         intents.guild_messages = True
         intents.message_content = True
+        if is_sharded():
+            # Процесс подключается только к своему шарду шлюза: события остальных серверов
+            # Discord ему не присылает. Распределение — по формуле Discord (см. sharding.py)
+            kwargs.setdefault("shard_id", DISCORD_SHARD_INDEX)
+            kwargs.setdefault("shard_count", DISCORD_SHARD_COUNT)
         super().__init__(intents=intents, *args, **kwargs)
         self.ready = False
 
-        # Если нужна периодическая синхронизация каналов кажд. час:
-        # self.sync_task = tasks.loop(minutes=60)(self._periodic_sync)
-        # self.sync_task.start()
+        # Индекс подписок channel_id → подписчики (загружается в setup_hook)
+        self.subscriptions = SubscriptionIndex()
+
+        # Имена каналов и участников для упоминаний <#ID>/<@ID> (заполняет sync_available_channels)
+        self.mentions = MentionCache()
+
+        # Единый клиент доставки в Telegram (пул keep-alive соединений), запускается в setup_hook
+        self.delivery = TelegramDelivery(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else None
+
+        # file_id уже загруженных в Telegram картинок: остальным подписчикам — без повторной загрузки
+        self.media_cache = MediaFileCache()
+
+        # Очередь доставки: on_message пишет задания в delivery_outbox, воркер рассылает их
+        self.outbox = OutboxWorker(self.delivery, self.send_to_telegram, self.send_digest) if self.delivery else None
+
+        # Догонялка сообщений, пропущенных за время простоя (на старте и после потери сессии шлюза)
+        self.backfill = Backfiller(self, functools.partial(self.on_message, backfilled=True))
+        self._disconnected_at = None  # начало текущего разрыва соединения с шлюзом (UTC)
+
+        # Синхронизации каналов (on_ready и _periodic_sync) не должны идти одновременно
+        self._sync_lock = None
+
+        # HTTP-эндпоинт /metrics (поднимается в setup_hook)
+        self._metrics_runner = None
+
+        # Запись входящих сообщений для benchmarks.replay (DISCORD_RECORD_PATH)
+        self.recorder = TrafficRecorder(DISCORD_RECORD_PATH) if DISCORD_RECORD_PATH else None
+
+    async def setup_hook(self):
+        # Вызывается discord.py до подключения к шлюзу: сообщения ещё не приходят
+        await asyncio.to_thread(self.subscriptions.load)
+        await asyncio.to_thread(self.mentions.load_channels)
+        if METRICS_PORT > 0:
+            # У каждого шарда свой порт: METRICS_PORT + индекс шарда
+            self._metrics_runner = await start_metrics_server(METRICS_PORT + DISCORD_SHARD_INDEX)
+        self.loop.create_task(self._refresh_subscriptions())
+        if CHANNEL_SYNC_MINUTES > 0:
+            self.loop.create_task(self._periodic_sync())
+        if self.delivery is not None:
+            await self.delivery.start()
+            # Воркер сразу разберёт задания, оставшиеся с прошлого запуска
+            self.outbox.start()
+        else:
+            logger.error("TELEGRAM_TOKEN не задан! Анонсы будут копиться в очереди без отправки в Telegram.")
+
+    async def _refresh_subscriptions(self):
+        """Подтягивает изменения подписок и фильтров, сделанные bot.py/admin.py."""
+        while not self.is_closed():
+            await asyncio.sleep(SUBSCRIPTION_REFRESH_SECONDS)
+            try:
+                changed = self.subscriptions.apply(
+                    await asyncio.to_thread(self.subscriptions.fetch_changes)
+                )
+                if changed:
+                    logger.info(f"[Subscriptions] Обновлено подписок: {changed}.")
+            except Exception as e:
+                logger.error(f"[Subscriptions] Ошибка обновления индекса: {e}", exc_info=True)
 
     async def on_ready(self):
         logger.info(f"[Discord] Залогинились как {self.user} (ID {self.user.id})")
@@ -213,192 +198,254 @@ class DiscordAnnounceClient(discord.Client):
             await sync_available_channels(self)
         except Exception as e:
             logger.error(f"[on_ready] Ошибка синхронизации: {e}", exc_info=True)
+        # Новая сессия: события за время разрыва потеряны. При старте процесса
+        # догоняем от последнего сохранённого, при переподключении — от начала разрыва
+        since, self._disconnected_at = self._disconnected_at, None
+        self.backfill.start(since)
+
+    async def on_disconnect(self):
+        if self._disconnected_at is None:
+            self._disconnected_at = datetime.now(timezone.utc)
+
+    async def on_resumed(self):
+        # RESUME: Discord сам досылает события, пропущенные за разрыв, — догонять нечего
+        logger.info("[Discord] Сессия шлюза восстановлена")
+        self._disconnected_at = None
+
+    async def close(self):
+        await super().close()
+        await self.backfill.stop()
+        if self.outbox is not None:
+            await self.outbox.stop()
+        if self.delivery is not None:
+            await self.delivery.close()
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+        if self.recorder is not None:
+            self.recorder.close()
+        shutdown_translation()
+
+    def followed_guilds(self) -> list:
+        """Серверы, за которыми следит этот процесс (DISCORD_GUILD_IDS и шард)."""
+        return [g for g in self.guilds if follows_guild(g.id)]
+
+    @property
+    def sync_lock(self) -> asyncio.Lock:
+        # Создаётся внутри работающего цикла событий (Python 3.9)
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        return self._sync_lock
 
     async def _periodic_sync(self):
+        # Первую синхронизацию делает on_ready — здесь сначала ждём период
         await self.wait_until_ready()
         while not self.is_closed():
+            await asyncio.sleep(CHANNEL_SYNC_MINUTES * 60)
             try:
                 await sync_available_channels(self)
             except Exception as e:
                 logger.error(f"[PeriodicSync] Ошибка: {e}", exc_info=True)
-            await asyncio.sleep(3600)
 
-    async def on_message(self, message: discord.Message):
-        # 1) Игнорируем сообщения вне гильдии
-        if not message.guild:
-            return
+    # ─── События каналов гильдии ─────────────────────────────────────────────
+    # Создание, переименование и удаление каналов применяются сразу, по одной
+    # строке; полная синхронизация (_periodic_sync) остаётся редкой сверкой.
 
-        # 2) Игнорируем «обычных» ботов, но разрешаем вебхуки (они нужны для пересылки анонсов)
-        if message.author.bot and message.webhook_id is None:
-            return
+    async def on_guild_join(self, guild):
+        if follows_guild(guild.id):
+            logger.info(f"[Sync] Бот добавлен на сервер {guild.name} ({guild.id})")
+            await sync_available_channels(self)
 
-        session = Session()
-        try:
-            channel_str_id = str(message.channel.id)
+    async def on_guild_remove(self, guild):
+        if not owns_guild(guild.id):
+            return
+        for channel in guild.text_channels:
+            self.mentions.remove_channel(str(channel.id))
+        async with self.sync_lock:
+            try:
+                changed = await asyncio.to_thread(deactivate_guild, str(guild.id))
+            except Exception as e:
+                logger.error(f"[Sync] Ошибка отключения каналов сервера {guild.id}: {e}", exc_info=True)
+                return
+        logger.info(f"[Sync] Бот удалён с сервера {guild.name} ({guild.id}), отключено каналов: {changed}.")
 
-            # 3) Собираем все активные подписки (active=True) на этот канал
-            subscriptions = session.query(DiscordChannel)\
-                .filter_by(channel_id=channel_str_id, active=True)\
-                .all()
+    async def on_guild_channel_create(self, channel):
+        if isinstance(channel, discord.TextChannel) and follows_guild(channel.guild.id):
+            await self._apply_channel(str(channel.id), channel.name, str(channel.guild.id))
 
-            if not subscriptions:
+    async def on_guild_channel_update(self, before, after):
+        if not follows_guild(after.guild.id):
+            return
+        if isinstance(after, discord.TextChannel):
+            if not isinstance(before, discord.TextChannel) or before.name != after.name:
+                await self._apply_channel(str(after.id), after.name, str(after.guild.id))
+        elif isinstance(before, discord.TextChannel):
+            await self._apply_channel(str(after.id), None, str(after.guild.id))
+
+    async def on_guild_channel_delete(self, channel):
+        if isinstance(channel, discord.TextChannel) and follows_guild(channel.guild.id):
+            await self._apply_channel(str(channel.id), None, str(channel.guild.id))
+
+    async def _apply_channel(self, channel_id: str, name, guild_id: str):
+        """name=None — канал больше не текстовый канал сервера."""
+        if name is None:
+            self.mentions.remove_channel(channel_id)
+        else:
+            self.mentions.set_channel(channel_id, name)
+
+        tracked = name is not None and (not CHANNEL_NAME_PREFIX or name.startswith(CHANNEL_NAME_PREFIX))
+        async with self.sync_lock:
+            try:
+                if tracked:
+                    changed = await asyncio.to_thread(upsert_channel, channel_id, name, guild_id)
+                else:
+                    changed = await asyncio.to_thread(deactivate_channel, channel_id)
+            except Exception as e:
+                logger.error(f"[Sync] Ошибка обновления канала {channel_id}: {e}", exc_info=True)
                 return
+        if changed:
+            logger.info(f"[Sync] Канал {channel_id} {'#' + name if tracked else 'отключён'}.")
 
-            # 4) Собираем «сырый» текст из content + эмбеды
-            collected_parts = []
-            if message.content:
-                collected_parts.append(message.content)
+    async def on_message(self, message: discord.Message, backfilled: bool = False):
+        """
+        Обработка сообщения Discord. backfilled — сообщение прочитано из истории
+        (backfill.py): оно не записывается в трафик для replay и не учитывается
+        в задержке доставки — иначе часы простоя исказили бы обе картины.
+        """
+        # 1) Игнорируем сообщения вне отслеживаемых серверов
+        if not message.guild or not follows_guild(message.guild.id):
+            return
 
-            for emb in message.embeds:
-                if emb.title:
-                    collected_parts.append(f"**{emb.title}**")
-                if emb.description:
-                    collected_parts.append(emb.description)
+        # 2) Игнорируем «обычных» ботов, но разрешаем вебхуки (они нужны для пересылки анонсов)
+        if message.author.bot and message.webhook_id is None:
+            return
 
-            raw_full_text = "\n\n".join(collected_parts).strip()
-            if not raw_full_text:
-                raw_full_text = "[Без текста]"
+        # Запись трафика (если включена) — до проверки подписок: в записи весь поток сервера
+        if self.recorder is not None and not backfilled:
+            self.recorder.record(message)
+
+        # 3) Подписчики канала — из индекса в памяти, без обращения к БД.
+        #    Длительность каждого этапа пишется в гистограмму STAGE_SECONDS (см. metrics.py)
+        channel_str_id = str(message.channel.id)
+        with STAGE_SECONDS.time("lookup"):
+            subscribers = self.subscriptions.get(channel_str_id)
+        if not subscribers:
+            MESSAGES.inc("no_subscribers")
+            return
 
-            # 5) Перевод (если установлен googletrans) или оригинал
-            translated_text = translate_text(raw_full_text)
+        try:
+            # 4) Собираем «сырый» текст из content + эмбеды
+            with STAGE_SECONDS.time("collect"):
+                collected_parts = []
+                if message.content:
+                    collected_parts.append(message.content)
+
+                for emb in message.embeds:
+                    if emb.title:
+                        collected_parts.append(f"**{emb.title}**")
+                    if emb.description:
+                        collected_parts.append(emb.description)
+
+                raw_full_text = "\n\n".join(collected_parts).strip()
+                if not raw_full_text:
+                    raw_full_text = "[Без текста]"
+
+            # 5) Перевод (если установлен googletrans) или оригинал.
+            #    Выполняется в пуле потоков — event loop (и heartbeat шлюза) не блокируется.
+            with STAGE_SECONDS.time("translate"):
+                translated_text = await translate_text_async(raw_full_text)
 
             # 6) Чистим от Discord-артефактов (жирные/курсив/спойлеры/shortcodes/#/> и т. д.)
-            cleaned = clean_discord_text(translated_text)
-
-            # 7) Сохраняем анонс и рассылаем всем подписчикам
-            for channel_row in subscriptions:
-                # Проверяем, не дублируем ли уже сообщение для этого user_id:
-                exists = session.query(DiscordAnnouncement).filter_by(
-                    message_id = str(message.id),
-                    user_id    = channel_row.user_id
-                ).first()
-                if exists:
-                    continue
-
-                new_ann = DiscordAnnouncement(
-                    channel_id     = channel_row.id,
-                    user_id        = channel_row.user_id,
-                    message_id     = str(message.id),
-                    content        = raw_full_text,
-                    translated     = cleaned,
-                    created_at     = datetime.utcnow(),
-                    matched_filter = None
+            with STAGE_SECONDS.time("clean"):
+                cleaned = clean_discord_text(translated_text)
+
+            # 7) Фильтры по ключевым словам: кому из подписчиков отправлять.
+            #    Слова ищутся одним проходом автомата по оригиналу и переводу.
+            with STAGE_SECONDS.time("filter"):
+                recipients = self.subscriptions.filters.recipients(
+                    channel_str_id, subscribers, (raw_full_text, cleaned)
                 )
-                session.add(new_ann)
-                session.commit()
-                logger.info(f"[Discord] Сохранили анонс "
-                            f"(user_id={channel_row.user_id}, channel={channel_str_id})")
+            if not recipients:
+                MESSAGES.inc("filtered")
+                return
+
+            # 8) Рендерим анонс один раз — HTML и картинки одинаковы для всех подписчиков.
+            #    Имена упоминаний берутся из памяти, без обращений к БД.
+            with STAGE_SECONDS.time("render"):
+                self.mentions.remember_mentions(message, cleaned)
+                rendered = render_announcement(
+                    cleaned, message.channel.name, message.created_at,
+                    collect_media(message), self.mentions
+                )
+                if backfilled:
+                    rendered = rendered._replace(posted_at=None)  # не попадёт в DELIVERY_DELAY
+                payload = dump_payload(rendered)
+
+            # 9) Сохраняем анонсы и задания на доставку одной транзакцией
+            with STAGE_SECONDS.time("persist"):
+                fresh = await asyncio.to_thread(
+                    save_announcements, str(message.id), raw_full_text, cleaned, recipients,
+                    payload=payload, guild_id=str(message.guild.id)
+                )
+            if not fresh:
+                MESSAGES.inc("duplicate")
+                return
+            MESSAGES.inc("saved")
+            logger.info(f"[Discord] Сохранили анонс для {len(fresh)} подписчиков "
+                        f"(message_id={message.id}, channel={channel_str_id})")
 
-                user_row = session.query(User).filter_by(id=channel_row.user_id).first()
-                if user_row:
-                    await self.send_to_telegram(user_row.telegram_id, message, cleaned)
+            # 10) Рассылку выполняет OutboxWorker — будим его, не дожидаясь Telegram
+            if self.outbox is not None:
+                self.outbox.notify()
 
         except Exception as ex:
+            MESSAGES.inc("error")
             logger.error(f"Ошибка в on_message: {ex}", exc_info=True)
-            session.rollback()
-        finally:
-            session.close()
 
-    async def send_to_telegram(self, tg_chat_id: int, discord_message: discord.Message, text_ru: str):
+    async def send_to_telegram(self, tg_chat_id: str, rendered: RenderedAnnouncement):
         """
-        Шлём анонс в Telegram: сначала чистим «Discord-специфику»,
-        конвертим Markdown → HTML, экранируем → отправляем с parse_mode=HTML.
+        Шлём готовый анонс (см. render_announcement) в один чат Telegram.
+        Запросы идут через планировщик self.delivery (лимиты и RetryAfter).
+        Если текст анонса доставить не удалось, TelegramError пробрасывается —
+        OutboxWorker решит, повторять ли доставку.
         """
 
-        from telegram import Bot, InputMediaPhoto
-        from telegram.error import TelegramError
+        # 1) Отправляем текстовое сообщение с parse_mode=HTML
+        await self.delivery.send_message(
+            tg_chat_id,
+            text    = rendered.html,
+            parse_mode = "HTML",
+            disable_web_page_preview = False
+        )
 
-        TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-        if not TELEGRAM_TOKEN:
-            logger.error("TELEGRAM_TOKEN не задан! Невозможно отправить в Telegram.")
-            return
+        # 2) Если присутствуют изображения, отправляем их (по file_id из кэша; первая загрузка — по ссылке).
+        #    Текст уже доставлен, поэтому ошибку альбома только логируем — иначе повтор задания задублирует текст.
+        if rendered.media:
+            try:
+                await self.media_cache.send(self.delivery, tg_chat_id, rendered.media)
+            except TelegramError as e:
+                logger.error(f"Ошибка отправки изображений: {e}", exc_info=True)
 
-        bot = Bot(token=TELEGRAM_TOKEN)
-
-        # 1) Собираем список media (изображения)
-        media = []
-        for attach in discord_message.attachments:
-            fname = str(attach.filename).lower()
-            if any(fname.endswith(ext) for ext in (".jpg", ".jpeg", ".png", ".gif", ".webp")):
-                media.append(InputMediaPhoto(media=attach.url))
-        for emb in discord_message.embeds:
-            if emb.image and emb.image.url:
-                media.append(InputMediaPhoto(media=emb.image.url))
-
-        # 2) Заменяем упоминания каналов <#ID> → #channel_name
-        def replace_channel_mention(match):
-            chan_id = match.group(1)
-            s = Session()
-            row = s.query(AvailableDiscordChannel).filter_by(channel_id=chan_id).first()
-            s.close()
-            if row:
-                return f"#{html.escape(row.channel_name)}"
-            else:
-                return "#unknown"
-
-        content = re.sub(r"<#(\d+)>", replace_channel_mention, text_ru)
-
-        # 3) Заменяем упоминания пользователей <@ID> или <@!ID> → @username
-        def replace_user_mention(match):
-            user_id = match.group(1)
-            s = Session()
-            user_row = s.query(User).filter_by(id=int(user_id)).first()
-            s.close()
-            if user_row and user_row.username:
-                return f"@{html.escape(user_row.username)}"
-            else:
-                return "@unknown"
-
-        content = re.sub(r"<@!?(\d+)>", replace_user_mention, content)
-
-        # 4) Убираем упоминания ролей <@&ID> → @role
-        content = re.sub(r"<@&\d+>", "@role", content)
-
-        # 5) (Опционально) Удаляем @everyone, если не хочется его показывать
-        # content = content.replace("@everyone", "")
-
-        # 6) Экранируем HTML-символы (чтобы не сломать parse_mode=HTML)
-        content = html.escape(content)
-
-        # 7) Конвертируем Markdown → HTML
-        content = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", content)
-        content = re.sub(r"__(.+?)__",      r"<u>\1</u>", content)
-        content = re.sub(r"\*(.+?)\*",      r"<i>\1</i>", content)
-        content = re.sub(r"_(.+?)_",        r"<i>\1</i>", content)
-        content = re.sub(r"`(.+?)`",        r"<code>\1</code>", content)
-        content = re.sub(r"\[([^\]]+?)\]\((https?://[^\)]+?)\)", r'<a href="\2">\1</a>', content)
-
-        # 8) Формируем шапку (канал и время) в HTML:
-        channel_name = html.escape(discord_message.channel.name or "")
-        ts = discord_message.created_at.strftime("%d.%m.%Y %H:%M")
-        header = (
-            "<b>🟣 Новое объявление из Discord</b>\n"
-            f"<b>Канал:</b> #{channel_name}\n"
-            f"<b>Время:</b> {ts}\n\n"
+    async def send_digest(self, tg_chat_id: str, items: list, digest_id: int):
+        """
+        Несколько анонсов одним сообщением (режим дайджеста): первая страница
+        с кнопками перелистывания (их обрабатывает bot.py), затем картинки всех
+        анонсов общими альбомами.
+        """
+        pages = digest_pages([rendered.html for rendered in items])
+        await self.delivery.send_message(
+            tg_chat_id,
+            text         = pages[0],
+            parse_mode   = "HTML",
+            disable_web_page_preview = True,
+            reply_markup = digest_keyboard(digest_id, 0, len(pages))
         )
 
-        caption = header + content
-
-        # 9) Отправляем текстовое сообщение с parse_mode=HTML
-        try:
-            await bot.send_message(
-                chat_id = tg_chat_id,
-                text    = caption,
-                parse_mode = "HTML",
-                disable_web_page_preview = False
-            )
-        except TelegramError as e:
-            logger.error(f"Ошибка отправки Telegram-сообщения (send_message): {e}", exc_info=True)
-
-        # 10) Если присутствуют изображения, отправляем их в media_group
+        media = list({ref.key: ref for rendered in items for ref in rendered.media}.values())
         if media:
             try:
-                await bot.send_media_group(
-                    chat_id = tg_chat_id,
-                    media   = media
-                )
+                await self.media_cache.send(self.delivery, tg_chat_id, media)
             except TelegramError as e:
-                logger.error(f"Ошибка отправки media_group: {e}", exc_info=True)
+                logger.error(f"Ошибка отправки изображений дайджеста: {e}", exc_info=True)
 
 
 if __name__ == "__main__":
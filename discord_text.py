@@ -0,0 +1,101 @@
+# discord_text.py
+
+import re
+
+# ─── Шаблоны разметки Discord (компилируются один раз) ────────────────────────
+_CODE_BLOCK_RE   = re.compile(r"```(?:[^\S\r\n]*\n)?([\s\S]*?)```")
+_INLINE_CODE_RE  = re.compile(r"`([^`\n]+?)`")
+_BOLD_RE         = re.compile(r"\*\*(.+?)\*\*")
+_UNDERLINE_RE    = re.compile(r"__(.+?)__")
+_STRIKE_RE       = re.compile(r"~~(.+?)~~")
+_ITALIC_STAR_RE  = re.compile(r"\*(.+?)\*")
+_ITALIC_UNDER_RE = re.compile(r"_(.+?)_")
+_ROLE_RE         = re.compile(r"<@&\d+>")
+_SPOILER_RE      = re.compile(r"\|\|(.+?)\|\|")
+_SHORTCODE_RE    = re.compile(r":[A-Za-z0-9_\-+]+?:")
+_HEADING_RE      = re.compile(r"^#{1,6}\s*", re.MULTILINE)
+_QUOTE_RE        = re.compile(r"^>\s?", re.MULTILINE)
+_BLANK_LINES_RE  = re.compile(r"\n\n\n+")  # то же, что \n{3,}, но с литеральным префиксом для быстрого поиска
+
+
+def _unwrap(pattern, text: str) -> str:
+    """
+    То же, что pattern.sub(r"\1", text): split с одной группой возвращает куски
+    текста вперемешку с содержимым совпадений. Шаблон r"\1" раскрывался бы
+    Python-кодом на каждое совпадение, split же целиком выполняется в C.
+    """
+    return "".join(pattern.split(text))
+
+
+def clean_discord_text(raw: str) -> str:
+    """
+    Убирает из текста Discord-маркировку и лишние символы, возвращает «чистый» текст.
+    Шаги:
+      1) Удаляем блоки кода ``` ... ``` (сохраняем содержимое без backticks).
+      2) Удаляем уже одиночные backticks `…`.
+      3) Удаляем двойные звёздочки **…**, двойное подчёркивание __…__, ~~…~~.
+      4) Удаляем одиночные *…* и _…_ (курсив).
+      5) Удаляем упоминания ролей <@&ID> → пусто.
+      6) Удаляем spoiler-теги ||…|| → оставляем содержимое.
+      7) Удаляем Discord-shortcode-эмодзи вида :emoji_name: (все двоеточия вокруг слов).
+      8) Удаляем «заголовки» Markdown: строки, начинающиеся с одного-шести знаков #.
+      9) Убираем цитаты (строки, начинающиеся с > ).
+      10) Удаляем zero-width spaces (\u200b), BOM (\ufeff).
+      11) Нормализуем переносы строк (не более 2 подряд) и обрезаем пробелы справа.
+
+    Шаг пропускается, если в тексте нет его символов: удаление разметки новых
+    символов не добавляет, так что результат тот же, а обычный текст почти не
+    проходит через регулярные выражения.
+    """
+    text = raw
+
+    # 1) Многострочные блоки ```код```
+    if "```" in text:
+        text = _unwrap(_CODE_BLOCK_RE, text)
+
+    # 2) Одиночные `код`
+    if "`" in text:
+        text = _unwrap(_INLINE_CODE_RE, text)
+
+    # 3) Жирный, подчеркнутый, зачёркнутый
+    if "**" in text:
+        text = _unwrap(_BOLD_RE, text)
+    if "__" in text:
+        text = _unwrap(_UNDERLINE_RE, text)
+    if "~~" in text:
+        text = _unwrap(_STRIKE_RE, text)
+
+    # 4) Курсив
+    if "*" in text:
+        text = _unwrap(_ITALIC_STAR_RE, text)
+    if "_" in text:
+        text = _unwrap(_ITALIC_UNDER_RE, text)
+
+    # 5) Упоминания ролей <@&123456789>
+    if "<@&" in text:
+        text = _ROLE_RE.sub("", text)
+
+    # 6) Spoiler-теги ||спойлер||
+    if "||" in text:
+        text = _unwrap(_SPOILER_RE, text)
+
+    # 7) Shortcode-эмодзи :emoji_name:
+    if ":" in text:
+        text = _SHORTCODE_RE.sub("", text)
+
+    # 8) Заголовки Markdown и 9) цитаты — только если такие строки есть
+    if text.startswith("#") or "\n#" in text:
+        text = _HEADING_RE.sub("", text)
+    if text.startswith(">") or "\n>" in text:
+        text = _QUOTE_RE.sub("", text)
+
+    # 10) Zero-width spaces и BOM
+    if "\u200b" in text:
+        text = text.replace("\u200b", "")
+    if "\ufeff" in text:
+        text = text.replace("\ufeff", "")
+
+    # 11) Нормализуем переносы строк и обрезаем пробелы в конце строк
+    if "\n\n\n" in text:
+        text = _BLANK_LINES_RE.sub("\n\n", text)
+    return "\n".join([line.rstrip() for line in text.splitlines()]).strip()
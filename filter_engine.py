@@ -0,0 +1,158 @@
+# filter_engine.py
+
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from announcement_store import Recipient
+
+logger = logging.getLogger("discord_client.filters")
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Фильтры регистронезависимы: ключевое слово и текст сравниваются после casefold()."""
+    return keyword.strip().casefold()
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо–Корасик: за один проход по тексту находит все ключевые слова,
+    сколько бы их ни было. Время поиска зависит от длины текста, а не от числа слов.
+    """
+
+    __slots__ = ("patterns", "index", "_goto", "_fail", "_out")
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = tuple(patterns)
+        self.index = {p: i for i, p in enumerate(self.patterns)}
+        goto: List[Dict[str, int]] = [{}]
+        out: List[tuple] = [()]
+
+        # 1) Бор из всех слов
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (index,)
+
+        # 2) Суффиксные ссылки обходом в ширину; out наследует слова по ссылке
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def find(self, text: str) -> Set[int]:
+        """Индексы слов из patterns, встречающихся в text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _ChannelFilters:
+    """Скомпилированные фильтры одного канала: общий автомат и слова каждой подписки."""
+
+    __slots__ = ("source", "automaton", "by_subscription")
+
+    def __init__(self, subscribers, previous: Optional["_ChannelFilters"] = None):
+        self.source = subscribers
+
+        own_keywords = {}
+        for sub in subscribers:
+            own = [(normalize_keyword(keyword), keyword) for _filter_id, keyword in sorted(sub.filters)]
+            own = [(norm, keyword) for norm, keyword in own if norm]
+            if own:
+                own_keywords[sub.subscription_id] = own
+
+        # Новых слов нет (фильтр удалён, подписчик ушёл и т. п.) — прежний автомат
+        # подходит: лишние слова в нём просто ни к кому не привязаны. Пересобираем,
+        # только если появились новые слова или лишних стало больше половины.
+        words = {norm for own in own_keywords.values() for norm, _ in own}
+        old = previous.automaton if previous is not None else None
+        if old is not None and words.issubset(old.index) and 2 * len(words) >= len(old.patterns):
+            self.automaton = old
+        else:
+            self.automaton = AhoCorasick(sorted(words)) if words else None
+
+        index_of = self.automaton.index if self.automaton else {}
+        self.by_subscription: Dict[int, tuple] = {
+            sub_id: tuple((index_of[norm], keyword) for norm, keyword in own)
+            for sub_id, own in own_keywords.items()
+        }
+
+
+class FilterEngine:
+    """
+    Решает, кому из подписчиков канала отправлять сообщение.
+
+    Подписка без активных фильтров получает все сообщения канала (matched_filter=None).
+    Подписка с фильтрами — только сообщения, где встретилось хотя бы одно её слово;
+    в matched_filter записывается первое по порядку создания сработавшее слово.
+
+    Автомат строится лениво, отдельно на каждый канал. SubscriptionIndex заменяет
+    кортеж подписчиков только у изменённых каналов, поэтому пересобираются лишь они.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, _ChannelFilters] = {}
+
+    def discard(self, channel_id: str):
+        self._channels.pop(channel_id, None)
+
+    def clear(self):
+        self._channels.clear()
+
+    def _compiled(self, channel_id: str, subscribers) -> _ChannelFilters:
+        entry = self._channels.get(channel_id)
+        if entry is None or entry.source is not subscribers:
+            entry = _ChannelFilters(subscribers, previous=entry)
+            self._channels[channel_id] = entry
+        return entry
+
+    def recipients(self, channel_id: str, subscribers, texts: Iterable[str]) -> List[Recipient]:
+        """
+        Получатели сообщения с учётом фильтров. texts — варианты текста
+        (оригинал и перевод): слово может совпасть в любом из них.
+        """
+        entry = self._compiled(channel_id, subscribers)
+
+        found: Set[int] = set()
+        if entry.automaton is not None:
+            for text in texts:
+                if text:
+                    found |= entry.automaton.find(text.casefold())
+
+        result = []
+        for sub in subscribers:
+            own = entry.by_subscription.get(sub.subscription_id)
+            if own is None:
+                result.append(Recipient(sub.subscription_id, sub.user_id, sub.telegram_id, None))
+                continue
+            for index, keyword in own:
+                if index in found:
+                    result.append(Recipient(sub.subscription_id, sub.user_id, sub.telegram_id, keyword))
+                    break
+        return result
@@ -9,8 +9,7 @@ from telegram.ext import (
     filters,
 )
 from config import ADMIN_IDS
-from db import SessionLocal
-from models import User
+from handlers.queries import all_telegram_ids
 import logging
 from handlers.utils import subscription_required  # импорт декоратора подписки
 
@@ -57,17 +56,15 @@ async def broadcast_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Получили текст от администратора, рассылаем его всем зарегистрированным пользователям.
     """
     text = update.message.text
-    db = SessionLocal()
-    users = db.query(User).all()
-    db.close()
+    telegram_ids = await all_telegram_ids()
     bot = context.bot
     failed = 0
-    for u in users:
+    for telegram_id in telegram_ids:
         try:
-            await bot.send_message(chat_id=u.telegram_id, text=text)
+            await bot.send_message(chat_id=telegram_id, text=text)
         except Exception as e:
             failed += 1
-            logger.warning(f"Не удалось отправить {u.telegram_id}: {e}")
+            logger.warning(f"Не удалось отправить {telegram_id}: {e}")
     await update.message.reply_text(f"✅ Рассылка завершена. Не доставлено: {failed}")
     return ConversationHandler.END
 
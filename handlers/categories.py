@@ -9,8 +9,7 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
-from db import SessionLocal
-from models import Category, Post
+from handlers.queries import PostRef, category_listing, add_category, post_by_id
 from handlers.utils import subscription_required
 import re
 
@@ -20,35 +19,22 @@ CATEGORY_END = ConversationHandler.END
 # Шаблон для извлечения chat и message_id из ссылки вида "https://t.me/channel_name/123"
 _CHAT_MSG_RE = re.compile(r"https?://t\.me/(?P<chat>[^/]+)/(?P<msg_id>\d+)")
 
-def build_categories_menu(parent_id=None, offset=0, limit=5):
+async def build_categories_menu(parent_id=None, offset=0, limit=5):
     """
     Строит InlineKeyboardMarkup:
     - Если у категории (parent_id) есть подкатегории, показывает кнопки подкатегорий.
     - Иначе показывает список постов (title→link) с пагинацией.
     """
-    db = SessionLocal()
-
-    # 1) Попробуем найти подкатегории текущей parent_id
-    subs = (
-        db.query(Category)
-          .filter(Category.parent_id == parent_id)
-          .order_by(Category.name)
-          .all()
-    )
+    # 1) Подкатегории текущей parent_id, а если их нет — посты этой категории
+    subs, posts, total = await category_listing(parent_id, offset, limit)
     if subs:
         buttons = [
-            [InlineKeyboardButton(f"📂 {c.name}", callback_data=f"cat:{c.id}:0")]
-            for c in subs
+            [InlineKeyboardButton(f"📂 {name}", callback_data=f"cat:{cat_id}:0")]
+            for cat_id, name in subs
         ]
-        db.close()
         return InlineKeyboardMarkup(buttons)
 
     # 2) Если подкатегорий нет, показываем список постов в этой категории
-    q = db.query(Post).filter(Post.category_id == parent_id, Post.archived == False).order_by(Post.id)
-    total = q.count()
-    posts = q.offset(offset).limit(limit).all()
-    db.close()
-
     rows = []
     for p in posts:
         rows.append([InlineKeyboardButton(f"🔗 {p.title}", callback_data=f"view_post:{p.id}")])
@@ -79,7 +65,7 @@ def build_categories_menu(parent_id=None, offset=0, limit=5):
     return InlineKeyboardMarkup(rows)
 
 
-async def _forward_post(update: Update, context: ContextTypes.DEFAULT_TYPE, post: Post):
+async def _forward_post(update: Update, context: ContextTypes.DEFAULT_TYPE, post: PostRef):
     """
     Пересылает оригинальное сообщение из канала пользователю.
     Если ссылка post.link соответствует формату t.me/channel_name/msg_id, делает forward_message.
@@ -132,7 +118,7 @@ async def categories_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """
     await update.message.reply_text(
         "📂 Выберите категорию:",
-        reply_markup=build_categories_menu(None)
+        reply_markup=await build_categories_menu(None)
     )
 
 
@@ -156,10 +142,7 @@ async def add_category_process(update: Update, context: ContextTypes.DEFAULT_TYP
     if not name:
         return await update.message.reply_text("❗️ Название не может быть пустым. Повторите:")
 
-    db = SessionLocal()
-    db.add(Category(name=name))
-    db.commit()
-    db.close()
+    await add_category(name)
 
     await update.message.reply_text(f"✅ Категория «{name}» добавлена.")
     return CATEGORY_END
@@ -182,7 +165,7 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if parts[0] == "cat" and len(parts) == 3:
         cat_id = int(parts[1])
         offset = int(parts[2])
-        kb = build_categories_menu(parent_id=cat_id, offset=offset)
+        kb = await build_categories_menu(parent_id=cat_id, offset=offset)
         await q.edit_message_text(
             f"📂 Содержимое категории (ID {cat_id}):",
             reply_markup=kb
@@ -192,9 +175,7 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 2) Нажали на кнопку «Просмотреть пост» — теперь пересылаем оригинал
     if parts[0] == "view_post" and len(parts) == 2:
         post_id = int(parts[1])
-        db = SessionLocal()
-        post = db.query(Post).filter(Post.id == post_id).first()
-        db.close()
+        post = await post_by_id(post_id)
         if post:
             await _forward_post(update, context, post)
         else:
@@ -10,15 +10,27 @@ from telegram.ext import (
     filters,
 )
 from telegram.constants import ParseMode
-from db import SessionLocal
-from models import (
-    User,
-    DiscordChannel,
-    Filter,
-    DiscordAnnouncement,
-    AvailableDiscordChannel,
-)
 from config import ADMIN_IDS
+from db_async import run_db
+from handlers.queries import (
+    ensure_user,
+    latest_announcements,
+    active_subscriptions,
+    available_channels,
+    subscribe,
+    deactivate_subscription,
+    toggle_digest,
+    active_filters,
+    add_filter,
+    deactivate_filter,
+)
+from digest import (
+    CB_DIGEST_PAGE_PREFIX,
+    DIGEST_WINDOW_SECONDS,
+    digest_keyboard,
+    digest_pages,
+    load_digest,
+)
 import logging
 from datetime import datetime
 
@@ -54,6 +66,7 @@ CB_BACK_TO_START         = "back_to_start"
 CB_LIST_AVAILABLE        = "list_available_discord_channels"
 CB_ADD_FROM_LIST_PREFIX  = "add_from_list:"
 CB_ANN_PAGE_PREFIX       = "anns_page:"  # используется для пагинации
+CB_TOGGLE_DIGEST         = "toggle_discord_digest"
 
 
 def escape_md_v2(text: str) -> str:
@@ -91,6 +104,7 @@ async def discord_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("📜 Список каналов",         callback_data=CB_LIST_AVAILABLE)],
         [InlineKeyboardButton("➕ Добавить фильтр",        callback_data=CB_ADD_FILTER)],
         [InlineKeyboardButton("➖ Удалить фильтр",         callback_data=CB_DELETE_FILTER)],
+        [InlineKeyboardButton("🗞 Режим дайджеста",        callback_data=CB_TOGGLE_DIGEST)],
         [InlineKeyboardButton("📰 Последние анонсы",       callback_data=CB_LATEST_ANNOUNCEMENTS)],
         [InlineKeyboardButton("◀️ Назад",                  callback_data=CB_BACK_TO_START)],
     ]
@@ -101,6 +115,7 @@ async def discord_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("➖ Отписаться от оповещений", callback_data=CB_UNSUBSCRIBE_CHANNEL)],
             [InlineKeyboardButton("📜 Список каналов",            callback_data=CB_LIST_AVAILABLE)],
             [InlineKeyboardButton("📜 Мои каналы",                callback_data=CB_VIEW_MY_CHANNELS)],
+            [InlineKeyboardButton("🗞 Режим дайджеста",           callback_data=CB_TOGGLE_DIGEST)],
             [InlineKeyboardButton("📰 Последние анонсы",          callback_data=CB_LATEST_ANNOUNCEMENTS)],
             [InlineKeyboardButton("◀️ Назад",                     callback_data=CB_BACK_TO_START)],
         ]
@@ -120,38 +135,18 @@ async def show_announcements(update: Update, context: ContextTypes.DEFAULT_TYPE,
     if not q:
         return
 
-    telegram_id = q.from_user.id
-    db = SessionLocal()
-
-    user_row = db.query(User).filter_by(telegram_id=telegram_id).first()
-    if not user_row:
-        db.close()
+    # Берём последние 5 анонсов (по дате DESC); None — пользователя ещё нет в базе
+    last_five = await latest_announcements(q.from_user.id, 5)
+    if last_five is None:
         return
 
-    # Берём последние 5 анонсов (по дате DESC)
-    last_five = (
-        db.query(DiscordAnnouncement)
-          .filter_by(user_id=user_row.id)
-          .order_by(DiscordAnnouncement.created_at.desc())
-          .limit(5)
-          .all()
-    )
-    db.close()
-
     if not last_five:
         # Если нет ни одного анонса
         await q.edit_message_text("❗ Пока нет анонсов для вас.")
         return
 
     # Собираем анонсы в список словарей
-    announcements = []
-    for a in last_five:
-        content = a.translated if a.translated else a.content
-        announcements.append({
-            "created_at": a.created_at,
-            "content": content,
-            "matched_filter": a.matched_filter
-        })
+    announcements = [a._asdict() for a in last_five]
 
     # Формируем страницы: если длина > 300 → отдельная страница,
     # иначе пробуем объединить два подряд коротких (≤ 300) на одной странице
@@ -265,6 +260,7 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
             [InlineKeyboardButton("📜 Список каналов",         callback_data=CB_LIST_AVAILABLE)],
             [InlineKeyboardButton("➕ Добавить фильтр",        callback_data=CB_ADD_FILTER)],
             [InlineKeyboardButton("➖ Удалить фильтр",         callback_data=CB_DELETE_FILTER)],
+            [InlineKeyboardButton("🗞 Режим дайджеста",        callback_data=CB_TOGGLE_DIGEST)],
             [InlineKeyboardButton("📰 Последние анонсы",       callback_data=CB_LATEST_ANNOUNCEMENTS)],
             [InlineKeyboardButton("◀️ Назад",                  callback_data=CB_BACK_TO_START)],
         ]
@@ -273,6 +269,7 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
                 [InlineKeyboardButton("➖ Отписаться от оповещений", callback_data=CB_UNSUBSCRIBE_CHANNEL)],
                 [InlineKeyboardButton("📜 Список каналов",            callback_data=CB_LIST_AVAILABLE)],
                 [InlineKeyboardButton("📜 Мои каналы",                callback_data=CB_VIEW_MY_CHANNELS)],
+                [InlineKeyboardButton("🗞 Режим дайджеста",           callback_data=CB_TOGGLE_DIGEST)],
                 [InlineKeyboardButton("📰 Последние анонсы",          callback_data=CB_LATEST_ANNOUNCEMENTS)],
                 [InlineKeyboardButton("◀️ Назад",                     callback_data=CB_BACK_TO_START)],
             ]
@@ -287,73 +284,45 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         return VIEW_LAST_ANNOUNCEMENTS
 
     # Получаем (или создаём) пользователя в БД
-    db = SessionLocal()
     telegram_id = q.from_user.id
-    user_row = db.query(User).filter_by(telegram_id=telegram_id).first()
-    if not user_row:
-        user_row = User(telegram_id=telegram_id, username=q.from_user.username)
-        db.add(user_row)
-        db.commit()
-        db.refresh(user_row)
+    user_id = await ensure_user(telegram_id, q.from_user.username)
 
     # ───── 1) «➕ Добавить канал»
     if data == CB_ADD_CHANNEL:
         if telegram_id not in ADMIN_IDS:
             await q.edit_message_text("❌ У вас нет прав на ручное добавление канала.")
-            db.close()
             return VIEW_LAST_ANNOUNCEMENTS
 
         await q.edit_message_text(
             "Шаг 1: Пришлите ID Discord-канала (число) или ссылку вида:\n"
             "https://discord.com/channels/ID_сервера/ID_канала"
         )
-        db.close()
         return ADD_CHANNEL_NAME
 
     # ───── 2) «➖ Отписаться от оповещений»
     if data == CB_UNSUBSCRIBE_CHANNEL:
-        channels = (
-            db.query(DiscordChannel)
-              .filter_by(user_id=user_row.id, active=True)
-              .order_by(DiscordChannel.id)
-              .all()
-        )
+        channels = await active_subscriptions(user_id)
         if not channels:
-            db.close()
             await q.edit_message_text("❗ У вас нет активных подписок на Discord-каналы.")
             return VIEW_LAST_ANNOUNCEMENTS
 
-        buttons = []
-        for ch in channels:
-            db2 = SessionLocal()
-            adc = db2.query(AvailableDiscordChannel).filter_by(channel_id=ch.channel_id).first()
-            db2.close()
-
-            label = adc.channel_name if adc else ch.channel_id
-            buttons.append([InlineKeyboardButton(label, callback_data=f"unsub_chan_{ch.id}")])
-
+        buttons = [
+            [InlineKeyboardButton(ch.label or ch.channel_id, callback_data=f"unsub_chan_{ch.id}")]
+            for ch in channels
+        ]
         kb_unsub = InlineKeyboardMarkup(buttons)
         await q.edit_message_text(
             "Выберите канал, от которого хотите отписаться:",
             reply_markup=kb_unsub
         )
-        db.close()
         return SELECT_CHANNEL_FOR_UNSUB
 
     # ───── 2a) «📜 Список каналов»
     if data == CB_LIST_AVAILABLE:
-        db2 = SessionLocal()
-        available = (
-            db2.query(AvailableDiscordChannel)
-               .filter_by(is_active=True)
-               .order_by(AvailableDiscordChannel.channel_name)
-               .all()
-        )
-        db2.close()
+        available = await available_channels()
 
         if not available:
             await q.edit_message_text("❗ Пока нет доступных каналов.")
-            db.close()
             return VIEW_LAST_ANNOUNCEMENTS
 
         buttons = [
@@ -362,55 +331,28 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         ]
         keyboard = InlineKeyboardMarkup(buttons)
         await q.edit_message_text("Выберите канал для подписки:", reply_markup=keyboard)
-        db.close()
         return VIEW_LAST_ANNOUNCEMENTS
 
     # ───── 3) «add_from_list:<channel_id>»
     if data.startswith(CB_ADD_FROM_LIST_PREFIX):
         channel_id = data.split(":", 1)[1]
-        db_ch = SessionLocal()
-        existing = db_ch.query(DiscordChannel).filter_by(
-            channel_id=channel_id, active=True, user_id=user_row.id
-        ).first()
-        if existing:
-            db_ch.close()
+        if not await subscribe(user_id, channel_id, skip_existing=True):
             await q.edit_message_text("Этот канал уже добавлен.")
             return VIEW_LAST_ANNOUNCEMENTS
 
-        new_ch = DiscordChannel(
-            user_id=user_row.id,
-            channel_id=channel_id,
-            name=f"Discord_{channel_id}",
-            active=True
-        )
-        db_ch.add(new_ch)
-        db_ch.commit()
-        db_ch.close()
-
         await q.edit_message_text(f"✅ Вы успешно подписались на канал {channel_id}.")
-        db.close()
         return VIEW_LAST_ANNOUNCEMENTS
 
     # ───── 4) «📜 Мои каналы»
     if data == CB_VIEW_MY_CHANNELS:
-        channels = (
-            db.query(DiscordChannel)
-              .filter_by(user_id=user_row.id, active=True)
-              .order_by(DiscordChannel.id)
-              .all()
-        )
-        db.close()
+        channels = await active_subscriptions(user_id)
         if not channels:
             await q.edit_message_text("❗ У вас нет активных подписок на Discord-каналы.")
             return VIEW_LAST_ANNOUNCEMENTS
 
         text = "Ваши активные подписки Discord:\n"
         for ch in channels:
-            db2 = SessionLocal()
-            adc = db2.query(AvailableDiscordChannel).filter_by(channel_id=ch.channel_id).first()
-            db2.close()
-
-            disp = f"• {adc.channel_name}" if adc else f"• {ch.channel_id}"
+            disp = f"• {ch.label}" if ch.label else f"• {ch.channel_id}"
             text += disp + "\n"
 
         await q.edit_message_text(text)
@@ -418,14 +360,8 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
 
     # ───── 5) «➕ Добавить фильтр»
     if data == CB_ADD_FILTER:
-        channels = (
-            db.query(DiscordChannel)
-              .filter_by(user_id=user_row.id, active=True)
-              .order_by(DiscordChannel.id)
-              .all()
-        )
+        channels = await active_subscriptions(user_id)
         if not channels:
-            db.close()
             await q.edit_message_text("❗ Сначала добавьте канал.")
             return VIEW_LAST_ANNOUNCEMENTS
 
@@ -435,38 +371,43 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         ]
         kb_filter = InlineKeyboardMarkup(buttons)
         await q.edit_message_text("К какому каналу добавить фильтр?", reply_markup=kb_filter)
-        db.close()
         return SELECT_CHANNEL_FOR_FILTER
 
     # ───── 6) «➖ Удалить фильтр»
     if data == CB_DELETE_FILTER:
-        filters_ = (
-            db.query(Filter)
-              .filter_by(user_id=user_row.id, active=True)
-              .order_by(Filter.id)
-              .all()
-        )
+        filters_ = await active_filters(user_id)
         if not filters_:
-            db.close()
             await q.edit_message_text("❗ У вас нет активных фильтров.")
             return VIEW_LAST_ANNOUNCEMENTS
 
         buttons = [
             [InlineKeyboardButton(
-                f"#{f.keyword} (канал {f.discord_channel.channel_id})",
+                f"#{f.keyword} (канал {f.channel_id})",
                 callback_data=f"delf_{f.id}"
             )]
             for f in filters_
         ]
         kb_delf = InlineKeyboardMarkup(buttons)
         await q.edit_message_text("Выберите фильтр для удаления:", reply_markup=kb_delf)
-        db.close()
         return SELECT_FILTER_FOR_DELETE
 
     # ───── 7) «📰 Последние анонсы»
     if data == CB_LATEST_ANNOUNCEMENTS:
         await show_announcements(update, context, page_index=0)
-        db.close()
+        return VIEW_LAST_ANNOUNCEMENTS
+
+    # ───── 7a) «🗞 Режим дайджеста» — включить/выключить
+    if data == CB_TOGGLE_DIGEST:
+        enabled = await toggle_digest(user_id)
+        if enabled:
+            minutes = max(1, round(DIGEST_WINDOW_SECONDS / 60))
+            text = (
+                "✅ Режим дайджеста включён.\n"
+                f"Анонсы будут приходить одним сообщением — не чаще раза в {minutes} мин."
+            )
+        else:
+            text = "✅ Режим дайджеста выключен. Каждый анонс снова приходит сразу отдельным сообщением."
+        await q.edit_message_text(text)
         return VIEW_LAST_ANNOUNCEMENTS
 
     # ───── 8) «anns_page:<page_index>» — перелистывание страниц
@@ -479,7 +420,6 @@ async def discord_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         return VIEW_LAST_ANNOUNCEMENTS
 
     # ───── Незнакомый callback_data — остаёмся в этом меню
-    db.close()
     return VIEW_LAST_ANNOUNCEMENTS
 
 
@@ -488,29 +428,18 @@ async def add_channel_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Обработка текста после “➕ Добавить канал”.
     """
     raw = update.message.text.strip()
+    guild_id = None
     if "/" in raw:
-        channel_id = raw.rstrip("/").rsplit("/", 1)[-1]
+        # https://discord.com/channels/ID_сервера/ID_канала
+        parts = raw.rstrip("/").split("/")
+        channel_id = parts[-1]
+        if len(parts) >= 2 and parts[-2].isdigit():
+            guild_id = parts[-2]
     else:
         channel_id = raw
 
-    db = SessionLocal()
-    telegram_id = update.effective_user.id
-    user_row = db.query(User).filter_by(telegram_id=telegram_id).first()
-    if not user_row:
-        user_row = User(telegram_id=telegram_id, username=update.effective_user.username)
-        db.add(user_row)
-        db.commit()
-        db.refresh(user_row)
-
-    new_ch = DiscordChannel(
-        user_id=user_row.id,
-        channel_id=channel_id,
-        name=f"Discord_{channel_id}",
-        active=True
-    )
-    db.add(new_ch)
-    db.commit()
-    db.close()
+    user_id = await ensure_user(update.effective_user.id, update.effective_user.username)
+    await subscribe(user_id, channel_id, guild_id)
 
     await update.message.reply_text(
         f"✅ Вы подписались на Discord-канал {channel_id}.\n"
@@ -527,12 +456,7 @@ async def select_channel_for_unsubscribe(update: Update, context: ContextTypes.D
     await q.answer()
 
     ch_id = int(q.data.replace("unsub_chan_", ""))
-    db = SessionLocal()
-    ch = db.query(DiscordChannel).filter(DiscordChannel.id == ch_id).first()
-    if ch:
-        ch.active = False
-        db.commit()
-    db.close()
+    await deactivate_subscription(ch_id)
 
     await q.edit_message_text("✅ Вы отписались от оповещений этого Discord-канала.")
     return VIEW_LAST_ANNOUNCEMENTS
@@ -562,25 +486,13 @@ async def add_filter_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❗ Ошибка: канал не найден.")
         return ConversationHandler.END
 
-    db = SessionLocal()
-    ch = db.query(DiscordChannel).filter(DiscordChannel.id == ch_id).first()
-    if not ch:
-        db.close()
+    discord_channel_id = await add_filter(ch_id, keyword)
+    if discord_channel_id is None:
         await update.message.reply_text("❗ Ошибка: канал не найден.")
         return ConversationHandler.END
-
-    new_f = Filter(
-        user_id=ch.user_id,
-        channel_id=ch.id,
-        keyword=keyword,
-        active=True
-    )
-    db.add(new_f)
-    db.commit()
-    db.close()
     context.user_data.pop("discord_channel_id", None)
 
-    await update.message.reply_text(f"✅ Фильтр «{keyword}» добавлен для канала {ch.channel_id}.")
+    await update.message.reply_text(f"✅ Фильтр «{keyword}» добавлен для канала {discord_channel_id}.")
     return ConversationHandler.END
 
 
@@ -592,12 +504,7 @@ async def select_filter_for_delete(update: Update, context: ContextTypes.DEFAULT
     await q.answer()
 
     f_id = int(q.data.replace("delf_", ""))
-    db = SessionLocal()
-    f = db.query(Filter).filter(Filter.id == f_id).first()
-    if f:
-        f.active = False
-        db.commit()
-    db.close()
+    await deactivate_filter(f_id)
 
     await q.edit_message_text("✅ Фильтр удалён.")
     return VIEW_LAST_ANNOUNCEMENTS
@@ -616,11 +523,42 @@ async def discord_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+async def digest_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Перелистывание дайджеста анонсов (кнопки под сообщением, которое прислал
+    Discord-клиент): «digest_page:<digest_id>:<страница>».
+    """
+    q = update.callback_query
+    try:
+        _, digest_id, page_index = q.data.split(":")
+        digest_id, page_index = int(digest_id), int(page_index)
+    except ValueError:
+        await q.answer()
+        return
+
+    htmls = await run_db(load_digest, digest_id, str(q.message.chat.id))
+    if not htmls:
+        await q.answer("Этот дайджест уже недоступен.", show_alert=True)
+        return
+    await q.answer()
+
+    pages = digest_pages(htmls)
+    page_index = min(max(page_index, 0), len(pages) - 1)
+    await q.edit_message_text(
+        pages[page_index],
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+        reply_markup=digest_keyboard(digest_id, page_index, len(pages))
+    )
+
+
 def get_handlers():
     """
     Возвращаем список Handler-ов для регистрации в bot.py.
     """
     return [
+        # Дайджест может прийти посреди любого диалога — его кнопки обрабатываются первыми
+        CallbackQueryHandler(digest_page_callback, pattern=rf"^{CB_DIGEST_PAGE_PREFIX}\d+:\d+$"),
         ConversationHandler(
             entry_points=[
                 CommandHandler("discord", discord_menu),
@@ -641,6 +579,7 @@ def get_handlers():
                             + CB_DELETE_FILTER + r"|"
                             + CB_LATEST_ANNOUNCEMENTS + r"|"
                             + CB_ANN_PAGE_PREFIX + r"|"
+                            + CB_TOGGLE_DIGEST + r"|"
                             + CB_BACK_TO_START +
                             r")"
                         ),
@@ -10,9 +10,7 @@ from telegram.ext import (
     filters,
 )
 
-from models import Feedback
-from db import SessionLocal
-
+from handlers.queries import user_feedbacks, create_feedback, close_feedback
 from handlers.utils import subscription_required
 
 # ─── Состояния для ConversationHandler ───
@@ -62,9 +60,7 @@ async def feedback_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
 
-    db = SessionLocal()
-    items = db.query(Feedback).filter_by(telegram_id=q.from_user.id).order_by(Feedback.created_at.desc()).all()
-    db.close()
+    items = await user_feedbacks(q.from_user.id)
 
     if not items:
         await q.message.edit_text("У вас нет заявок.", reply_markup=build_feedback_menu())
@@ -118,19 +114,12 @@ async def feedback_url_received(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         context.user_data["fb_url"] = ""
 
-    db = SessionLocal()
-    fb = Feedback(
-        telegram_id=update.effective_user.id,
-        title=context.user_data["fb_title"],
-        description=context.user_data["fb_desc"],
-        url=context.user_data["fb_url"],
-        status="Новая",
-        progress="0%"
+    fb_id = await create_feedback(
+        update.effective_user.id,
+        context.user_data["fb_title"],
+        context.user_data["fb_desc"],
+        context.user_data["fb_url"],
     )
-    db.add(fb)
-    db.commit()
-    fb_id = fb.id
-    db.close()
 
     await update.message.reply_text(
         f"✅ Заявка принята! ID: {fb_id}\nСтатус: Новая"
@@ -153,16 +142,9 @@ async def feedback_close_process(update: Update, context: ContextTypes.DEFAULT_T
         return await update.message.reply_text("Введите числовой ID или /cancel:")
 
     fb_id = int(txt)
-    db = SessionLocal()
-    fb = db.query(Feedback).filter(Feedback.id == fb_id).first()
-    if not fb or fb.telegram_id != update.effective_user.id:
-        db.close()
+    if not await close_feedback(fb_id, update.effective_user.id):
         return await update.message.reply_text("Заявка не найдена или не ваша.")
 
-    fb.status = "Закрыта"
-    db.commit()
-    db.close()
-
     await update.message.reply_text(f"✅ Заявка {fb_id} закрыта.")
     return await feedback_start(update, context)
 
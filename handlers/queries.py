@@ -0,0 +1,264 @@
+# handlers/queries.py
+"""
+Запросы обработчиков Telegram-бота. Каждая функция выполняется в пуле потоков
+БД (db_async.db_task) со своей сессией и возвращает простые значения, поэтому
+в обработчике вызывается через await и не останавливает event loop.
+"""
+
+import difflib
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+from db_async import db_task
+from models import (
+    User,
+    Category,
+    Post,
+    Feedback,
+    DiscordChannel,
+    Filter,
+    DiscordAnnouncement,
+    DiscordMessage,
+    AvailableDiscordChannel,
+)
+from channel_sync import guild_of_channel
+
+PostRef = namedtuple("PostRef", "id title link")
+Subscription = namedtuple("Subscription", "id channel_id name label")  # label — название из списка каналов
+FilterRef = namedtuple("FilterRef", "id keyword channel_id")
+AnnouncementView = namedtuple("AnnouncementView", "created_at content matched_filter")
+FeedbackRef = namedtuple("FeedbackRef", "id title status progress")
+
+_POST_REF = (Post.id, Post.title, Post.link)
+
+
+# ─── Пользователи ─────────────────────────────────────────────────────────────
+
+@db_task
+def ensure_user(db, telegram_id: int, username: Optional[str] = None) -> int:
+    """id пользователя по telegram_id; при первом обращении пользователь создаётся."""
+    row = db.query(User.id).filter_by(telegram_id=telegram_id).first()
+    if row:
+        return row.id
+    user = User(telegram_id=telegram_id, username=username)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+@db_task
+def all_telegram_ids(db) -> List[int]:
+    return [telegram_id for (telegram_id,) in db.query(User.telegram_id)]
+
+
+# ─── Discord-подписки ─────────────────────────────────────────────────────────
+
+@db_task
+def latest_announcements(db, telegram_id: int, limit: int = 5) -> Optional[List[AnnouncementView]]:
+    """Последние анонсы пользователя (перевод, если есть); None — пользователя ещё нет в базе."""
+    user = db.query(User.id).filter_by(telegram_id=telegram_id).first()
+    if not user:
+        return None
+    rows = (
+        db.query(DiscordAnnouncement.created_at, DiscordMessage.content,
+                 DiscordMessage.translated, DiscordAnnouncement.matched_filter)
+          .join(DiscordMessage, DiscordMessage.message_id == DiscordAnnouncement.message_id)
+          .filter(DiscordAnnouncement.user_id == user.id)
+          .order_by(DiscordAnnouncement.created_at.desc())
+          .limit(limit)
+          .all()
+    )
+    return [AnnouncementView(r.created_at, r.translated or r.content, r.matched_filter) for r in rows]
+
+
+@db_task
+def active_subscriptions(db, user_id: int) -> List[Subscription]:
+    """Активные подписки пользователя с названиями каналов — одним запросом."""
+    rows = (
+        db.query(DiscordChannel.id, DiscordChannel.channel_id, DiscordChannel.name,
+                 AvailableDiscordChannel.channel_name)
+          .outerjoin(AvailableDiscordChannel, AvailableDiscordChannel.channel_id == DiscordChannel.channel_id)
+          .filter(DiscordChannel.user_id == user_id, DiscordChannel.active == True)
+          .order_by(DiscordChannel.id)
+          .all()
+    )
+    return [Subscription(*r) for r in rows]
+
+
+@db_task
+def available_channels(db) -> List[Tuple[str, str]]:
+    """(channel_id, channel_name) каналов, на которые можно подписаться."""
+    return (
+        db.query(AvailableDiscordChannel.channel_id, AvailableDiscordChannel.channel_name)
+          .filter_by(is_active=True)
+          .order_by(AvailableDiscordChannel.channel_name)
+          .all()
+    )
+
+
+@db_task
+def subscribe(db, user_id: int, channel_id: str, guild_id: Optional[str] = None,
+              skip_existing: bool = False) -> bool:
+    """Подписывает пользователя на канал; False — уже подписан (при skip_existing)."""
+    if skip_existing:
+        existing = db.query(DiscordChannel.id).filter_by(
+            channel_id=channel_id, active=True, user_id=user_id
+        ).first()
+        if existing:
+            return False
+    db.add(DiscordChannel(
+        user_id=user_id,
+        channel_id=channel_id,
+        guild_id=guild_id or guild_of_channel(db, channel_id),
+        name=f"Discord_{channel_id}",
+        active=True
+    ))
+    db.commit()
+    return True
+
+
+@db_task
+def deactivate_subscription(db, subscription_id: int):
+    ch = db.query(DiscordChannel).filter(DiscordChannel.id == subscription_id).first()
+    if ch:
+        ch.active = False
+        db.commit()
+
+
+@db_task
+def toggle_digest(db, user_id: int) -> bool:
+    """Переключает режим дайджеста; возвращает новое значение."""
+    user = db.query(User).filter(User.id == user_id).one()
+    user.digest_mode = not user.digest_mode
+    db.commit()
+    return bool(user.digest_mode)
+
+
+@db_task
+def active_filters(db, user_id: int) -> List[FilterRef]:
+    rows = (
+        db.query(Filter.id, Filter.keyword, DiscordChannel.channel_id)
+          .join(DiscordChannel, DiscordChannel.id == Filter.channel_id)
+          .filter(Filter.user_id == user_id, Filter.active == True)
+          .order_by(Filter.id)
+          .all()
+    )
+    return [FilterRef(*r) for r in rows]
+
+
+@db_task
+def add_filter(db, subscription_id: int, keyword: str) -> Optional[str]:
+    """Добавляет фильтр к подписке; возвращает ID Discord-канала (None — подписки нет)."""
+    ch = db.query(DiscordChannel.user_id, DiscordChannel.channel_id)\
+           .filter(DiscordChannel.id == subscription_id).first()
+    if not ch:
+        return None
+    db.add(Filter(user_id=ch.user_id, channel_id=subscription_id, keyword=keyword, active=True))
+    db.commit()
+    return ch.channel_id
+
+
+@db_task
+def deactivate_filter(db, filter_id: int):
+    f = db.query(Filter).filter(Filter.id == filter_id).first()
+    if f:
+        f.active = False
+        db.commit()
+
+
+# ─── Посты и категории ────────────────────────────────────────────────────────
+
+@db_task
+def search_posts(db, query: str, limit: int = 5) -> Tuple[List[PostRef], List[str]]:
+    """
+    Поиск по вхождению в title неархивированных постов. Если точных совпадений
+    нет — до limit похожих названий (difflib), тоже в потоке пула: на большой
+    таблице это самая долгая часть поиска.
+    """
+    exact = (
+        db.query(*_POST_REF)
+          .filter(Post.title.ilike(f"%{query}%"), Post.archived == False)
+          .limit(limit)
+          .all()
+    )
+    if exact:
+        return [PostRef(*r) for r in exact], []
+    titles = [title for (title,) in db.query(Post.title).filter_by(archived=False)]
+    return [], difflib.get_close_matches(query, titles, n=limit, cutoff=0.5)
+
+
+@db_task
+def post_by_title(db, title: str) -> Optional[PostRef]:
+    row = db.query(*_POST_REF).filter_by(title=title).first()
+    return PostRef(*row) if row else None
+
+
+@db_task
+def post_by_id(db, post_id: int) -> Optional[PostRef]:
+    row = db.query(*_POST_REF).filter(Post.id == post_id).first()
+    return PostRef(*row) if row else None
+
+
+@db_task
+def category_listing(db, parent_id: Optional[int], offset: int, limit: int
+                     ) -> Tuple[List[Tuple[int, str]], List[PostRef], int]:
+    """
+    Подкатегории parent_id (id, name); если их нет — страница постов категории
+    и их общее число.
+    """
+    subs = (
+        db.query(Category.id, Category.name)
+          .filter(Category.parent_id == parent_id)
+          .order_by(Category.name)
+          .all()
+    )
+    if subs:
+        return subs, [], 0
+    q = db.query(*_POST_REF).filter(Post.category_id == parent_id, Post.archived == False).order_by(Post.id)
+    total = q.count()
+    return [], [PostRef(*r) for r in q.offset(offset).limit(limit).all()], total
+
+
+@db_task
+def add_category(db, name: str):
+    db.add(Category(name=name))
+    db.commit()
+
+
+# ─── Обратная связь ───────────────────────────────────────────────────────────
+
+@db_task
+def user_feedbacks(db, telegram_id: int) -> List[FeedbackRef]:
+    rows = (
+        db.query(Feedback.id, Feedback.title, Feedback.status, Feedback.progress)
+          .filter_by(telegram_id=telegram_id)
+          .order_by(Feedback.created_at.desc())
+          .all()
+    )
+    return [FeedbackRef(*r) for r in rows]
+
+
+@db_task
+def create_feedback(db, telegram_id: int, title: str, description: str, url: str) -> int:
+    fb = Feedback(
+        telegram_id=telegram_id,
+        title=title,
+        description=description,
+        url=url,
+        status="Новая",
+        progress="0%"
+    )
+    db.add(fb)
+    db.commit()
+    return fb.id
+
+
+@db_task
+def close_feedback(db, feedback_id: int, telegram_id: int) -> bool:
+    """Закрывает заявку пользователя; False — заявки нет или она чужая."""
+    fb = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    if not fb or fb.telegram_id != telegram_id:
+        return False
+    fb.status = "Закрыта"
+    db.commit()
+    return True
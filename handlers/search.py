@@ -1,6 +1,5 @@
 # handlers/search.py
 
-import difflib
 import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
@@ -11,8 +10,7 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
-from db import SessionLocal
-from models import Post
+from handlers.queries import PostRef, search_posts, post_by_title
 
 from handlers.utils import subscription_required
 
@@ -43,7 +41,7 @@ async def search_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return SEARCH_QUERY
 
 
-async def _forward_post_to_user(user_chat_id: int, post: Post, context: ContextTypes.DEFAULT_TYPE):
+async def _forward_post_to_user(user_chat_id: int, post: PostRef, context: ContextTypes.DEFAULT_TYPE):
     """
     Вспомогательная функция: из поля post.link (или полей post.channel_username и post.message_id)
     выцепляем, откуда нужно переслать, и делаем forward_message.
@@ -97,14 +95,9 @@ async def search_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Иначе – строим список похожих названий и показываем кнопки-подсказки.
     """
     query = update.message.text.strip()
-    db = SessionLocal()
-    # Ищем точные (substring) совпадения в title, неархивированные
-    exact_posts = (
-        db.query(Post)
-          .filter(Post.title.ilike(f"%{query}%"), Post.archived == False)
-          .limit(5)
-          .all()
-    )
+    # Точные (substring) совпадения в title среди неархивированных, а если их нет —
+    # похожие названия (difflib)
+    exact_posts, close_matches = await search_posts(query)
 
     user_chat_id = update.effective_chat.id
 
@@ -112,14 +105,8 @@ async def search_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Если хоть что-то нашлось – пересылаем оригиналы
         for post in exact_posts:
             await _forward_post_to_user(user_chat_id, post, context)
-        db.close()
         return ConversationHandler.END
 
-    # Если exact не нашлось – собираем все названия (unarchived) и через difflib ищем похожие
-    all_titles = [p.title for p in db.query(Post).filter_by(archived=False).all()]
-    db.close()
-
-    close_matches = difflib.get_close_matches(query, all_titles, n=5, cutoff=0.5)
     if not close_matches:
         await update.message.reply_text("Ничего не найдено и похожих вариантов нет.")
         return ConversationHandler.END
@@ -149,9 +136,7 @@ async def search_suggest_callback(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
 
     title = data.split(":", 1)[1]
-    db = SessionLocal()
-    post = db.query(Post).filter_by(title=title).first()
-    db.close()
+    post = await post_by_title(title)
 
     user_chat_id = q.message.chat.id
     if post:
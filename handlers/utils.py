@@ -1,10 +1,16 @@
 # handlers/utils.py
 
+import os
+import asyncio
 from functools import wraps
+from typing import Dict
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import ConversationHandler, ContextTypes
+from telegram.ext import BaseUpdateProcessor, ConversationHandler, ContextTypes
 from config import SUBSCRIPTION_CHANNEL, ADMIN_IDS
 
+# Сколько обновлений бот обрабатывает одновременно (0 или 1 — строго по очереди, как раньше)
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))
+
 # Декоратор: требует подписку на канал
 def subscription_required(func):
     @wraps(func)
@@ -48,6 +54,48 @@ def admin_required(func):
         return await func(update, context, *args, **kwargs)
     return wrapped
 
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обновления разных пользователей обрабатываются одновременно (пока один ждёт
+    ответа БД или Telegram, остальные не стоят в очереди), а обновления одного
+    пользователя — строго по порядку: на этом держатся состояния ConversationHandler.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = None
+        if isinstance(update, Update):
+            user = update.effective_user
+            chat = update.effective_chat
+            key = user.id if user else (chat.id if chat else None)
+        if key is None:
+            await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
 # Пустая заглушка для унификации импорта
 def get_handlers():
     return []
@@ -0,0 +1,121 @@
+# media_cache.py
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict, namedtuple
+from typing import Dict, List, Optional, Sequence
+
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+
+from metrics import MEDIA_SENDS
+
+logger = logging.getLogger("discord_client.media")
+
+MEDIA_FILE_ID_CACHE_SIZE = int(os.getenv("MEDIA_FILE_ID_CACHE_SIZE", "5000"))  # картинок в кэше file_id
+
+_ALBUM_LIMIT = 10  # sendMediaGroup принимает от 2 до 10 элементов
+
+# Картинка анонса: key — ID вложения Discord (у картинок эмбедов ID нет — "url:<ссылка>")
+MediaRef = namedtuple("MediaRef", "key url")
+
+
+def _file_id(message) -> Optional[str]:
+    # Самый крупный вариант фото — последний в списке PhotoSize
+    return message.photo[-1].file_id if message is not None and message.photo else None
+
+
+class MediaFileCache:
+    """
+    Кэш Telegram file_id для картинок из Discord.
+
+    Первая успешная отправка загружает картинку по ссылке CDN Discord, дальше
+    все подписчики получают её по file_id — Telegram не скачивает файл заново,
+    а протухшие ссылки CDN больше не мешают доставке. Пока идёт первая загрузка,
+    остальные отправки той же картинки ждут её (single-flight), а не качают параллельно.
+
+    Ключ и вытеснение (LRU) — по ID вложения Discord.
+    """
+
+    def __init__(self, max_size: int = MEDIA_FILE_ID_CACHE_SIZE):
+        self.max_size = max_size
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.uploads = 0    # отправок по ссылке (в /metrics — nodebot_telegram_media_total)
+        self.reused = 0     # отправок по file_id
+
+    def get(self, key: str) -> Optional[str]:
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+        return file_id
+
+    def put(self, key: str, file_id: str):
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.max_size:
+            self._file_ids.popitem(last=False)
+
+    def evict(self, key: str):
+        self._file_ids.pop(key, None)
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    # ─── Отправка ────────────────────────────────────────────────────────────
+
+    async def send(self, delivery, chat_id, refs: Sequence[MediaRef]):
+        """Отправляет картинки в чат: одну — sendPhoto, несколько — альбомами по 10."""
+        for start in range(0, len(refs), _ALBUM_LIMIT):
+            await self._send_chunk(delivery, chat_id, refs[start:start + _ALBUM_LIMIT])
+
+    async def _send_chunk(self, delivery, chat_id, refs: Sequence[MediaRef]):
+        # 1) Если эти картинки уже кто-то загружает — дожидаемся его результата
+        pending = [self._inflight[r.key] for r in refs
+                   if r.key in self._inflight and r.key not in self._file_ids]
+        if pending:
+            await asyncio.wait(pending)
+
+        # 2) Загрузку оставшихся без file_id берём на себя
+        owned: List[str] = []
+        loop = asyncio.get_running_loop()
+        for r in refs:
+            if r.key not in self._file_ids and r.key not in self._inflight:
+                self._inflight[r.key] = loop.create_future()
+                owned.append(r.key)
+
+        try:
+            try:
+                await self._deliver(delivery, chat_id, refs)
+            except BadRequest:
+                # file_id мог стать недействительным — забываем его и шлём по ссылкам
+                stale = [r.key for r in refs if r.key in self._file_ids]
+                if not stale:
+                    raise
+                for key in stale:
+                    self.evict(key)
+                logger.warning(f"[Media] Telegram отклонил file_id, повтор по ссылкам ({len(stale)} шт.)")
+                await self._deliver(delivery, chat_id, refs)
+        finally:
+            for key in owned:
+                self._inflight.pop(key).set_result(None)
+
+    async def _deliver(self, delivery, chat_id, refs: Sequence[MediaRef]):
+        sources = [self.get(r.key) for r in refs]
+        reused = sum(1 for s in sources if s)
+        self.reused += reused
+        self.uploads += len(sources) - reused
+        MEDIA_SENDS.inc("reused", amount=reused)
+        MEDIA_SENDS.inc("upload", amount=len(sources) - reused)
+        sources = [s or r.url for s, r in zip(sources, refs)]
+
+        if len(refs) == 1:
+            sent = [await delivery.send_photo(chat_id, sources[0])]
+        else:
+            sent = await delivery.send_media_group(chat_id, [InputMediaPhoto(media=s) for s in sources])
+
+        for r, message in zip(refs, sent):
+            file_id = _file_id(message)
+            if file_id and r.key not in self._file_ids:
+                self.put(r.key, file_id)
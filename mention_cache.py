@@ -0,0 +1,93 @@
+# mention_cache.py
+
+import os
+import re
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from db import SessionLocal
+from models import AvailableDiscordChannel
+
+logger = logging.getLogger("discord_client.mentions")
+
+MENTION_USER_CACHE_SIZE = int(os.getenv("MENTION_USER_CACHE_SIZE", "10000"))  # имён участников в памяти
+
+CHANNEL_MENTION_RE = re.compile(r"<#(\d+)>")
+USER_MENTION_RE    = re.compile(r"<@!?(\d+)>")
+
+
+class MentionCache:
+    """
+    Имена для упоминаний <#ID> и <@ID> в памяти Discord-процесса.
+
+    Каналы: полная карта channel_id → имя, её заполняет sync_available_channels
+    (при старте — из available_discord_channels). Участники: ограниченный LRU,
+    пополняемый из message.mentions и кэша участников гильдии discord.py.
+    Рендер анонса обращается только к словарям — без запросов к БД.
+    """
+
+    def __init__(self, max_users: int = MENTION_USER_CACHE_SIZE):
+        self._channels: Dict[str, str] = {}
+        self._users: "OrderedDict[str, str]" = OrderedDict()
+        self.max_users = max_users
+
+    # ─── Каналы ──────────────────────────────────────────────────────────────
+
+    def load_channels(self):
+        """Начальная загрузка карты каналов из БД (в потоке, до первой синхронизации)."""
+        db = SessionLocal()
+        try:
+            rows = db.query(AvailableDiscordChannel.channel_id, AvailableDiscordChannel.channel_name).all()
+        finally:
+            db.close()
+        self._channels.update((r.channel_id, r.channel_name) for r in rows)
+        logger.info(f"[Mentions] Загружено имён каналов: {len(self._channels)}.")
+
+    def set_channels(self, names: Dict[str, str]):
+        """Заменяет карту каналов целиком (результат синхронизации с гильдией)."""
+        self._channels = dict(names)
+
+    def set_channel(self, channel_id: str, name: str):
+        self._channels[channel_id] = name
+
+    def remove_channel(self, channel_id: str):
+        self._channels.pop(channel_id, None)
+
+    def channel_name(self, channel_id: str) -> Optional[str]:
+        return self._channels.get(channel_id)
+
+    # ─── Участники ───────────────────────────────────────────────────────────
+
+    def remember_user(self, user_id: str, name: str):
+        self._users[user_id] = name
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def user_name(self, user_id: str) -> Optional[str]:
+        name = self._users.get(user_id)
+        if name is not None:
+            self._users.move_to_end(user_id)
+        return name
+
+    def remember_mentions(self, message, text: str):
+        """
+        Запоминает имена участников, упомянутых в text: сначала из message.mentions
+        (их разрешил сам Discord), остальных — из кэша участников гильдии.
+        Ничего не запрашивает по сети и не обращается к БД.
+        """
+        for member in message.mentions:
+            self.remember_user(str(member.id), member.display_name)
+        guild = message.guild
+        if guild is None:
+            return
+        for user_id in set(USER_MENTION_RE.findall(text)):
+            if user_id in self._users:
+                continue
+            member = guild.get_member(int(user_id))
+            if member is not None:
+                self.remember_user(user_id, member.display_name)
+
+    def stats(self) -> dict:
+        return {"channels": len(self._channels), "users": len(self._users)}
@@ -0,0 +1,199 @@
+# metrics.py
+
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("discord_client.metrics")
+
+# ─── Настройки (.env) ─────────────────────────────────────────────────────────
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 — выключено; шард N слушает METRICS_PORT + N
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DELAY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками (формат Prometheus: <name> <значение>)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()  # счётчики перевода увеличиваются из потоков пула
+        _REGISTRY.append(self)
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма с метками: число наблюдений по корзинам (накопительно, как
+    требует формат Prometheus), сумма и количество.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # метки → [counts по корзинам + «+Inf», sum]
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str):
+        """with histogram.time("stage"): ... — записывает длительность блока."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def count(self, *labelvalues: str) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[0]) if series else 0
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _labels(self.labelnames, labelvalues, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+_REGISTRY: list = []
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# ─── Метрики конвейера Discord → Telegram ─────────────────────────────────────
+
+STAGE_SECONDS = Histogram(
+    "nodebot_discord_stage_seconds",
+    "Длительность этапов обработки сообщения Discord",
+    ("stage",),
+)
+MESSAGES = Counter(
+    "nodebot_discord_messages_total",
+    "Сообщения Discord по итогу обработки",
+    ("result",),
+)
+TELEGRAM_SENDS = Counter(
+    "nodebot_telegram_sends_total",
+    "Отправки анонсов в Telegram (сообщение или дайджест)",
+    ("result",),
+)
+TRANSLATION_CACHE = Counter(
+    "nodebot_translation_cache_total",
+    "Обращения к памяти переводов: lru / db — попадание, miss — перевод через googletrans",
+    ("result",),
+)
+TRANSLATOR_CALLS = Counter(
+    "nodebot_translator_calls_total",
+    "Вызовы googletrans",
+    ("result",),
+)
+TRANSLATOR_SECONDS = Counter(
+    "nodebot_translator_seconds_total",
+    "Суммарное время вызовов googletrans",
+)
+MEDIA_SENDS = Counter(
+    "nodebot_telegram_media_total",
+    "Картинки анонсов: upload — по ссылке Discord, reused — по сохранённому file_id",
+    ("source",),
+)
+DELIVERY_DELAY = Histogram(
+    "nodebot_announcement_delivery_delay_seconds",
+    "Задержка от публикации в Discord до доставки в Telegram",
+    buckets=DELAY_BUCKETS,
+)
+
+
+def observe_delivery(posted_at: Optional[float]):
+    if posted_at is not None:
+        DELIVERY_DELAY.observe(max(0.0, time.time() - posted_at))
+
+
+# ─── HTTP-эндпоинт /metrics ───────────────────────────────────────────────────
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """
+    Поднимает /metrics на aiohttp (уже установлен вместе с discord.py).
+    Возвращает AppRunner (закрыть — await runner.cleanup()) или None,
+    если эндпоинт выключен или порт занят.
+    """
+    if port <= 0:
+        return None
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(
+            body=render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.warning(f"[Metrics] Не удалось открыть {host}:{port}: {e} — метрики недоступны.")
+        await runner.cleanup()
+        return None
+    logger.info(f"[Metrics] Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,65 @@
+# migrations/env.py
+
+from logging.config import fileConfig
+
+from alembic import context
+
+# База и профиль соединений — те же, что у приложения (DATABASE_URL из .env, см. db.py)
+from db import Base, engine, DB_URI
+import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# SQLite не умеет ALTER COLUMN / ADD CONSTRAINT — такие операции Alembic
+# выполняет пересозданием таблицы (batch mode)
+RENDER_AS_BATCH = DB_URI.startswith("sqlite")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Служебные таблицы SQLite (sqlite_stat1 после ANALYZE) к схеме не относятся
+    return not (type_ == "table" and name.startswith("sqlite_"))
+
+
+def run_migrations_offline() -> None:
+    """alembic upgrade --sql: вывести SQL миграций, не подключаясь к базе."""
+    context.configure(
+        url=DB_URI,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=RENDER_AS_BATCH,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        # Соединение передано вызывающим кодом (command.upgrade из Python) — работаем в его транзакции
+        _run(connection)
+        return
+    with engine.connect() as connection:
+        _run(connection)
+
+
+def _run(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=RENDER_AS_BATCH,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
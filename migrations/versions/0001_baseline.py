@@ -0,0 +1,151 @@
+"""Исходная схема (как её создавал init_db)
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Базы, созданные прежним init_db(), уже содержат эти таблицы: они пропускаются,
+поэтому `alembic upgrade head` подходит и для новой, и для существующей базы.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(name: str, *columns, **kw):
+    if not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns, **kw)
+
+
+def upgrade() -> None:
+    _create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("telegram_id", sa.String(), nullable=False, unique=True),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.Column("digest_mode", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("parent_id", sa.Integer(), sa.ForeignKey("categories.id"), nullable=True),
+    )
+    _create_table(
+        "channels",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("chat_id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("auto_comment", sa.String(), nullable=True),
+    )
+    _create_table(
+        "posts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("link", sa.String(), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id"), nullable=True),
+        sa.Column("archived", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("start_date", sa.Date(), nullable=True),
+        sa.Column("end_date", sa.Date(), nullable=True),
+        sa.Column("views", sa.Integer(), nullable=True),
+    )
+    _create_table(
+        "feedbacks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("telegram_id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("url", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("progress", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        "discord_channels",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("channel_id", sa.String(), nullable=False),
+        sa.Column("guild_id", sa.String(), nullable=True),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        "filters",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("channel_id", sa.Integer(), sa.ForeignKey("discord_channels.id"), nullable=False),
+        sa.Column("keyword", sa.String(), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        "discord_announcements",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("channel_id", sa.Integer(), sa.ForeignKey("discord_channels.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("translated", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("matched_filter", sa.String(), nullable=True),
+        sa.UniqueConstraint("message_id", "user_id", name="uq_discord_announcements_message_user"),
+    )
+    _create_table(
+        "delivery_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("chat_id", sa.String(), nullable=False),
+        sa.Column("guild_id", sa.String(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("digest_id", sa.Integer(), nullable=True),
+        sa.UniqueConstraint("message_id", "user_id", name="uq_delivery_outbox_message_user"),
+    )
+    if not any(ix["name"] == "ix_delivery_outbox_due"
+               for ix in sa.inspect(op.get_bind()).get_indexes("delivery_outbox")):
+        op.create_index("ix_delivery_outbox_due", "delivery_outbox", ["status", "next_attempt_at"])
+    _create_table(
+        "translation_cache",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("source_hash", sa.String(64), nullable=False, unique=True),
+        sa.Column("target_lang", sa.String(), nullable=False),
+        sa.Column("translated", sa.Text(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("last_used", sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        "available_discord_channels",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("channel_id", sa.String(), nullable=False, unique=True),
+        sa.Column("guild_id", sa.String(), nullable=True),
+        sa.Column("channel_name", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("last_seen", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    for table in ("available_discord_channels", "translation_cache", "delivery_outbox",
+                  "discord_announcements", "filters", "discord_channels", "feedbacks",
+                  "posts", "channels", "categories", "users"):
+        op.drop_table(table)
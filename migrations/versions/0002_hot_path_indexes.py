@@ -0,0 +1,84 @@
+"""Индексы горячих запросов; users.telegram_id — целое число
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 12:30:00
+
+* discord_announcements (user_id, created_at) — последние анонсы пользователя
+  (show_announcements); (message_id, user_id) уже покрыт уникальным индексом
+  uq_discord_announcements_message_user;
+* discord_channels (channel_id, active), filters (channel_id, active) — подписчики
+  и фильтры канала; discord_channels.updated_at, filters.updated_at — индекс
+  подписок Discord-клиента опрашивает изменения каждые несколько секунд;
+* posts (archived, category_id) — списки постов категории и поиск;
+* users.telegram_id и feedbacks.telegram_id — BIGINT: обработчики ищут по
+  целому update.effective_user.id, а ID Telegram не помещаются в 32 бита.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_hot_path_indexes"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_discord_announcements_user_created", "discord_announcements", ["user_id", "created_at"]),
+    ("ix_discord_channels_channel_active", "discord_channels", ["channel_id", "active"]),
+    ("ix_discord_channels_updated_at", "discord_channels", ["updated_at"]),
+    ("ix_filters_channel_active", "filters", ["channel_id", "active"]),
+    ("ix_filters_updated_at", "filters", ["updated_at", "channel_id"]),
+    ("ix_posts_archived_category", "posts", ["archived", "category_id"]),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == "sqlite":
+        # telegram_id хранился строкой. При пересоздании таблицы SQLite сам приведёт
+        # '123' к числу, а нечисловое значение молча оставит текстом — проверяем заранее
+        # (PostgreSQL на таком значении упадёт сам)
+        bad = bind.execute(sa.text(
+            "SELECT telegram_id FROM users WHERE trim(telegram_id, '0123456789') <> '' "
+            "OR telegram_id = '' LIMIT 5"
+        )).fetchall()
+        if bad:
+            raise RuntimeError(f"users.telegram_id содержит нечисловые значения: {[r[0] for r in bad]}")
+
+    with op.batch_alter_table("users") as batch:
+        batch.alter_column("telegram_id", existing_type=sa.String(), type_=sa.BigInteger(),
+                           existing_nullable=False, postgresql_using="telegram_id::bigint")
+    with op.batch_alter_table("feedbacks") as batch:
+        batch.alter_column("telegram_id", existing_type=sa.Integer(), type_=sa.BigInteger(),
+                           existing_nullable=False)
+
+    # Базы, созданные init_db() уже с этими моделями, индексы имеют. В совсем старых
+    # таблицах может не быть колонки (updated_at) — такой индекс создаст
+    # 0002a_legacy_columns, добавив колонку
+    inspector = sa.inspect(bind)
+    for name, table, columns in INDEXES:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if not set(columns) <= existing:
+            continue
+        if not any(ix["name"] == name for ix in inspector.get_indexes(table)):
+            op.create_index(name, table, columns)
+
+    # Статистика для планировщика SQLite/PostgreSQL по новым индексам
+    if bind.dialect.name in ("sqlite", "postgresql"):
+        bind.execute(sa.text("ANALYZE"))
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table("feedbacks") as batch:
+        batch.alter_column("telegram_id", existing_type=sa.BigInteger(), type_=sa.Integer(),
+                           existing_nullable=False)
+    with op.batch_alter_table("users") as batch:
+        batch.alter_column("telegram_id", existing_type=sa.BigInteger(), type_=sa.String(),
+                           existing_nullable=False)
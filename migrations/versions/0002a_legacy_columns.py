@@ -0,0 +1,104 @@
+"""Колонки и индексы, которые прежний init_db() добавлял в старые таблицы
+
+Revision ID: 0002a_legacy_columns
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18 16:30:00
+
+Раньше init_db() при каждом запуске дописывал в таблицы старой базы недостающие
+колонки, заполнял guild_id и удалял дубли анонсов перед ограничением уникальности.
+Теперь init_db() только сверяет версию схемы, поэтому эти пост-миграции — здесь.
+Каждый шаг проверяет, нужен ли он: на базе, созданной по текущим моделям,
+ревизия ничего не меняет.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import DISCORD_GUILD_IDS
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002a_legacy_columns"
+down_revision: Union[str, None] = "0002_hot_path_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Индексы 0002_hot_path_indexes по колонкам, которых в старой базе могло не быть
+UPDATED_AT_INDEXES = (
+    ("ix_discord_channels_updated_at", "discord_channels", ["updated_at"]),
+    ("ix_filters_updated_at", "filters", ["updated_at", "channel_id"]),
+)
+
+
+def _add_columns(table: str, *columns_sql):
+    """Добавляет колонки, которых нет в таблице старой базы. columns_sql — (имя, DDL, SQL после добавления)."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table(table):
+        return
+    existing = {c["name"] for c in inspector.get_columns(table)}
+    for name, ddl, after in columns_sql:
+        if name not in existing:
+            bind.execute(sa.text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            if after:
+                bind.execute(sa.text(after))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    _add_columns(
+        "users",
+        ("created_at", "DATETIME", "UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"),
+        ("digest_mode", "BOOLEAN DEFAULT 0", None),
+    )
+    _add_columns(
+        "posts",
+        ("created_at", "DATETIME", "UPDATE posts SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"),
+        ("start_date", "DATE", None),
+        ("end_date", "DATE", None),
+        ("views", "INTEGER DEFAULT 0", None),
+    )
+    _add_columns("discord_announcements", ("translated", "TEXT", None))
+    _add_columns("delivery_outbox", ("digest_id", "INTEGER", None), ("guild_id", "VARCHAR", None))
+    for table in ("discord_channels", "filters"):
+        _add_columns(table, ("updated_at", "DATETIME", None))
+
+    # До поддержки нескольких серверов сервер был один — DISCORD_GUILD_ID
+    guild_fill = None
+    if len(DISCORD_GUILD_IDS) == 1:
+        guild_fill = "UPDATE {table} SET guild_id = '%s' WHERE guild_id IS NULL" % DISCORD_GUILD_IDS[0]
+    for table in ("available_discord_channels", "discord_channels"):
+        _add_columns(table, ("guild_id", "VARCHAR", guild_fill.format(table=table) if guild_fill else None))
+    # Подпискам без сервера — сервер канала из списка доступных
+    bind.execute(sa.text(
+        "UPDATE discord_channels SET guild_id = ("
+        "SELECT a.guild_id FROM available_discord_channels a "
+        "WHERE a.channel_id = discord_channels.channel_id) "
+        "WHERE guild_id IS NULL AND channel_id IN ("
+        "SELECT channel_id FROM available_discord_channels WHERE guild_id IS NOT NULL)"
+    ))
+
+    # Уникальность (message_id, user_id): старые дубли удаляем, оставляя первую запись
+    inspector = sa.inspect(bind)
+    uniques = {u["name"] for u in inspector.get_unique_constraints("discord_announcements")}
+    uniques |= {i["name"] for i in inspector.get_indexes("discord_announcements") if i["unique"]}
+    if "uq_discord_announcements_message_user" not in uniques:
+        bind.execute(sa.text(
+            "DELETE FROM discord_announcements WHERE id NOT IN ("
+            "SELECT MIN(id) FROM discord_announcements GROUP BY message_id, user_id)"
+        ))
+        with op.batch_alter_table("discord_announcements") as batch:
+            batch.create_unique_constraint("uq_discord_announcements_message_user", ["message_id", "user_id"])
+
+    # 0002 пропускает индекс, если колонки ещё не было
+    inspector = sa.inspect(bind)
+    for name, table, columns in UPDATED_AT_INDEXES:
+        if not any(ix["name"] == name for ix in inspector.get_indexes(table)):
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    # Колонки входят в исходную схему 0001_baseline, а удалённые дубли не восстановить —
+    # откатывать нечего
+    pass
@@ -0,0 +1,111 @@
+"""Текст сообщения Discord хранится один раз: discord_messages
+
+Revision ID: 0003_discord_messages
+Revises: 0002a_legacy_columns
+Create Date: 2026-10-18 15:00:00
+
+discord_announcements хранила полный content и translated в каждой строке —
+по копии на подписчика (анонс в 4 КБ на 2000 пользователей — 16 МБ текста).
+Текст переносится в discord_messages (одна строка на сообщение, ключ —
+message_id), а discord_announcements остаётся тонкой таблицей получателей
+со ссылкой на сообщение.
+
+Миграция сообщает, сколько байт текста было и стало; для SQLite — сколько
+страниц освободилось (файл уменьшится после VACUUM).
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_discord_messages"
+down_revision: Union[str, None] = "0002a_legacy_columns"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _text_bytes(bind, table: str) -> int:
+    """Объём content + translated в таблице, байт."""
+    if bind.dialect.name == "sqlite":
+        size = "length(CAST({0} AS BLOB))"
+    elif bind.dialect.name == "postgresql":
+        size = "octet_length({0})"
+    else:
+        size = "length({0})"
+    sql = "SELECT COALESCE(SUM(COALESCE(%s, 0) + COALESCE(%s, 0)), 0) FROM %s" % (
+        size.format("content"), size.format("translated"), table)
+    return int(bind.execute(sa.text(sql)).scalar())
+
+
+def _sqlite_pages(bind):
+    """(страниц всего, свободных, размер страницы)."""
+    return (bind.execute(sa.text("PRAGMA page_count")).scalar(),
+            bind.execute(sa.text("PRAGMA freelist_count")).scalar(),
+            bind.execute(sa.text("PRAGMA page_size")).scalar())
+
+
+def _mib(size: int) -> str:
+    return "%.1f МиБ" % (size / 1024 / 1024)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == "sqlite"
+    before_bytes = _text_bytes(bind, "discord_announcements")
+    before_pages = _sqlite_pages(bind) if is_sqlite else None
+
+    op.create_table(
+        "discord_messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("message_id", sa.String(), nullable=False, unique=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("translated", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    # Одна строка на сообщение: текст у всех копий один, перевод — любой непустой
+    bind.execute(sa.text(
+        "INSERT INTO discord_messages (message_id, content, translated, created_at) "
+        "SELECT message_id, MIN(content), MAX(translated), MIN(created_at) "
+        "FROM discord_announcements GROUP BY message_id"
+    ))
+
+    with op.batch_alter_table("discord_announcements") as batch:
+        batch.drop_column("content")
+        batch.drop_column("translated")
+        batch.create_foreign_key("fk_discord_announcements_message", "discord_messages",
+                                 ["message_id"], ["message_id"])
+
+    rows = bind.execute(sa.text("SELECT COUNT(*) FROM discord_announcements")).scalar()
+    messages = bind.execute(sa.text("SELECT COUNT(*) FROM discord_messages")).scalar()
+    after_bytes = _text_bytes(bind, "discord_messages")
+    logger.info("discord_messages: %s анонсов → %s сообщений; текст %s → %s",
+                rows, messages, _mib(before_bytes), _mib(after_bytes))
+    if is_sqlite:
+        pages, free, page_size = _sqlite_pages(bind)
+        freed = (free - before_pages[1]) * page_size
+        logger.info("SQLite: занято %s → %s, освобождено %s (файл уменьшится после VACUUM)",
+                    _mib((before_pages[0] - before_pages[1]) * page_size),
+                    _mib((pages - free) * page_size), _mib(max(freed, 0)))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    with op.batch_alter_table("discord_announcements") as batch:
+        batch.drop_constraint("fk_discord_announcements_message", type_="foreignkey")
+        batch.add_column(sa.Column("content", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("translated", sa.Text(), nullable=True))
+    bind.execute(sa.text(
+        "UPDATE discord_announcements SET "
+        "content = (SELECT m.content FROM discord_messages m "
+        "WHERE m.message_id = discord_announcements.message_id), "
+        "translated = (SELECT m.translated FROM discord_messages m "
+        "WHERE m.message_id = discord_announcements.message_id)"
+    ))
+    with op.batch_alter_table("discord_announcements") as batch:
+        batch.alter_column("content", existing_type=sa.Text(), nullable=False)
+    op.drop_table("discord_messages")
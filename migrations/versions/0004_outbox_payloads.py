@@ -0,0 +1,103 @@
+"""Содержимое задания доставки хранится один раз: outbox_payloads
+
+Revision ID: 0004_outbox_payloads
+Revises: 0003_discord_messages
+Create Date: 2026-10-18 17:00:00
+
+delivery_outbox хранила готовый JSON анонса (HTML и картинки) в каждом задании —
+по копии на подписчика, и рассылка одного большого сообщения была одной большой
+транзакцией записи. JSON переносится в outbox_payloads (одна строка на
+сообщение, ключ — message_id), а задание остаётся тонкой строкой: получатель,
+статус, попытки.
+
+Как и 0003, миграция сообщает, сколько байт JSON было и стало; для SQLite —
+сколько страниц освободилось (файл уменьшится после VACUUM).
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_outbox_payloads"
+down_revision: Union[str, None] = "0003_discord_messages"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _payload_bytes(bind, table: str) -> int:
+    """Объём payload в таблице, байт."""
+    if bind.dialect.name == "sqlite":
+        size = "length(CAST(payload AS BLOB))"
+    elif bind.dialect.name == "postgresql":
+        size = "octet_length(payload)"
+    else:
+        size = "length(payload)"
+    return int(bind.execute(sa.text(f"SELECT COALESCE(SUM({size}), 0) FROM {table}")).scalar())
+
+
+def _sqlite_pages(bind):
+    """(страниц всего, свободных, размер страницы)."""
+    return (bind.execute(sa.text("PRAGMA page_count")).scalar(),
+            bind.execute(sa.text("PRAGMA freelist_count")).scalar(),
+            bind.execute(sa.text("PRAGMA page_size")).scalar())
+
+
+def _mib(size: int) -> str:
+    return "%.1f МиБ" % (size / 1024 / 1024)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == "sqlite"
+    before_bytes = _payload_bytes(bind, "delivery_outbox")
+    before_pages = _sqlite_pages(bind) if is_sqlite else None
+
+    op.create_table(
+        "outbox_payloads",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("message_id", sa.String(), nullable=False, unique=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    # Рендер один на сообщение, так что копии совпадают — берём любую
+    bind.execute(sa.text(
+        "INSERT INTO outbox_payloads (message_id, payload, created_at) "
+        "SELECT message_id, MIN(payload), MIN(created_at) "
+        "FROM delivery_outbox GROUP BY message_id"
+    ))
+
+    with op.batch_alter_table("delivery_outbox") as batch:
+        batch.drop_column("payload")
+        batch.create_foreign_key("fk_delivery_outbox_payload", "outbox_payloads",
+                                 ["message_id"], ["message_id"])
+
+    rows = bind.execute(sa.text("SELECT COUNT(*) FROM delivery_outbox")).scalar()
+    messages = bind.execute(sa.text("SELECT COUNT(*) FROM outbox_payloads")).scalar()
+    after_bytes = _payload_bytes(bind, "outbox_payloads")
+    logger.info("outbox_payloads: %s заданий → %s сообщений; payload %s → %s",
+                rows, messages, _mib(before_bytes), _mib(after_bytes))
+    if is_sqlite:
+        pages, free, page_size = _sqlite_pages(bind)
+        freed = (free - before_pages[1]) * page_size
+        logger.info("SQLite: занято %s → %s, освобождено %s (файл уменьшится после VACUUM)",
+                    _mib((before_pages[0] - before_pages[1]) * page_size),
+                    _mib((pages - free) * page_size), _mib(max(freed, 0)))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    with op.batch_alter_table("delivery_outbox") as batch:
+        batch.drop_constraint("fk_delivery_outbox_payload", type_="foreignkey")
+        batch.add_column(sa.Column("payload", sa.Text(), nullable=True))
+    bind.execute(sa.text(
+        "UPDATE delivery_outbox SET payload = (SELECT p.payload FROM outbox_payloads p "
+        "WHERE p.message_id = delivery_outbox.message_id)"
+    ))
+    with op.batch_alter_table("delivery_outbox") as batch:
+        batch.alter_column("payload", existing_type=sa.Text(), nullable=False)
+    op.drop_table("outbox_payloads")
@@ -1,7 +1,9 @@
 # models.py
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Text
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Text, UniqueConstraint, Index
+)
 from sqlalchemy.orm import relationship
 from db import Base
 
@@ -10,9 +12,10 @@ class User(Base):
     __tablename__ = 'users'
 
     id          = Column(Integer, primary_key=True)
-    telegram_id = Column(String, unique=True, nullable=False)
+    telegram_id = Column(BigInteger, unique=True, nullable=False)
     username    = Column(String, nullable=True)
     is_admin    = Column(Boolean, default=False)
+    digest_mode = Column(Boolean, default=False)   # анонсы Discord приходят дайджестом (см. digest.py)
     created_at  = Column(DateTime, default=datetime.utcnow)
 
     # Связи (relationship)
@@ -42,6 +45,9 @@ class Channel(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_archived_category", "archived", "category_id"),
+    )
 
     id          = Column(Integer, primary_key=True)
     title       = Column(String, nullable=False)
@@ -61,7 +67,7 @@ class Feedback(Base):
     __tablename__ = "feedbacks"
 
     id           = Column(Integer, primary_key=True)
-    telegram_id  = Column(Integer, nullable=False)
+    telegram_id  = Column(BigInteger, nullable=False)
     title        = Column(String, nullable=False)
     description  = Column(String, nullable=False)
     url          = Column(String, nullable=True)
@@ -72,6 +78,10 @@ class Feedback(Base):
 
 class Filter(Base):
     __tablename__ = 'filters'
+    __table_args__ = (
+        Index("ix_filters_channel_active", "channel_id", "active"),
+        Index("ix_filters_updated_at", "updated_at", "channel_id"),
+    )
 
     id         = Column(Integer, primary_key=True)
     user_id    = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -79,6 +89,7 @@ class Filter(Base):
     keyword    = Column(String, nullable=False)  # Один фильтр — одно ключевое слово
     active     = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # для индекса подписок
 
     user            = relationship("User", back_populates="filters")
     discord_channel = relationship("DiscordChannel", back_populates="filters")
@@ -86,32 +97,122 @@ class Filter(Base):
 
 class DiscordChannel(Base):
     __tablename__ = "discord_channels"
+    __table_args__ = (
+        Index("ix_discord_channels_channel_active", "channel_id", "active"),
+        Index("ix_discord_channels_updated_at", "updated_at"),
+    )
 
     id            = Column(Integer, primary_key=True)
     user_id       = Column(Integer, ForeignKey("users.id"), nullable=False)
     channel_id    = Column(String, nullable=False)   # ID Discord-канала (строка)
+    guild_id      = Column(String, nullable=True)    # ID сервера Discord (если известен)
     name          = Column(String, nullable=True)
     active        = Column(Boolean, default=True)
+    updated_at    = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # для индекса подписок
 
     user          = relationship("User", back_populates="channels")
     filters       = relationship("Filter", back_populates="discord_channel")
     announcements = relationship("DiscordAnnouncement", back_populates="discord_channel")
 
 
+class DiscordMessage(Base):
+    """
+    Сообщение Discord: текст и перевод хранятся один раз, сколько бы
+    подписчиков его ни получили (их анонсы — строки DiscordAnnouncement).
+    """
+    __tablename__ = "discord_messages"
+
+    id         = Column(Integer, primary_key=True)
+    message_id = Column(String, unique=True, nullable=False)  # ID самого сообщения в Discord
+    content    = Column(Text, nullable=False)                 # Оригинальный текст (англ. и т.д.)
+    translated = Column(Text, nullable=True)                  # Переведённый текст на русский
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    announcements = relationship("DiscordAnnouncement", back_populates="message")
+
+
 class DiscordAnnouncement(Base):
+    """Анонс пользователю: какое сообщение, по какой подписке и фильтру. Текст — в DiscordMessage."""
     __tablename__ = "discord_announcements"
+    __table_args__ = (
+        # Одно сообщение Discord — не более одного анонса на пользователя
+        UniqueConstraint("message_id", "user_id", name="uq_discord_announcements_message_user"),
+        # Последние анонсы пользователя (show_announcements)
+        Index("ix_discord_announcements_user_created", "user_id", "created_at"),
+    )
 
     id             = Column(Integer, primary_key=True)
     channel_id     = Column(Integer, ForeignKey("discord_channels.id"), nullable=False)
     user_id        = Column(Integer, ForeignKey("users.id"), nullable=False)
-    message_id     = Column(String, nullable=False)    # ID самого сообщения в Discord
-    content        = Column(Text, nullable=False)      # Оригинальный текст (англ. и т.д.)
-    translated     = Column(Text, nullable=True)       # Переведённый текст на русский
+    message_id     = Column(String, ForeignKey("discord_messages.message_id",
+                                               name="fk_discord_announcements_message"),
+                            nullable=False)            # ID самого сообщения в Discord
     created_at     = Column(DateTime, default=datetime.utcnow)
     matched_filter = Column(String, nullable=True)     # ПО какому ключу зафильтровано
 
     user            = relationship("User", back_populates="announcements")
     discord_channel = relationship("DiscordChannel", back_populates="announcements")
+    message         = relationship("DiscordMessage", back_populates="announcements")
+
+
+class OutboxPayload(Base):
+    """
+    Готовое к отправке в Telegram сообщение Discord (JSON: текст, канал, время,
+    картинки) — одно на сообщение, сколько бы заданий DeliveryOutbox на него ни ссылалось.
+    """
+    __tablename__ = "outbox_payloads"
+
+    id         = Column(Integer, primary_key=True)
+    message_id = Column(String, unique=True, nullable=False)  # ID сообщения в Discord
+    payload    = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DeliveryOutbox(Base):
+    """
+    Очередь доставки анонсов в Telegram (transactional outbox).
+    Строки пишутся в той же транзакции, что и DiscordAnnouncement, а отправляет их
+    отдельный воркер (outbox.py) с повторами, backoff и dead-letter —
+    поэтому рестарт посреди рассылки не теряет оставшихся подписчиков.
+    Задание — только получатель и статус; что отправлять, лежит в OutboxPayload.
+    """
+    __tablename__ = "delivery_outbox"
+    __table_args__ = (
+        UniqueConstraint("message_id", "user_id", name="uq_delivery_outbox_message_user"),
+        Index("ix_delivery_outbox_due", "status", "next_attempt_at"),
+    )
+
+    id              = Column(Integer, primary_key=True)
+    message_id      = Column(String, ForeignKey("outbox_payloads.message_id",
+                                                name="fk_delivery_outbox_payload"),
+                             nullable=False)                          # ID сообщения в Discord
+    user_id         = Column(Integer, ForeignKey("users.id"), nullable=False)
+    chat_id         = Column(String, nullable=False)                  # telegram_id получателя
+    guild_id        = Column(String, nullable=True)                   # сервер Discord: доставляет процесс его шарда
+    status          = Column(String, nullable=False, default="pending")  # pending / sent / dead
+    attempts        = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error      = Column(Text, nullable=True)
+    created_at      = Column(DateTime, default=datetime.utcnow)
+    sent_at         = Column(DateTime, nullable=True)
+    digest_id       = Column(Integer, nullable=True)                  # ушло в дайджесте: id первого его задания
+
+
+class TranslationCache(Base):
+    """
+    Память переводов: один и тот же текст (кросс-посты, шаблоны, рестарты бота)
+    переводится через googletrans только один раз.
+    Ключ — sha256 от целевого языка и нормализованного исходного текста.
+    """
+    __tablename__ = "translation_cache"
+
+    id          = Column(Integer, primary_key=True)
+    source_hash = Column(String(64), unique=True, nullable=False)  # sha256(язык + текст)
+    target_lang = Column(String, nullable=False)
+    translated  = Column(Text, nullable=False)
+    hits        = Column(Integer, default=0)
+    created_at  = Column(DateTime, default=datetime.utcnow)
+    last_used   = Column(DateTime, default=datetime.utcnow)               # для вытеснения по возрасту
 
 
 class AvailableDiscordChannel(Base):
@@ -123,6 +224,7 @@ class AvailableDiscordChannel(Base):
 
     id           = Column(Integer, primary_key=True, index=True)
     channel_id   = Column(String, unique=True, nullable=False)   # ID канала (строка)
+    guild_id     = Column(String, nullable=True)                 # ID сервера Discord, где находится канал
     channel_name = Column(String, nullable=False)                # название канала (например, "crypto-announcements")
     is_active    = Column(Boolean, default=True)                  # True — если канал в актуальном списке Discord
     last_seen    = Column(DateTime, default=datetime.utcnow)      # когда последний раз этот канал «видели»
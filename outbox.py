@@ -0,0 +1,384 @@
+# outbox.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import bindparam, func, or_, select, true
+from telegram.error import BadRequest, Forbidden
+
+from announcement_render import RenderedAnnouncement, load_payload
+from db import SessionLocal
+from digest import DIGEST_WINDOW_SECONDS, DIGEST_MAX_ITEMS
+from metrics import STAGE_SECONDS, TELEGRAM_SENDS, observe_delivery
+from models import DeliveryOutbox, OutboxPayload, User
+from sharding import is_sharded, owns_guild
+
+logger = logging.getLogger("discord_client.outbox")
+
+# ─── Настройки очереди доставки (.env) ────────────────────────────────────────
+OUTBOX_BATCH_SIZE     = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))       # заданий за один проход
+OUTBOX_POLL_SECONDS   = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))     # опрос, если нет сигналов от on_message
+OUTBOX_MAX_ATTEMPTS   = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))       # после стольких неудач — dead
+OUTBOX_BACKOFF_BASE   = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))     # 5, 10, 20, 40 … секунд
+OUTBOX_BACKOFF_MAX    = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+OUTBOX_DRAIN_TIMEOUT  = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "30"))   # сколько дожидаться очереди при остановке
+OUTBOX_KEEP_SENT_DAYS = int(os.getenv("OUTBOX_KEEP_SENT_DAYS", "7"))     # доставленные задания потом удаляются
+
+_PRUNE_INTERVAL = 3600  # секунд между чистками доставленных заданий
+_PAYLOAD_CACHE_SIZE = 64  # разобранные анонсы последних сообщений
+
+# digest — получатель в режиме дайджеста (users.digest_mode)
+OutboxItem = namedtuple("OutboxItem", "id message_id chat_id payload attempts digest created_at")
+
+
+# ─── Работа с таблицей (вызывается в потоке) ──────────────────────────────────
+
+def _own_jobs(db):
+    """
+    Условие «задание относится к серверам шарда этого процесса» (при нескольких
+    процессах discord_client.py каждый доставляет только своё). Серверы берутся
+    из самих ожидающих заданий — их немного, а шард считается в Python по той же
+    формуле, что и в остальных процессах. Один процесс — без ограничений.
+    """
+    if not is_sharded():
+        return true()
+    guild_ids = [
+        guild_id for (guild_id,) in
+        db.query(DeliveryOutbox.guild_id).filter(DeliveryOutbox.status == "pending").distinct()
+        if guild_id is not None and owns_guild(guild_id)
+    ]
+    clause = DeliveryOutbox.guild_id.in_(guild_ids)
+    if owns_guild(None):
+        clause = or_(clause, DeliveryOutbox.guild_id.is_(None))
+    return clause
+
+
+def _payloads(db, message_ids) -> Dict[str, str]:
+    """Содержимое сообщений одним запросом: message_id → payload (по строке на сообщение, не на задание)."""
+    message_ids = list(set(message_ids))
+    if not message_ids:
+        return {}
+    return dict(db.query(OutboxPayload.message_id, OutboxPayload.payload)
+                  .filter(OutboxPayload.message_id.in_(message_ids)))
+
+
+def fetch_due(limit: int = OUTBOX_BATCH_SIZE) -> List[OutboxItem]:
+    """Задания, которые пора отправить, в порядке постановки в очередь."""
+    db = SessionLocal()
+    try:
+        rows = db.query(DeliveryOutbox.id, DeliveryOutbox.message_id, DeliveryOutbox.chat_id,
+                        DeliveryOutbox.attempts, DeliveryOutbox.created_at, User.digest_mode)\
+                 .outerjoin(User, User.id == DeliveryOutbox.user_id)\
+                 .filter(DeliveryOutbox.status == "pending",
+                         DeliveryOutbox.next_attempt_at <= datetime.utcnow(),
+                         _own_jobs(db))\
+                 .order_by(DeliveryOutbox.id)\
+                 .limit(limit)\
+                 .all()
+        payloads = _payloads(db, (r.message_id for r in rows))
+        return [OutboxItem(r.id, r.message_id, r.chat_id, payloads.get(r.message_id), r.attempts or 0,
+                           bool(r.digest_mode), r.created_at)
+                for r in rows]
+    finally:
+        db.close()
+
+
+def fetch_digests(chat_ids: Sequence[str]) -> Dict[str, List[OutboxItem]]:
+    """Все неотправлявшиеся задания этих чатов, включая назначенные на потом, — содержимое дайджестов."""
+    db = SessionLocal()
+    try:
+        rows = db.query(DeliveryOutbox.id, DeliveryOutbox.message_id, DeliveryOutbox.chat_id,
+                        DeliveryOutbox.created_at)\
+                 .filter(DeliveryOutbox.status == "pending",
+                         DeliveryOutbox.attempts == 0,
+                         DeliveryOutbox.chat_id.in_(list(chat_ids)),
+                         _own_jobs(db))\
+                 .order_by(DeliveryOutbox.id)\
+                 .all()
+        payloads = _payloads(db, (r.message_id for r in rows))
+        digests: Dict[str, List[OutboxItem]] = {}
+        for r in rows:
+            digests.setdefault(r.chat_id, []).append(
+                OutboxItem(r.id, r.message_id, r.chat_id, payloads.get(r.message_id), 0, True, r.created_at)
+            )
+        return digests
+    finally:
+        db.close()
+
+
+def digest_backlog(chat_ids: Sequence[str]) -> Dict[str, tuple]:
+    """
+    Ещё не отправлявшиеся задания чатов в режиме дайджеста:
+    chat_id → (created_at самого раннего, количество).
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(DeliveryOutbox.chat_id, func.min(DeliveryOutbox.created_at), func.count(DeliveryOutbox.id))\
+                 .filter(DeliveryOutbox.status == "pending",
+                         DeliveryOutbox.attempts == 0,
+                         DeliveryOutbox.chat_id.in_(list(chat_ids)),
+                         _own_jobs(db))\
+                 .group_by(DeliveryOutbox.chat_id)
+        return {chat_id: (first, count) for chat_id, first, count in rows}
+    finally:
+        db.close()
+
+
+def schedule_digests(due: Dict[str, datetime]):
+    """Назначает всем неотправленным заданиям чата общий срок — они уйдут одним дайджестом."""
+    table = DeliveryOutbox.__table__
+    db = SessionLocal()
+    try:
+        stmt = table.update()\
+                    .where(table.c.status == "pending", table.c.attempts == 0,
+                           table.c.chat_id == bindparam("b_chat_id"), _own_jobs(db))\
+                    .values(next_attempt_at=bindparam("b_due"))
+        db.execute(stmt, [{"b_chat_id": chat_id, "b_due": when} for chat_id, when in due.items()])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def mark_results(sent_ids: List[int], failures: List[tuple], digest_ids: Optional[Dict[int, int]] = None):
+    """
+    Фиксирует итог прохода одной транзакцией.
+    failures — список (OutboxItem, текст ошибки, permanent);
+    digest_ids — для заданий, ушедших дайджестом: id задания → id дайджеста.
+    """
+    if not sent_ids and not failures:
+        return
+    now = datetime.utcnow()
+    digest_ids = digest_ids or {}
+    updates = []
+    for item_id in sent_ids:
+        update = {"id": item_id, "status": "sent", "sent_at": now, "last_error": None}
+        if item_id in digest_ids:
+            update["digest_id"] = digest_ids[item_id]
+        updates.append(update)
+    for item, error, permanent in failures:
+        attempts = item.attempts + 1
+        if permanent or attempts >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"[Outbox] Задание {item.id} (чат {item.chat_id}, message_id={item.message_id}) "
+                         f"перенесено в dead-letter после {attempts} попыток: {error}")
+            updates.append({"id": item.id, "status": "dead", "attempts": attempts, "last_error": error})
+        else:
+            delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** item.attempts)
+            updates.append({"id": item.id, "attempts": attempts, "last_error": error,
+                            "next_attempt_at": now + timedelta(seconds=delay)})
+
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(DeliveryOutbox, updates)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def prune_sent():
+    """
+    Удаляет доставленные задания старше OUTBOX_KEEP_SENT_DAYS (dead-letter остаются)
+    и содержимое сообщений, на которое больше не ссылается ни одно задание.
+    """
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=OUTBOX_KEEP_SENT_DAYS)
+        deleted = db.query(DeliveryOutbox)\
+                    .filter(DeliveryOutbox.status == "sent", DeliveryOutbox.sent_at < cutoff)\
+                    .delete(synchronize_session=False)
+        if deleted:
+            db.query(OutboxPayload)\
+              .filter(~OutboxPayload.message_id.in_(select(DeliveryOutbox.message_id)))\
+              .delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            logger.info(f"[Outbox] Удалено доставленных заданий: {deleted}.")
+    except Exception as e:
+        logger.warning(f"[Outbox] Ошибка очистки очереди: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+# ─── Воркер доставки ──────────────────────────────────────────────────────────
+
+class OutboxWorker:
+    """
+    Фоновая задача Discord-процесса, разбирающая delivery_outbox.
+
+    on_message только ставит задания и вызывает notify(), поэтому скорость приёма
+    сообщений не зависит от скорости Telegram. Доставка «хотя бы один раз»:
+    если процесс упал между отправкой и отметкой, задание уйдёт повторно.
+
+    Получателям в режиме дайджеста задания не шлются сразу: всем неотправленным
+    заданиям чата назначается общий срок — DIGEST_WINDOW_SECONDS от самого раннего
+    (или сейчас, если набралось DIGEST_MAX_ITEMS), и в срок они уходят одним
+    сообщением через send_digest. Повторы после ошибки идут обычными сообщениями.
+    """
+
+    def __init__(self, delivery, send: Callable[[str, RenderedAnnouncement], Awaitable],
+                 send_digest: Optional[Callable[[str, List[RenderedAnnouncement], int], Awaitable]] = None):
+        self.delivery = delivery      # TelegramDelivery: лимиты и параллельная рассылка
+        self.send = send              # send(chat_id, rendered) — бросает TelegramError при неудаче
+        self.send_digest = send_digest  # send_digest(chat_id, [rendered...], digest_id) — то же для дайджеста
+        # Рассылка одного сообщения растягивается на несколько проходов — payload разбираем один раз
+        self._payloads: "OrderedDict[str, RenderedAnnouncement]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._last_prune = 0.0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def notify(self):
+        """Сигнал от on_message: в очереди появились новые задания."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = OUTBOX_DRAIN_TIMEOUT):
+        """Дорабатывает уже пришедшие задания (не дольше timeout) и останавливает воркер."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[Outbox] Очередь не разобрана за {timeout} с — остаток уйдёт после рестарта.")
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Outbox] Ошибка обработки очереди: {e}", exc_info=True)
+                processed = 0
+
+            if processed:
+                continue                # возможно, в очереди есть ещё
+            if self._stopping:
+                return                  # всё, что было к моменту остановки, разобрано
+
+            if time.monotonic() - self._last_prune > _PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                await asyncio.to_thread(prune_sent)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _rendered(self, item: OutboxItem) -> RenderedAnnouncement:
+        rendered = self._payloads.get(item.message_id)
+        if rendered is None:
+            rendered = self._payloads[item.message_id] = load_payload(item.payload)
+            while len(self._payloads) > _PAYLOAD_CACHE_SIZE:
+                self._payloads.popitem(last=False)
+        else:
+            self._payloads.move_to_end(item.message_id)
+        return rendered
+
+    async def _plan(self, items: List[OutboxItem]) -> List[tuple]:
+        """
+        Делит задания на отправки: обычное задание — отдельное сообщение, все
+        неотправленные задания чата в режиме дайджеста — одно сообщение, если
+        их срок настал. Остальным дайджестам назначается срок, в этот проход
+        они не отправляются.
+        """
+        units: List[tuple] = []
+        groups: "OrderedDict[str, List[OutboxItem]]" = OrderedDict()
+        for item in items:
+            if item.digest and item.attempts == 0 and self.send_digest is not None:
+                groups.setdefault(item.chat_id, []).append(item)
+            else:
+                units.append((item,))
+        if not groups:
+            return units
+
+        backlog = await asyncio.to_thread(digest_backlog, list(groups))
+        now = datetime.utcnow()
+        due: Dict[str, datetime] = {}
+        ready: List[str] = []
+        for chat_id, group in groups.items():
+            first, count = backlog.get(chat_id, (None, len(group)))
+            deadline = (first or now) + timedelta(seconds=DIGEST_WINDOW_SECONDS)
+            if deadline > now and count < DIGEST_MAX_ITEMS:
+                due[chat_id] = deadline
+            else:
+                ready.append(chat_id)
+
+        if due:
+            await asyncio.to_thread(schedule_digests, due)
+        if ready:
+            # В выборку прохода попала лишь часть заданий чата — берём их все
+            digests = await asyncio.to_thread(fetch_digests, ready)
+            units.extend(tuple(digests[chat_id]) for chat_id in ready if chat_id in digests)
+        return units
+
+    async def drain_once(self) -> int:
+        """Один проход: выбрать задания, разослать параллельно, отметить итог."""
+        items = await asyncio.to_thread(fetch_due, OUTBOX_BATCH_SIZE)
+        if not items:
+            return 0
+        units = await self._plan(items)
+
+        sent_ids: List[int] = []
+        failures: List[tuple] = []
+        digest_ids: Dict[int, int] = {}
+
+        async def send_one(unit: tuple) -> bool:
+            chat_id = unit[0].chat_id
+            try:
+                rendered = [self._rendered(item) for item in unit]
+                with STAGE_SECONDS.time("send"):
+                    if len(unit) == 1:
+                        await self.send(chat_id, rendered[0])
+                    else:
+                        await self.send_digest(chat_id, rendered, unit[0].id)
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован / чат не найден — повторять бессмысленно
+                TELEGRAM_SENDS.inc("rejected")
+                failures.extend((item, str(e), True) for item in unit)
+                return False
+            except Exception as e:
+                TELEGRAM_SENDS.inc("failed")
+                failures.extend((item, str(e), False) for item in unit)
+                return False
+            TELEGRAM_SENDS.inc("ok")
+            for item in rendered:
+                observe_delivery(item.posted_at)
+            sent_ids.extend(item.id for item in unit)
+            if len(unit) > 1:
+                digest_ids.update((item.id, unit[0].id) for item in unit)
+            return True
+
+        try:
+            report = await self.delivery.fan_out(units, send_one)
+        except asyncio.CancelledError:
+            # Остановка по таймауту: фиксируем хотя бы то, что уже доставлено
+            mark_results(sent_ids, failures, digest_ids)
+            raise
+        await asyncio.to_thread(mark_results, sent_ids, failures, digest_ids)
+
+        if units:
+            logger.info(f"[Outbox] Доставлено {report.sent}/{report.total} за {report.elapsed:.2f} с "
+                        f"(p50 {report.p50:.2f} с, p95 {report.p95:.2f} с, дайджестов {len(set(digest_ids.values()))})")
+        return len(items)
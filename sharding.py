@@ -0,0 +1,35 @@
+# sharding.py
+
+from typing import Optional, Union
+
+from config import DISCORD_GUILD_IDS, DISCORD_SHARD_COUNT, DISCORD_SHARD_INDEX
+
+
+def guild_shard(guild_id: Union[int, str], shard_count: int = DISCORD_SHARD_COUNT) -> int:
+    """
+    Номер шарда сервера — та же формула, по которой Discord раздаёт серверы
+    по шардам шлюза: (guild_id >> 22) % shard_count. Зависит только от ID
+    сервера и числа шардов, поэтому все процессы считают её одинаково.
+    """
+    return (int(guild_id) >> 22) % shard_count
+
+
+def is_sharded() -> bool:
+    return DISCORD_SHARD_COUNT > 1
+
+
+def owns_guild(guild_id: Optional[Union[int, str]]) -> bool:
+    """
+    Сервер относится к шарду этого процесса. Строки без guild_id (записаны
+    до поддержки нескольких серверов) обслуживает шард 0.
+    """
+    if guild_id is None:
+        return DISCORD_SHARD_INDEX == 0
+    return guild_shard(guild_id) == DISCORD_SHARD_INDEX
+
+
+def follows_guild(guild_id: Union[int, str]) -> bool:
+    """Сервер в списке DISCORD_GUILD_IDS (если он задан) и относится к шарду этого процесса."""
+    if DISCORD_GUILD_IDS and int(guild_id) not in DISCORD_GUILD_IDS:
+        return False
+    return owns_guild(guild_id)
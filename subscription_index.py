@@ -0,0 +1,189 @@
+# subscription_index.py
+
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from db import SessionLocal
+from filter_engine import FilterEngine
+from models import User, DiscordChannel, Filter
+
+logger = logging.getLogger("discord_client.subscriptions")
+
+# Одна активная подписка на Discord-канал.
+# filters — кортеж (filter_id, keyword) активных фильтров этой подписки.
+Subscriber = namedtuple("Subscriber", "subscription_id user_id telegram_id filters")
+
+# Запас на «поздние» коммиты: транзакция могла проставить updated_at раньше,
+# чем закоммитилась. Повторное применение тех же строк безопасно.
+_WATERMARK_SKEW = timedelta(seconds=5)
+
+
+class SubscriptionIndex:
+    """
+    Индекс подписок в памяти Discord-процесса: channel_id → подписчики.
+
+    on_message обращается только к get(): сообщение из канала без подписчиков
+    стоит один поиск в словаре и ни одного SQL-запроса. Изменения подписок
+    (их делают bot.py и admin.py в других процессах) подтягиваются refresh()
+    по колонкам updated_at у discord_channels и filters.
+
+    fetch_*() выполняют SQL и вызываются в потоке (asyncio.to_thread),
+    apply() меняет словари и вызывается в event loop.
+    """
+
+    def __init__(self):
+        self._by_channel: Dict[str, Tuple[Subscriber, ...]] = {}
+        self._subscriptions: Dict[int, Subscriber] = {}  # subscription_id → Subscriber
+        self._channel_of: Dict[int, str] = {}            # subscription_id → channel_id
+        self._members: Dict[str, Set[int]] = {}          # channel_id → subscription_id
+        self._watermark: Optional[datetime] = None
+        # Фильтры по ключевым словам: автомат на канал, пересобирается при изменении канала
+        self.filters = FilterEngine()
+
+    # ─── Чтение (горячий путь) ───────────────────────────────────────────────
+
+    def get(self, channel_id: str) -> Tuple[Subscriber, ...]:
+        return self._by_channel.get(channel_id, ())
+
+    def channels(self) -> Tuple[str, ...]:
+        """Discord-каналы, у которых есть хотя бы один подписчик."""
+        return tuple(self._by_channel)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    # ─── Загрузка из БД (в потоке) ───────────────────────────────────────────
+
+    def fetch_all(self) -> dict:
+        """Полная выборка активных подписок и фильтров."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            rows = db.query(DiscordChannel.id, DiscordChannel.channel_id, DiscordChannel.user_id,
+                            DiscordChannel.active, User.telegram_id)\
+                     .join(User, User.id == DiscordChannel.user_id)\
+                     .filter(DiscordChannel.active == True)\
+                     .all()
+            filters_ = db.query(Filter.id, Filter.channel_id, Filter.keyword)\
+                         .filter(Filter.active == True)\
+                         .all()
+            return {"full": True, "subscriptions": rows, "filters": filters_, "fetched_at": now}
+        finally:
+            db.close()
+
+    def fetch_changes(self) -> dict:
+        """
+        Выборка подписок и фильтров, изменённых после последнего применения.
+        Для затронутых подписок заново читаются все их активные фильтры.
+        """
+        if self._watermark is None:
+            return self.fetch_all()
+
+        since = self._watermark - _WATERMARK_SKEW
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            rows = db.query(DiscordChannel.id, DiscordChannel.channel_id, DiscordChannel.user_id,
+                            DiscordChannel.active, User.telegram_id)\
+                     .join(User, User.id == DiscordChannel.user_id)\
+                     .filter(DiscordChannel.updated_at >= since)\
+                     .all()
+
+            touched = {r.id for r in rows}
+            # Без DISTINCT: дубли схлопывает set, а запрос читает только индекс ix_filters_updated_at
+            touched.update(
+                sub_id for (sub_id,) in db.query(Filter.channel_id)
+                                          .filter(Filter.updated_at >= since)
+            )
+            filters_ = []
+            if touched:
+                filters_ = db.query(Filter.id, Filter.channel_id, Filter.keyword)\
+                             .filter(Filter.channel_id.in_(touched), Filter.active == True)\
+                             .all()
+            return {"full": False, "subscriptions": rows, "filters": filters_,
+                    "touched": touched, "fetched_at": now}
+        finally:
+            db.close()
+
+    # ─── Применение (в event loop) ───────────────────────────────────────────
+
+    def apply(self, data: dict) -> int:
+        """Применяет результат fetch_*(); возвращает число изменённых подписок."""
+        filters_by_sub: Dict[int, list] = {}
+        for f in data["filters"]:
+            filters_by_sub.setdefault(f.channel_id, []).append((f.id, f.keyword))
+
+        if data["full"]:
+            self._subscriptions.clear()
+            self._channel_of.clear()
+            self._members.clear()
+            touched = {r.id for r in data["subscriptions"]}
+        else:
+            touched = set(data["touched"])
+
+        dirty_channels = set()
+        sub_rows = {r.id: r for r in data["subscriptions"]}
+        for sub_id in touched:
+            row = sub_rows.get(sub_id)
+            old_channel = self._channel_of.get(sub_id)
+
+            if row is None:
+                # Изменились только фильтры — обновляем их у известной подписки
+                known = self._subscriptions.get(sub_id)
+                if known is not None:
+                    self._subscriptions[sub_id] = known._replace(
+                        filters=tuple(filters_by_sub.get(sub_id, ()))
+                    )
+                    dirty_channels.add(old_channel)
+                continue
+
+            if old_channel is not None:
+                self._members[old_channel].discard(sub_id)
+                dirty_channels.add(old_channel)
+
+            if not row.active:
+                # Подписку отключили — убираем из индекса
+                self._subscriptions.pop(sub_id, None)
+                self._channel_of.pop(sub_id, None)
+                continue
+
+            self._subscriptions[sub_id] = Subscriber(
+                subscription_id=row.id,
+                user_id=row.user_id,
+                telegram_id=row.telegram_id,
+                filters=tuple(filters_by_sub.get(sub_id, ())),
+            )
+            self._channel_of[sub_id] = row.channel_id
+            self._members.setdefault(row.channel_id, set()).add(sub_id)
+            dirty_channels.add(row.channel_id)
+
+        if data["full"]:
+            self._by_channel = {}
+            self.filters.clear()
+
+        # Пересобираем кортежи только у затронутых каналов
+        for channel_id in dirty_channels:
+            members = self._members.get(channel_id)
+            if members:
+                self._by_channel[channel_id] = tuple(
+                    self._subscriptions[sid] for sid in sorted(members)
+                )
+            else:
+                self._members.pop(channel_id, None)
+                self._by_channel.pop(channel_id, None)
+                self.filters.discard(channel_id)
+
+        self._watermark = data["fetched_at"]
+        return len(touched)
+
+    # ─── Синхронные обёртки ──────────────────────────────────────────────────
+
+    def load(self):
+        self.apply(self.fetch_all())
+        logger.info(f"[Subscriptions] Загружено подписок: {len(self)}, "
+                    f"каналов: {len(self._by_channel)}.")
+
+    def refresh(self) -> int:
+        return self.apply(self.fetch_changes())
@@ -0,0 +1,249 @@
+# telegram_delivery.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, namedtuple
+from typing import Awaitable, Callable, Iterable, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError
+from telegram.request import HTTPXRequest
+
+from config import DISCORD_SHARD_COUNT
+
+logger = logging.getLogger("discord_client.delivery")
+
+# ─── Настройки HTTP-клиента Telegram (.env) ───────────────────────────────────
+TELEGRAM_POOL_SIZE       = int(os.getenv("TELEGRAM_POOL_SIZE", "16"))         # keep-alive соединений
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT    = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+TELEGRAM_WRITE_TIMEOUT   = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "20"))   # загрузка медиа
+TELEGRAM_POOL_TIMEOUT    = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "10"))    # ожидание свободного соединения
+
+# ─── Лимиты рассылки (.env) ───────────────────────────────────────────────────
+# Telegram допускает ~30 сообщений/с на бота и ~1 сообщение/с в один чат.
+# Шарды (DISCORD_SHARD_COUNT процессов) шлют от одного бота, а бюджет у каждого
+# свой — по умолчанию общий бюджет делится между ними поровну.
+TELEGRAM_GLOBAL_RATE        = float(os.getenv("TELEGRAM_GLOBAL_RATE") or 25 / DISCORD_SHARD_COUNT)  # сообщений/с на процесс
+TELEGRAM_GLOBAL_BURST       = float(os.getenv("TELEGRAM_GLOBAL_BURST") or 25 / DISCORD_SHARD_COUNT)
+TELEGRAM_CHAT_RATE          = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))      # сообщений/с в один чат
+TELEGRAM_CHAT_BURST         = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_FANOUT_CONCURRENCY = int(os.getenv("TELEGRAM_FANOUT_CONCURRENCY", "20"))  # подписчиков одновременно
+TELEGRAM_MAX_RETRIES        = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+_MAX_CHAT_BUCKETS = 10000  # бакеты давно молчавших чатов вытесняются
+
+# Итог рассылки одного анонса; p50/p95 — время от начала рассылки до доставки подписчику
+FanoutReport = namedtuple("FanoutReport", "total sent failed elapsed p50 p95")
+
+
+class TokenBucket:
+    """
+    Token bucket для asyncio: rate токенов в секунду, не больше capacity в запасе.
+    Ожидающие обслуживаются по очереди (asyncio.Lock — FIFO).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None  # создаётся лениво внутри event loop
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, cost: float = 1.0):
+        cost = min(cost, self.capacity)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((cost - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд (ответ RetryAfter от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    @property
+    def idle(self) -> bool:
+        return self._lock is None or not self._lock.locked()
+
+
+def _retry_after_seconds(err: RetryAfter) -> float:
+    value = err.retry_after
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TelegramDelivery:
+    """
+    Долгоживущий клиент доставки в Telegram для Discord-процесса.
+
+    Создаётся один раз при старте DiscordAnnounceClient: один telegram.Bot поверх
+    пула keep-alive соединений httpx, поэтому каждая отправка не платит за новый
+    HTTP-клиент и TLS-рукопожатие. Закрывается вместе с Discord-клиентом.
+    """
+
+    def __init__(self, token: str, base_url: Optional[str] = None):
+        self._request = HTTPXRequest(
+            connection_pool_size=TELEGRAM_POOL_SIZE,
+            connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+            read_timeout=TELEGRAM_READ_TIMEOUT,
+            write_timeout=TELEGRAM_WRITE_TIMEOUT,
+            pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        )
+        kwargs = {"base_url": base_url} if base_url else {}
+        self.bot = Bot(token=token, request=self._request, **kwargs)
+        self._started = False
+
+        # Планировщик: общий бюджет бота + отдельный бюджет на каждый чат
+        self._global = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST)
+        self._chats: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        try:
+            # initialize() проверяет токен через getMe и заодно прогревает соединение
+            await self.bot.initialize()
+            logger.info(f"[Telegram] Клиент доставки запущен (пул соединений: {TELEGRAM_POOL_SIZE}).")
+        except Exception as e:
+            logger.error(f"[Telegram] Не удалось проверить токен при старте: {e}", exc_info=True)
+
+    async def close(self):
+        if self._started:
+            self._started = False
+            await self.bot.shutdown()
+            # Если initialize() не удался, Bot.shutdown() ничего не закрывает — закрываем пул сами
+            await self._request.shutdown()
+            logger.info("[Telegram] Клиент доставки остановлен.")
+
+    # ─── Ограничение скорости ────────────────────────────────────────────────
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            bucket = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            self._chats[key] = bucket
+            while len(self._chats) > _MAX_CHAT_BUCKETS:
+                oldest = next(iter(self._chats.values()))
+                if not oldest.idle:
+                    break
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(key)
+        return bucket
+
+    def _on_success(self):
+        # Аддитивное восстановление общего темпа после RetryAfter
+        if self._global.rate < TELEGRAM_GLOBAL_RATE:
+            self._global.rate = min(TELEGRAM_GLOBAL_RATE, self._global.rate + TELEGRAM_GLOBAL_RATE * 0.01)
+
+    def _on_retry_after(self, chat_bucket: TokenBucket, seconds: float):
+        # Мультипликативное снижение общего темпа + пауза для конкретного чата
+        chat_bucket.pause(seconds)
+        self._global.rate = max(1.0, self._global.rate * 0.5)
+        logger.warning(f"[Telegram] RetryAfter {seconds:.0f} с, общий темп снижен до "
+                       f"{self._global.rate:.1f} сообщ./с.")
+
+    async def call(self, chat_id, request: Callable[[], Awaitable], cost: float = 1.0):
+        """
+        Выполняет один запрос к Bot API в чат chat_id с учётом лимитов:
+        токен из бюджета чата, затем из общего бюджета. На RetryAfter ждём
+        указанное Telegram время и повторяем; на сетевые ошибки — короткий повтор.
+        BadRequest (в PTB — подкласс NetworkError) и остальные TelegramError
+        постоянны и сразу пробрасываются вызывающему.
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+            await chat_bucket.acquire(cost)
+            await self._global.acquire(cost)
+            try:
+                result = await request()
+                self._on_success()
+                return result
+            except RetryAfter as e:
+                if attempt >= TELEGRAM_MAX_RETRIES:
+                    raise
+                self._on_retry_after(chat_bucket, _retry_after_seconds(e))
+            except BadRequest:
+                raise
+            except (TimedOut, NetworkError):
+                if attempt >= TELEGRAM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def send_message(self, chat_id, **kwargs):
+        return await self.call(chat_id, lambda: self.bot.send_message(chat_id=chat_id, **kwargs))
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self.call(chat_id, lambda: self.bot.send_photo(chat_id=chat_id, photo=photo, **kwargs))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        # Альбом Telegram учитывает как несколько сообщений
+        return await self.call(
+            chat_id,
+            lambda: self.bot.send_media_group(chat_id=chat_id, media=media, **kwargs),
+            cost=len(media),
+        )
+
+    # ─── Рассылка ────────────────────────────────────────────────────────────
+
+    async def fan_out(self, targets: Iterable, send_one: Callable[..., Awaitable]) -> FanoutReport:
+        """
+        Рассылает по набору получателей параллельно (не больше TELEGRAM_FANOUT_CONCURRENCY
+        одновременно); темп ограничивают бюджеты в call().
+        targets — chat_id или задания очереди; send_one(target) возвращает False
+        или бросает исключение при неудаче.
+        """
+        targets = list(targets)
+        semaphore = asyncio.Semaphore(TELEGRAM_FANOUT_CONCURRENCY)
+        started = time.monotonic()
+        latencies = []
+        failed = 0
+
+        async def one(target):
+            nonlocal failed
+            async with semaphore:
+                try:
+                    ok = await send_one(target)
+                except Exception as e:
+                    logger.error(f"[Telegram] Не удалось доставить ({target}): {e}")
+                    ok = False
+                if ok is False:
+                    failed += 1
+                else:
+                    latencies.append(time.monotonic() - started)
+
+        await asyncio.gather(*(one(t) for t in targets))
+        return FanoutReport(
+            total=len(targets),
+            sent=len(latencies),
+            failed=failed,
+            elapsed=time.monotonic() - started,
+            p50=_percentile(latencies, 0.5),
+            p95=_percentile(latencies, 0.95),
+        )
@@ -0,0 +1,160 @@
+# traffic_record.py
+
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger("discord_client.record")
+
+# ─── Настройки записи трафика (.env) ──────────────────────────────────────────
+DISCORD_RECORD_PATH = os.getenv("DISCORD_RECORD_PATH", "")    # файл .jsonl.gz; пусто — запись выключена
+DISCORD_RECORD_SALT = os.getenv("DISCORD_RECORD_SALT", "")    # соль псевдонимов; пусто — новая на каждый запуск
+
+USER_MENTION_RE = re.compile(r"<@!?(\d+)>")
+
+# Файл сбрасывается на диск раз в столько записей или секунд — что наступит раньше
+_FLUSH_EVERY = 100
+_FLUSH_INTERVAL = 5.0
+
+
+def _strip_query(url: Optional[str]) -> Optional[str]:
+    """Ссылки CDN Discord подписаны (?ex=…&is=…&hm=…) — подпись в запись не попадает."""
+    if not url:
+        return url
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+class TrafficRecorder:
+    """
+    Пишет входящие сообщения Discord в сжатый JSONL (одна строка — одно сообщение)
+    для последующего прогона через benchmarks.replay.
+
+    Сохраняется всё, что читает конвейер: текст, эмбеды, вложения, упоминания,
+    сервер и канал. Обезличивание:
+    * автор сообщения не записывается;
+    * ID упомянутых участников заменяются псевдонимами (одинаковыми в пределах
+      соли), имена — на «user-<псевдоним>»; упоминания каналов и ролей остаются;
+    * из ссылок на вложения и картинки убирается подпись CDN.
+
+    record() только складывает сообщение в очередь: кодирование, сжатие и запись
+    делает фоновый поток, так что on_message не ждёт диска. Файл открывается на
+    дозапись и сбрасывается (gzip sync flush) раз в _FLUSH_EVERY записей или
+    _FLUSH_INTERVAL секунд — после аварийной остановки теряется не больше этого.
+    """
+
+    def __init__(self, path: str, salt: str = DISCORD_RECORD_SALT):
+        self.path = path
+        self._salt = (salt or os.urandom(8).hex()).encode()
+        self._file = gzip.open(path, "ab")
+        self._queue = queue.Queue()
+        self.recorded = 0
+        self._writer = threading.Thread(target=self._write_loop, name="traffic-record", daemon=True)
+        self._writer.start()
+        logger.info(f"[Record] Запись входящих сообщений в {path}")
+
+    def _pseudonym(self, user_id) -> str:
+        digest = hashlib.sha256(self._salt + str(user_id).encode()).digest()
+        return str(int.from_bytes(digest[:7], "big"))
+
+    def _sanitize_text(self, text: str) -> str:
+        return USER_MENTION_RE.sub(lambda m: f"<@{self._pseudonym(m.group(1))}>", text or "")
+
+    def to_record(self, message) -> dict:
+        mentions = []
+        for member in message.mentions:
+            alias = self._pseudonym(member.id)
+            mentions.append({"id": alias, "name": f"user-{alias[-4:]}"})
+        return {
+            "received": time.time(),
+            "id": str(message.id),
+            "created_at": message.created_at.isoformat(),
+            "guild_id": str(message.guild.id),
+            "channel_id": str(message.channel.id),
+            "channel_name": message.channel.name,
+            "webhook": message.webhook_id is not None,
+            "content": self._sanitize_text(message.content),
+            "embeds": [
+                {
+                    "title": self._sanitize_text(emb.title) if emb.title else None,
+                    "description": self._sanitize_text(emb.description) if emb.description else None,
+                    "image_url": _strip_query(emb.image.url) if emb.image and emb.image.url else None,
+                }
+                for emb in message.embeds
+            ],
+            "attachments": [
+                {"id": str(a.id), "filename": a.filename, "url": _strip_query(a.url)}
+                for a in message.attachments
+            ],
+            "mentions": mentions,
+        }
+
+    def record(self, message):
+        """Ставит сообщение в очередь записи. Ошибки только логируются — конвейер не прерывается."""
+        try:
+            self._queue.put(self.to_record(message))
+        except Exception as e:
+            logger.error(f"[Record] Не удалось записать сообщение {getattr(message, 'id', '?')}: {e}")
+
+    def _write_loop(self):
+        """Фоновый поток: пишет записи из очереди, None — конец работы."""
+        unflushed = 0
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=_FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if item:
+                try:
+                    line = json.dumps(item, ensure_ascii=False) + "\n"
+                    self._file.write(line.encode("utf-8"))
+                    self.recorded += 1
+                    unflushed += 1
+                except Exception as e:
+                    logger.error(f"[Record] Не удалось записать сообщение {item.get('id', '?')}: {e}")
+            if unflushed and (unflushed >= _FLUSH_EVERY or time.monotonic() - last_flush >= _FLUSH_INTERVAL):
+                try:
+                    self._file.flush()
+                except Exception as e:
+                    logger.error(f"[Record] Не удалось сбросить {self.path} на диск: {e}")
+                unflushed = 0
+                last_flush = time.monotonic()
+
+    def close(self):
+        """Дописывает очередь и закрывает файл."""
+        if self._file.closed:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+        logger.info(f"[Record] Записано сообщений: {self.recorded} ({self.path})")
+
+
+def read_recording(path: str) -> Iterator[dict]:
+    """
+    Сообщения из файла записи по порядку. Оборванный хвост (процесс остановлен
+    посреди записи) пропускается.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except EOFError:
+            return
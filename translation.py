@@ -0,0 +1,317 @@
+# translation.py
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal
+from models import TranslationCache
+from metrics import TRANSLATION_CACHE, TRANSLATOR_CALLS, TRANSLATOR_SECONDS
+
+# Дочерний логгер discord_client — сообщения попадают в его handler
+logger = logging.getLogger("discord_client.translation")
+
+# ─── Настройки перевода (.env) ────────────────────────────────────────────────
+TRANSLATE_DEST        = os.getenv("TRANSLATE_DEST", "ru")
+TRANSLATE_CONCURRENCY = max(1, int(os.getenv("TRANSLATE_CONCURRENCY", "4")))  # одновременных запросов
+TRANSLATE_TIMEOUT     = float(os.getenv("TRANSLATE_TIMEOUT", "15"))            # секунд на один перевод
+
+# ─── Память переводов ─────────────────────────────────────────────────────────
+TRANSLATION_LRU_SIZE          = int(os.getenv("TRANSLATION_LRU_SIZE", "1024"))       # записей в памяти процесса
+TRANSLATION_CACHE_MAX_ROWS    = int(os.getenv("TRANSLATION_CACHE_MAX_ROWS", "50000"))  # строк в БД
+TRANSLATION_CACHE_MAX_AGE_DAYS = int(os.getenv("TRANSLATION_CACHE_MAX_AGE_DAYS", "90"))
+_PRUNE_EVERY = 200  # чистим таблицу раз в N новых записей
+_HITS_FLUSH_EVERY = 100  # попадания в БД (hits, last_used) пишем пачкой раз в N
+
+try:
+    from googletrans import Translator
+except ImportError:
+    # Если googletrans не установлен, просто возвращаем оригинал
+    Translator = None
+
+
+# googletrans.Translator держит внутри один httpx-клиент и не потокобезопасен,
+# поэтому у каждого потока пула свой экземпляр.
+_local = threading.local()
+
+_executor = ThreadPoolExecutor(max_workers=TRANSLATE_CONCURRENCY, thread_name_prefix="translate")
+
+# Семафор создаётся лениво: в Python 3.9 asyncio-примитивы привязываются к циклу при создании
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# Горячий LRU перед таблицей translation_cache: source_hash → перевод
+_lru: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+_stores_since_prune = 0
+
+# Попадания в translation_cache, ещё не записанные в таблицу: source_hash → число.
+# Чтение из памяти переводов остаётся чтением, счётчик hits и last_used
+# обновляются одной транзакцией раз в _HITS_FLUSH_EVERY попаданий
+_pending_hits: Dict[str, int] = {}
+
+
+def _get_translator():
+    translator = getattr(_local, "translator", None)
+    if translator is None:
+        translator = Translator()
+        _local.translator = translator
+    return translator
+
+
+def normalize_source(text: str) -> str:
+    """
+    Нормализация исходного текста перед хэшированием и переводом:
+    NFC, единые переводы строк, без хвостовых пробелов и лишних пустых строк.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def source_hash(normalized: str, dest: str) -> str:
+    return hashlib.sha256(f"{dest}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def _lru_get(key: str) -> Optional[str]:
+    with _lock:
+        value = _lru.get(key)
+        if value is not None:
+            _lru.move_to_end(key)
+    if value is not None:
+        TRANSLATION_CACHE.inc("lru")
+    return value
+
+
+def _lru_put(key: str, value: str):
+    with _lock:
+        _lru[key] = value
+        _lru.move_to_end(key)
+        while len(_lru) > TRANSLATION_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _db_get(key: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        translated = db.query(TranslationCache.translated).filter_by(source_hash=key).scalar()
+    except Exception as e:
+        logger.warning(f"Память переводов недоступна (чтение): {e}")
+        return None
+    finally:
+        db.close()
+    if translated is None:
+        return None
+
+    with _lock:
+        _pending_hits[key] = _pending_hits.get(key, 0) + 1
+        need_flush = sum(_pending_hits.values()) >= _HITS_FLUSH_EVERY
+    if need_flush:
+        flush_translation_hits()
+    return translated
+
+
+def flush_translation_hits():
+    """Записывает накопленные попадания (hits, last_used) одной транзакцией."""
+    with _lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+    if not pending:
+        return
+    table = TranslationCache.__table__
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        stmt = table.update()\
+                    .where(table.c.source_hash == bindparam("b_key"))\
+                    .values(hits=func.coalesce(table.c.hits, 0) + bindparam("b_hits"), last_used=now)
+        db.execute(stmt, [{"b_key": key, "b_hits": hits} for key, hits in pending.items()])
+        db.commit()
+    except Exception as e:
+        # Статистика использования не критична — при ошибке просто теряем пачку
+        logger.warning(f"Память переводов недоступна (учёт попаданий): {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _db_put(key: str, dest: str, translated: str):
+    global _stores_since_prune
+    db = SessionLocal()
+    try:
+        db.add(TranslationCache(source_hash=key, target_lang=dest, translated=translated))
+        db.commit()
+    except IntegrityError:
+        # Тот же текст параллельно перевёл соседний поток — запись уже есть
+        db.rollback()
+    except Exception as e:
+        logger.warning(f"Память переводов недоступна (запись): {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    with _lock:
+        _stores_since_prune += 1
+        need_prune = _stores_since_prune >= _PRUNE_EVERY
+        if need_prune:
+            _stores_since_prune = 0
+    if need_prune:
+        prune_translation_cache()
+
+
+def prune_translation_cache():
+    """
+    Вытеснение из translation_cache: удаляем записи, не использовавшиеся дольше
+    TRANSLATION_CACHE_MAX_AGE_DAYS, и самые старые сверх TRANSLATION_CACHE_MAX_ROWS.
+    """
+    flush_translation_hits()  # иначе недавно использованные записи выглядят устаревшими
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=TRANSLATION_CACHE_MAX_AGE_DAYS)
+        expired = db.query(TranslationCache)\
+                    .filter(TranslationCache.last_used < cutoff)\
+                    .delete(synchronize_session=False)
+
+        overflow = 0
+        total = db.query(TranslationCache).count()
+        if total > TRANSLATION_CACHE_MAX_ROWS:
+            keep_from = db.query(TranslationCache.last_used)\
+                          .order_by(TranslationCache.last_used.desc())\
+                          .offset(max(TRANSLATION_CACHE_MAX_ROWS - 1, 0))\
+                          .limit(1)\
+                          .scalar()
+            overflow = db.query(TranslationCache)\
+                         .filter(TranslationCache.last_used < keep_from)\
+                         .delete(synchronize_session=False)
+        db.commit()
+        if expired or overflow:
+            logger.info(f"Память переводов: удалено устаревших {expired}, лишних {overflow}.")
+    except Exception as e:
+        logger.warning(f"Ошибка очистки памяти переводов: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def translate_text(text: str, dest: str = TRANSLATE_DEST) -> str:
+    """
+    Синхронный перевод: сначала память переводов (LRU → БД), затем googletrans.
+    Блокирует поток, поэтому из event loop вызывать только через translate_text_async().
+    """
+    if Translator is None:
+        return text
+
+    normalized = normalize_source(text)
+    key = source_hash(normalized, dest)
+
+    cached = _lru_get(key)
+    if cached is not None:
+        return cached
+
+    cached = _db_get(key)
+    if cached is not None:
+        TRANSLATION_CACHE.inc("db")
+        _lru_put(key, cached)
+        return cached
+
+    TRANSLATION_CACHE.inc("miss")
+    started = time.perf_counter()
+    try:
+        translated = _get_translator().translate(normalized, dest=dest).text
+    except Exception as e:
+        # Ошибки не кэшируем — в следующий раз попробуем перевести снова
+        TRANSLATOR_CALLS.inc("error")
+        logger.warning(f"Ошибка перевода: {e}. Будем отправлять оригинал.")
+        return text
+    else:
+        TRANSLATOR_CALLS.inc("ok")
+    finally:
+        TRANSLATOR_SECONDS.inc(amount=time.perf_counter() - started)
+
+    _lru_put(key, translated)
+    _db_put(key, dest, translated)
+    return translated
+
+
+async def translate_text_async(text: str, dest: str = TRANSLATE_DEST) -> str:
+    """
+    Переводит текст в пуле потоков, не блокируя event loop discord.py.
+    Попадание в LRU обслуживается сразу, без пула. Одновременно выполняется
+    не больше TRANSLATE_CONCURRENCY переводов; если перевод (вместе с ожиданием
+    свободного слота) не уложился в TRANSLATE_TIMEOUT — возвращаем оригинал.
+    """
+    global _semaphore
+    if Translator is None:
+        return text
+
+    cached = _lru_get(source_hash(normalize_source(text), dest))
+    if cached is not None:
+        return cached
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(TRANSLATE_CONCURRENCY)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TRANSLATE_TIMEOUT
+
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), TRANSLATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Перевод: все слоты заняты дольше таймаута, отправляем оригинал.")
+        return text
+
+    # Слот освобождаем только когда поток действительно закончил работу —
+    # иначе «зависшие» запросы к googletrans могли бы накапливаться без ограничений.
+    future = loop.run_in_executor(_executor, translate_text, text, dest)
+    future.add_done_callback(lambda _: _semaphore.release())
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        logger.warning(f"Перевод не уложился в {TRANSLATE_TIMEOUT} с, отправляем оригинал.")
+        return text
+
+
+def translation_cache_stats() -> dict:
+    """
+    Снимок счётчиков памяти переводов (те же, что в /metrics). saved_calls — сколько
+    обращений к googletrans сэкономлено, saved_seconds — оценка сэкономленного
+    времени по средней латентности.
+    """
+    stats = {
+        "lru_hits": TRANSLATION_CACHE.value("lru"),
+        "db_hits": TRANSLATION_CACHE.value("db"),
+        "misses": TRANSLATION_CACHE.value("miss"),
+        "translator_calls": TRANSLATOR_CALLS.value("ok") + TRANSLATOR_CALLS.value("error"),
+        "translator_errors": TRANSLATOR_CALLS.value("error"),
+        "translator_seconds": TRANSLATOR_SECONDS.value(),
+    }
+    with _lock:
+        stats["lru_size"] = len(_lru)
+    calls = stats["translator_calls"]
+    avg = stats["translator_seconds"] / calls if calls else 0.0
+    stats["saved_calls"] = stats["lru_hits"] + stats["db_hits"]
+    stats["saved_seconds"] = stats["saved_calls"] * avg
+    return stats
+
+
+def shutdown_translation():
+    """Останавливает пул потоков перевода (вызывается при закрытии Discord-клиента)."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    flush_translation_hits()
+    stats = translation_cache_stats()
+    logger.info(
+        f"Память переводов: LRU {stats['lru_hits']}, БД {stats['db_hits']}, "
+        f"промахов {stats['misses']}, сэкономлено ~{stats['saved_seconds']:.1f} с."
+    )